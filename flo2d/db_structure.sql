@@ -874,7 +874,11 @@ CREATE TRIGGER "find_infil_cells_green_insert"
        DELETE FROM "infil_cells_green" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_cells_green" (infil_area_fid, grid_fid)
            SELECT NEW.fid, g.fid FROM grid as g
-           WHERE ST_Intersects(CastAutomagic(g.geom), ST_Centroid(CastAutomagic(NEW.geom)));
+           WHERE g.fid IN (
+               SELECT id FROM rtree_grid_geom
+               WHERE minx <= ST_MaxX(ST_Centroid(CastAutomagic(NEW.geom))) AND maxx >= ST_MinX(ST_Centroid(CastAutomagic(NEW.geom))) AND
+                     miny <= ST_MaxY(ST_Centroid(CastAutomagic(NEW.geom))) AND maxy >= ST_MinY(ST_Centroid(CastAutomagic(NEW.geom))))
+           AND ST_Intersects(CastAutomagic(g.geom), ST_Centroid(CastAutomagic(NEW.geom)));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_cells_green_update', 1);
@@ -885,7 +889,11 @@ CREATE TRIGGER "find_infil_cells_green_update"
        DELETE FROM "infil_cells_green" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_cells_green" (infil_area_fid, grid_fid)
        SELECT NEW.fid, g.fid FROM grid as g
-       WHERE ST_Intersects(CastAutomagic(g.geom), ST_Centroid(CastAutomagic(NEW.geom)));
+       WHERE g.fid IN (
+           SELECT id FROM rtree_grid_geom
+           WHERE minx <= ST_MaxX(ST_Centroid(CastAutomagic(NEW.geom))) AND maxx >= ST_MinX(ST_Centroid(CastAutomagic(NEW.geom))) AND
+                 miny <= ST_MaxY(ST_Centroid(CastAutomagic(NEW.geom))) AND maxy >= ST_MinY(ST_Centroid(CastAutomagic(NEW.geom))))
+       AND ST_Intersects(CastAutomagic(g.geom), ST_Centroid(CastAutomagic(NEW.geom)));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_cells_green_delete', 1);
@@ -922,7 +930,11 @@ CREATE TRIGGER "find_infil_cells_scs_insert"
        DELETE FROM "infil_cells_scs" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_cells_scs" (infil_area_fid, grid_fid)
            SELECT NEW.fid, g.fid FROM grid as g
-           WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+           WHERE g.fid IN (
+               SELECT id FROM rtree_grid_geom
+               WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                     miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+           AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_cells_scs_update', 1);
@@ -933,7 +945,11 @@ CREATE TRIGGER "find_infil_cells_scs_update"
        DELETE FROM "infil_cells_scs" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_cells_scs" (infil_area_fid, grid_fid)
        SELECT NEW.fid, g.fid FROM grid as g
-       WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+       WHERE g.fid IN (
+           SELECT id FROM rtree_grid_geom
+           WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                 miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+       AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_cells_scs_delete', 1);
@@ -972,7 +988,11 @@ CREATE TRIGGER "find_infil_cells_horton_insert"
        DELETE FROM "infil_cells_horton" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_cells_horton" (infil_area_fid, grid_fid)
            SELECT NEW.fid, g.fid FROM grid as g
-           WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+           WHERE g.fid IN (
+               SELECT id FROM rtree_grid_geom
+               WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                     miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+           AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_cells_horton_update', 1);
@@ -983,7 +1003,11 @@ CREATE TRIGGER "find_infil_cells_horton_update"
        DELETE FROM "infil_cells_horton" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_cells_horton" (infil_area_fid, grid_fid)
        SELECT NEW.fid, g.fid FROM grid as g
-       WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+       WHERE g.fid IN (
+           SELECT id FROM rtree_grid_geom
+           WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                 miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+       AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_cells_horton_delete', 1);
@@ -1020,7 +1044,11 @@ CREATE TRIGGER "find_infil_chan_elems_insert"
        DELETE FROM "infil_chan_elems" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_chan_elems" (infil_area_fid, grid_fid)
            SELECT NEW.fid, g.fid FROM grid as g
-           WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+           WHERE g.fid IN (
+               SELECT id FROM rtree_grid_geom
+               WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                     miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+           AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_chan_elems_update', 1);
@@ -1031,7 +1059,11 @@ CREATE TRIGGER "find_infil_chan_elems_update"
        DELETE FROM "infil_chan_elems" WHERE infil_area_fid = NEW."fid";
        INSERT INTO "infil_chan_elems" (infil_area_fid, grid_fid)
        SELECT NEW.fid, g.fid FROM grid as g
-       WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+       WHERE g.fid IN (
+           SELECT id FROM rtree_grid_geom
+           WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                 miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+       AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
    END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_infil_chan_elems_delete', 1);
@@ -1382,7 +1414,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_mult_insert"
         DELETE FROM "mult_cells" WHERE area_fid = NEW."fid";
         INSERT INTO "mult_cells" (area_fid, grid_fid, wdr, dm, nodchns, xnmult)
             SELECT NEW.fid, g.fid, NEW.wdr, NEW.dm, NEW.nodchns, NEW. xnmult  FROM grid as g
-            WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+            WHERE g.fid IN (
+                SELECT id FROM rtree_grid_geom
+                WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                      miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+            AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_cells_mult_update', 1);
@@ -1393,7 +1429,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_mult_update"
         DELETE FROM "mult_cells" WHERE area_fid = NEW."fid";
         INSERT INTO "mult_cells" (area_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_cells_mult_delete', 1);
@@ -1413,7 +1453,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_mult_line_insert"
         DELETE FROM "mult_cells" WHERE line_fid = NEW."fid";
         INSERT INTO "mult_cells" (line_fid, grid_fid, wdr, dm, nodchns, xnmult)
             SELECT NEW.fid, g.fid, NEW.wdr, NEW.dm, NEW.nodchns, NEW. xnmult  FROM grid as g
-            WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+            WHERE g.fid IN (
+                SELECT id FROM rtree_grid_geom
+                WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                      miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+            AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 
@@ -1425,7 +1469,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_mult_line_update"
         DELETE FROM "mult_cells" WHERE line_fid = NEW."fid";
         INSERT INTO "mult_cells" (line_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 
@@ -1474,7 +1522,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_simple_mult_line_insert"
         DELETE FROM "simple_mult_cells" WHERE line_fid = NEW."fid";
         INSERT INTO "simple_mult_cells" (line_fid, grid_fid)
             SELECT NEW.fid, g.fid FROM grid as g
-            WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+            WHERE g.fid IN (
+                SELECT id FROM rtree_grid_geom
+                WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                      miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+            AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 INSERT INTO trigger_control (name, enabled) VALUES ('find_cells_simple_mult_line_update', 1);
@@ -1485,7 +1537,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_simple_mult_line_update"
         DELETE FROM "simple_mult_cells" WHERE line_fid = NEW."fid";
         INSERT INTO "simple_mult_cells" (line_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
   
@@ -2048,7 +2104,11 @@ CREATE TRIGGER IF NOT EXISTS "find_breach_cells_insert"
     BEGIN
         DELETE FROM "breach_cells" WHERE breach_fid = NEW."fid";
         INSERT INTO "breach_cells" (breach_fid, grid_fid) SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 
@@ -2059,7 +2119,11 @@ CREATE TRIGGER IF NOT EXISTS "find_breach_cells_update"
         DELETE FROM "breach_cells" WHERE breach_fid = NEW."fid";
         INSERT INTO "breach_cells" (breach_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_breach_cells_delete"
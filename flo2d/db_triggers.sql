@@ -8,7 +8,11 @@ CREATE TRIGGER IF NOT EXISTS "find_inflow_cells_insert"
     BEGIN
         DELETE FROM "inflow_cells" WHERE inflow_fid = NEW."fid";
         INSERT INTO "inflow_cells" (inflow_fid, grid_fid) SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_inflow_cells_update"
@@ -17,7 +21,11 @@ CREATE TRIGGER IF NOT EXISTS "find_inflow_cells_update"
     BEGIN
         DELETE FROM "inflow_cells" WHERE inflow_fid = OLD."fid";
         INSERT INTO "inflow_cells" (inflow_fid, grid_fid) SELECT OLD.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_inflow_cells_delete"
@@ -37,7 +45,11 @@ CREATE TRIGGER IF NOT EXISTS "find_outflow_cells_insert"
         DELETE FROM "outflow_cells" WHERE outflow_fid = NEW."fid";
         INSERT INTO "outflow_cells" (outflow_fid, grid_fid, area_factor)
         SELECT NEW.fid, g.fid, ST_Area(ST_Intersection(CastAutomagic(g.geom), CastAutomagic(NEW.geom)))/ST_Area(NEW.geom) FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_outflow_chan_elems_insert"
@@ -46,7 +58,11 @@ CREATE TRIGGER IF NOT EXISTS "find_outflow_chan_elems_insert"
     BEGIN
         DELETE FROM "outflow_chan_elems" WHERE outflow_fid = NEW."fid";
         INSERT INTO "outflow_chan_elems" (outflow_fid, elem_fid) SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_outflow_cells_update"
@@ -55,7 +71,11 @@ CREATE TRIGGER IF NOT EXISTS "find_outflow_cells_update"
     BEGIN
         DELETE FROM "outflow_cells" WHERE outflow_fid = OLD."fid" AND NEW."ident" = 'N';
         INSERT INTO "outflow_cells" (outflow_fid, grid_fid) SELECT OLD.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom)) AND NEW."ident" = 'N';
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom)) AND NEW."ident" = 'N';
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_outflow_chan_elems_update"
@@ -64,7 +84,11 @@ CREATE TRIGGER IF NOT EXISTS "find_outflow_chan_elems_update"
     BEGIN
         DELETE FROM "outflow_chan_elems" WHERE outflow_fid = OLD."fid" AND NEW."ident" = 'K';
         INSERT INTO "outflow_chan_elems" (outflow_fid, elem_fid) SELECT OLD.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom)) AND NEW."ident" = 'K';
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom)) AND NEW."ident" = 'K';
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_outflow_cells_delete"
@@ -91,7 +115,11 @@ CREATE TRIGGER IF NOT EXISTS "find_rain_arf_cells_insert"
         DELETE FROM "rain_arf_cells" WHERE rain_arf_area_fid = NEW."fid";
         INSERT INTO "rain_arf_cells" (rain_arf_area_fid, grid_fid, arf)
         SELECT NEW.fid, g.fid, NEW.arf FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_rain_arf_cells_update"
@@ -101,7 +129,11 @@ CREATE TRIGGER IF NOT EXISTS "find_rain_arf_cells_update"
         DELETE FROM "rain_arf_cells" WHERE rain_arf_area_fid = NEW."fid";
         INSERT INTO "rain_arf_cells" (rain_arf_area_fid, grid_fid, arf)
         SELECT NEW.fid, g.fid, NEW.arf FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_rain_arf_cells_delete"
@@ -224,7 +256,11 @@ CREATE TRIGGER IF NOT EXISTS "find_noexchange_cells_insert"
         DELETE FROM "noexchange_chan_cells" WHERE noex_fid = NEW."fid";
         INSERT INTO "noexchange_chan_cells" (noex_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_noexchange_cells_update"
@@ -234,7 +270,11 @@ CREATE TRIGGER IF NOT EXISTS "find_noexchange_cells_update"
         DELETE FROM "noexchange_chan_cells" WHERE noex_fid = NEW."fid";
         INSERT INTO "noexchange_chan_cells" (noex_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_noexchange_cells_delete"
@@ -379,7 +419,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_arf_tot_insert"
         DELETE FROM "blocked_cells_tot" WHERE area_fid = NEW."fid";
         INSERT INTO "blocked_cells_tot" (area_fid, grid_fid)
             SELECT NEW.fid, g.fid FROM grid as g
-            WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+            WHERE g.fid IN (
+                SELECT id FROM rtree_grid_geom
+                WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                      miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+            AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_cells_arf_tot_update"
@@ -389,7 +433,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_arf_tot_update"
         DELETE FROM "blocked_cells_tot" WHERE area_fid = NEW."fid";
         INSERT INTO "blocked_cells_tot" (area_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_cells_arf_tot_delete"
@@ -406,7 +454,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_arf_insert"
         DELETE FROM "blocked_cells" WHERE area_fid = NEW."fid";
         INSERT INTO "blocked_cells" (area_fid, grid_fid)
             SELECT NEW.fid, g.fid FROM grid as g
-            WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+            WHERE g.fid IN (
+                SELECT id FROM rtree_grid_geom
+                WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                      miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+            AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_cells_arf_update"
@@ -416,7 +468,11 @@ CREATE TRIGGER IF NOT EXISTS "find_cells_arf_update"
         DELETE FROM "blocked_cells" WHERE area_fid = NEW."fid";
         INSERT INTO "blocked_cells" (area_fid, grid_fid)
         SELECT NEW.fid, g.fid FROM grid as g
-        WHERE ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
+        WHERE g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE minx <= ST_MaxX(CastAutomagic(NEW.geom)) AND maxx >= ST_MinX(CastAutomagic(NEW.geom)) AND
+                  miny <= ST_MaxY(CastAutomagic(NEW.geom)) AND maxy >= ST_MinY(CastAutomagic(NEW.geom)))
+        AND ST_Intersects(CastAutomagic(g.geom), CastAutomagic(NEW.geom));
     END;
 
 CREATE TRIGGER IF NOT EXISTS "find_cells_arf_delete"
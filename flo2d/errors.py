@@ -41,6 +41,14 @@ class Flo2dLayerInvalid(Flo2dError):
     pass
 
 
+class Flo2dDatFileInvalid(Flo2dError):
+    """
+    Raise when a FLO-2D data file has unexpected layout.
+    """
+
+    pass
+
+
 class Flo2dQueryResultNull(Flo2dError):
     """
     Raise when db query return None while a value(s) were expected.
@@ -31,6 +31,8 @@ from .flo2d_tools.grid_info_tool import GridInfoTool
 from .flo2d_tools.info_tool import InfoTool
 from .flo2d_tools.channel_profile_tool import ChannelProfile
 from .flo2d_tools.grid_tools import grid_has_empty_elev
+from .flo2d_tools.grid_index import clear_grid_indexes
+from .flo2d_tools.spatial_index_cache import clear_spatial_index_cache
 from .flo2d_tools.schematic_tools import generate_schematic_levees, delete_levee_directions_duplicates, delete_levee_directions_duplicates_np
 from .flo2d_tools.flopro_tools import FLOPROExecutor, TailingsDamBreachExecutor, MapperExecutor, ProgramExecutor
 from .gui.dlg_cont_toler_jj import ContToler_JJ
@@ -102,6 +104,7 @@ class Flo2D(object):
 
         # connections
         self.project.readProject.connect(self.load_gpkg_from_proj)
+        self.project.cleared.connect(self.clear_caches)
 
         self.uc.clear_bar_messages()
         QApplication.restoreOverrideCursor()
@@ -443,6 +446,8 @@ class Flo2D(object):
         del self.info_tool, self.grid_info_tool, self.channel_profile_tool
         # others
         del self.uc
+        self.project.cleared.disconnect(self.clear_caches)
+        self.clear_caches()
         database_disconnect(self.con)
         for action in self.actions:
             self.iface.removePluginMenu(self.tr("&Flo2D"), action)
@@ -538,6 +543,13 @@ class Flo2D(object):
         if g:
             dock.restoreGeometry(g)
 
+    def clear_caches(self):
+        """
+        Dropping data cached for the current project when the project is closed or a new one is created.
+        """
+        clear_grid_indexes()
+        clear_spatial_index_cache()
+
     def write_proj_entry(self, key, val):
         return self.project.writeEntry("FLO-2D", key, val)
 
@@ -742,6 +754,37 @@ class Flo2D(object):
                 self.iface.mainWindow().setWindowTitle(window_title)
                 QApplication.restoreOverrideCursor()
 
+    def import_files_available(self, call, last_dir):
+        """
+        Checking if DAT files required by the importer exist. Files report is updated accordingly.
+        """
+        dat = call.split("_")[-1].upper() + ".DAT"
+        if self.f2g.parser.dat_files[dat] is None:
+            if dat == "MULT.DAT":
+                if self.f2g.parser.dat_files["SIMPLE_MULT.DAT"] is None:
+                    self.uc.log_info('Files required for "{0}" not found. Action skipped!'.format(call))
+                    self.files_not_used += dat + "\n"
+                    return False
+                else:
+                    self.files_used += "SIMPLE_MULT.DAT\n"
+            else:
+                self.uc.log_info('Files required for "{0}" not found. Action skipped!'.format(call))
+                if dat not in ["WSURF.DAT", "WSTIME.DAT"]:
+                    self.files_not_used += dat + "\n"
+                return False
+        else:
+            if dat == "MULT.DAT":
+                self.files_used += dat + " and/or SIMPLE_MULT.DAT" + "\n"
+            elif os.path.getsize(os.path.join(last_dir, dat)) > 0:
+                self.files_used += dat + "\n"
+                if dat == "CHAN.DAT":
+                    self.files_used += "CHANBANK.DAT" + "\n"
+            else:
+                self.files_not_used += dat + "\n"
+                return False
+
+        return True
+
     def call_IO_methods(self, calls, debug, *args):
         s = QSettings()
         last_dir = s.value("FLO-2D/lastGdsDir", "")
@@ -753,48 +796,15 @@ class Flo2D(object):
         for call in calls:
             dat = call.split("_")[-1].upper() + ".DAT"
             if call.startswith("import"):
-                if self.f2g.parser.dat_files[dat] is None:
-                    if dat == "MULT.DAT":
-                        if self.f2g.parser.dat_files["SIMPLE_MULT.DAT"] is None: 
-                            self.uc.log_info('Files required for "{0}" not found. Action skipped!'.format(call))
-                            self.files_not_used += dat + "\n"
-                            continue
-                        else:
-                            self.files_used += "SIMPLE_MULT.DAT\n"
-                            pass                                 
-                    else:
-                        self.uc.log_info('Files required for "{0}" not found. Action skipped!'.format(call))
-                        if dat not in ["WSURF.DAT", "WSTIME.DAT"]:
-                            self.files_not_used += dat + "\n"
-                        continue                            
-                else:
-                    if dat == "MULT.DAT":
-                        self.files_used += dat + " and/or SIMPLE_MULT.DAT" + "\n"
-                        pass                    
-                    elif os.path.getsize(os.path.join(last_dir, dat)) > 0:
-                        self.files_used += dat + "\n"
-                        if dat == "CHAN.DAT":
-                            self.files_used += "CHANBANK.DAT" + "\n"
-                        pass
-                    else:
-                        self.files_not_used += dat + "\n"
-                        continue
+                if not self.import_files_available(call, last_dir):
+                    continue
 
             try:
                 start_time = time.time()
                 method = getattr(self.f2g, call)
                 if method(*args):
                     if call.startswith("export"):
-                        self.files_used += dat + "\n"
-                        if dat == "CHAN.DAT":
-                            self.files_used += "CHANBANK.DAT" + "\n"
-                        if dat == "SWMMFLO.DAT":
-                            self.files_used += "SWMM.INP" + "\n"                            
-                        if dat == "TOPO.DAT":
-                            self.files_used += "MANNINGS_N.DAT" + "\n"
-                        if dat == "MULT.DAT":
-                            self.files_used += "SIMPLE_MULT.DAT" + "\n"                        
-                        pass
+                        self.files_used += self.exported_files(dat)
 
                 self.uc.log_info('{0:.3f} seconds => "{1}"'.format(time.time() - start_time, call))
 
@@ -804,6 +814,91 @@ class Flo2D(object):
                 else:
                     raise
 
+    def call_import_methods_parallel(self, calls, debug):
+        """
+        Import variant of 'call_IO_methods' scheduling importers with their dependency graph.
+        """
+        s = QSettings()
+        last_dir = s.value("FLO-2D/lastGdsDir", "")
+        self.files_used = "CONT.DAT\n"
+        self.files_not_used = ""
+        calls = [call for call in calls if self.import_files_available(call, last_dir)]
+        start_time = time.time()
+        timings = self.f2g.import_parallel(calls, debug)
+        for call, seconds in timings.items():
+            self.uc.log_info('{0:.3f} seconds => "{1}"'.format(seconds, call))
+        self.uc.log_info(
+            "{0:.3f} seconds => parallel import of {1} components ({2:.3f} seconds in total)".format(
+                time.time() - start_time, len(timings), sum(timings.values())
+            )
+        )
+
+    def exported_files(self, dat):
+        files = dat + "\n"
+        if dat == "CHAN.DAT":
+            files += "CHANBANK.DAT" + "\n"
+        if dat == "SWMMFLO.DAT":
+            files += "SWMM.INP" + "\n"
+        if dat == "TOPO.DAT":
+            files += "MANNINGS_N.DAT" + "\n"
+        if dat == "MULT.DAT":
+            files += "SIMPLE_MULT.DAT" + "\n"
+        return files
+
+    def call_export_methods_parallel(self, calls, debug, outdir):
+        """
+        Export variant of 'call_IO_methods' running read-only exporters concurrently on separate connections.
+        Exporters that modify the database are run first on the main connection. Written files are the same
+        as in the sequential export.
+        """
+        gpkg_path = self.f2g.get_gpkg_path()
+        if not gpkg_path or not os.path.isfile(gpkg_path):
+            self.call_IO_methods(calls, debug, outdir)
+            return
+
+        self.files_used = "CONT.DAT\n"
+        self.files_not_used = ""
+        parallel_calls = [call for call in calls if call in self.f2g.PARALLEL_EXPORTS]
+        results, errors = {}, {}
+        start_time = time.time()
+        for call in calls:
+            if call in parallel_calls:
+                continue
+            try:
+                call_start = time.time()
+                method = getattr(self.f2g, call)
+                results[call] = (method(outdir), time.time() - call_start)
+            except Exception as e:
+                errors[call] = e
+        parallel_results, parallel_errors = self.f2g.export_parallel(parallel_calls, outdir)
+        results.update(parallel_results)
+        errors.update(parallel_errors)
+
+        for call in calls:
+            if call not in errors:
+                continue
+            e = errors[call]
+            trace = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            self.uc.log_info('"{0}" failed:\n{1}'.format(call, trace))
+        if errors:
+            self.uc.bar_warn("Export of {0} failed! Check the log for details.".format(", ".join(errors)))
+
+        for call in calls:
+            if call not in results:
+                continue
+            exported, seconds = results[call]
+            if exported:
+                self.files_used += self.exported_files(call.split("_")[-1].upper() + ".DAT")
+            self.uc.log_info('{0:.3f} seconds => "{1}"'.format(seconds, call))
+        total = sum(seconds for exported, seconds in results.values())
+        self.uc.log_info(
+            "{0:.3f} seconds => parallel export of {1} components ({2:.3f} seconds in total)".format(
+                time.time() - start_time, len(results), total
+            )
+        )
+        if errors and debug is not True:
+            raise next(iter(errors.values()))
+
     @connection_required
     def import_gds(self):
         """
@@ -1074,7 +1169,10 @@ class Flo2D(object):
                     for table in tables:
                         self.gutils.clear_tables(table)
 
-                    self.call_IO_methods(import_calls, True)  # The strings list 'export_calls', contains the names of
+                    if s.value("FLO-2D/parallel_import", False, type=bool):
+                        self.call_import_methods_parallel(import_calls, True)
+                    else:
+                        self.call_IO_methods(import_calls, True)  # The strings list 'export_calls', contains the names of
                     # the methods in the class Flo2dGeoPackage to import (read) the
                     # FLO-2D .DAT files
 
@@ -1604,7 +1702,10 @@ class Flo2D(object):
                     s = QSettings()
                     s.setValue("FLO-2D/lastGdsDir", outdir)
     
-                    self.call_IO_methods(export_calls, True, outdir)  
+                    if s.value("FLO-2D/parallel_export", False, type=bool):
+                        self.call_export_methods_parallel(export_calls, True, outdir)
+                    else:
+                        self.call_IO_methods(export_calls, True, outdir)
                     # The strings list 'export_calls', contains the names of
                     # the methods in the class Flo2dGeoPackage to export (write) the
                     # FLO-2D .DAT files
@@ -8,12 +8,15 @@
 # as published by the Free Software Foundation; either version 2
 # of the License, or (at your option) any later version
 import os
+from concurrent.futures import ThreadPoolExecutor
 from collections import OrderedDict, defaultdict
-from itertools import zip_longest, chain, repeat
+from itertools import zip_longest, chain, repeat, islice
+import numpy as np
 from qgis.core import NULL
 from qgis.PyQt.QtCore import QSettings
 from qgis.PyQt.QtWidgets import QMessageBox
 from ..utils import Msge
+from ..errors import Flo2dDatFileInvalid
 
 
 class ParseDAT(object):
@@ -151,6 +154,41 @@ class ParseDAT(object):
                 if row:
                     yield row
 
+    @staticmethod
+    def array_parser(file1, columns, chunksize):
+        """
+        Generator which reads whitespace separated numeric file in chunks of 'chunksize' lines as NumPy arrays.
+        Flo2dDatFileInvalid is raised for a line which doesn't have 'columns' numeric values.
+        """
+        first_line = 1
+        basename = os.path.basename(file1)
+        with open(file1, "r") as f1:
+            while True:
+                lines = list(islice(f1, chunksize))
+                if not lines:
+                    break
+                rows = []
+                for i, line in enumerate(lines, first_line):
+                    row = line.split()
+                    if not row:
+                        continue
+                    if len(row) != columns:
+                        msg = "{0}: line {1} has {2} values instead of {3}."
+                        raise Flo2dDatFileInvalid(msg.format(basename, i, len(row), columns))
+                    rows.append(row)
+                try:
+                    values = np.array(rows, dtype=float).reshape(-1, columns)
+                except ValueError:
+                    for i, line in enumerate(lines, first_line):
+                        try:
+                            [float(value) for value in line.split()]
+                        except ValueError:
+                            break
+                    msg = "{0}: line {1} has a non-numeric value."
+                    raise Flo2dDatFileInvalid(msg.format(basename, i))
+                yield values
+                first_line += len(lines)
+
     @staticmethod
     def fix_row_size(row, fix_size, default=None, index=None):
         loops = fix_size - len(row)
@@ -196,6 +234,41 @@ class ParseDAT(object):
         results = self.double_parser(mannings_n, topo)
         return results
 
+    def parse_mannings_n_topo_chunks(self, chunksize=100000):
+        """
+        Generator which yields aligned (MANNINGS_N.DAT, TOPO.DAT) NumPy arrays of about 'chunksize' rows.
+        Flo2dDatFileInvalid is raised if the files have different number of rows or cells are not in TOPO.DAT order.
+        """
+        mannings_n = self.dat_files["MANNINGS_N.DAT"]
+        topo = self.dat_files["TOPO.DAT"]
+        mannings_chunks = self.array_parser(mannings_n, 2, chunksize)
+        topo_chunks = self.array_parser(topo, 3, chunksize)
+        # Rows left over when chunks of both files have different number of rows (e.g. due to empty lines).
+        mannings_rest, topo_rest = np.zeros((0, 2)), np.zeros((0, 3))
+        mannings_rows, topo_rows = 0, 0
+        for mannings_chunk, topo_chunk in zip_longest(mannings_chunks, topo_chunks):
+            if mannings_chunk is not None:
+                mannings_rest = np.concatenate((mannings_rest, mannings_chunk))
+                mannings_rows += mannings_chunk.shape[0]
+            if topo_chunk is not None:
+                topo_rest = np.concatenate((topo_rest, topo_chunk))
+                topo_rows += topo_chunk.shape[0]
+            rows = min(mannings_rest.shape[0], topo_rest.shape[0])
+            mannings_chunk, mannings_rest = mannings_rest[:rows], mannings_rest[rows:]
+            topo_chunk, topo_rest = topo_rest[:rows], topo_rest[rows:]
+            first_fid = min(mannings_rows, topo_rows) - rows + 1
+            expected_fids = np.arange(first_fid, first_fid + rows)
+            wrong_fids = np.flatnonzero(mannings_chunk[:, 0] != expected_fids)
+            if wrong_fids.size:
+                row = int(expected_fids[wrong_fids[0]])
+                msg = "MANNINGS_N.DAT: cell {0} found in row {1}, cells have to follow TOPO.DAT rows order."
+                raise Flo2dDatFileInvalid(msg.format(int(mannings_chunk[wrong_fids[0], 0]), row))
+            if rows:
+                yield mannings_chunk, topo_chunk
+        if mannings_rows != topo_rows:
+            msg = "MANNINGS_N.DAT has {0} rows and TOPO.DAT has {1} rows."
+            raise Flo2dDatFileInvalid(msg.format(mannings_rows, topo_rows))
+
     def parse_inflow(self):
         inflow = self.dat_files["INFLOW.DAT"]
         par = self.single_parser(inflow)
@@ -677,3 +750,35 @@ class ParseDAT(object):
         for row in par:
             data.append(row)
         return head, data
+
+
+class PrefetchedParser(object):
+    """
+    Proxy for ParseDAT object which returns results of the parsing methods already run in the worker pool.
+    Each prefetched result is returned once, other calls are passed to the wrapped parser.
+    """
+
+    def __init__(self, parser, results):
+        self.parser = parser
+        self.results = results
+
+    def __getattr__(self, name):
+        if name in self.results:
+            result = self.results.pop(name)
+            return lambda: result
+        return getattr(self.parser, name)
+
+
+def run_parser(parser, method):
+    """
+    Running ParseDAT method inside of the worker.
+    """
+    return getattr(parser, method)()
+
+
+def parser_executor(max_workers=None):
+    """
+    Pool of threads for running DAT files parsers and other file or GEOS bound work.
+    Worker processes are not used, forking the multithreaded QGIS process may copy held locks into the children.
+    """
+    return ThreadPoolExecutor(max_workers=max_workers)
@@ -8,13 +8,17 @@
 # as published by the Free Software Foundation; either version 2
 # of the License, or (at your option) any later version
 import os
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from math import isclose
+from collections import OrderedDict
 from itertools import chain, groupby
 from operator import itemgetter
-from .flo2d_parser import ParseDAT
+from .flo2d_parser import ParseDAT, PrefetchedParser, run_parser, parser_executor
 from ..gui.bc_editor_widget import BCEditorWidget
-from ..geopackage_utils import GeoPackageUtils
+from ..geopackage_utils import GeoPackageUtils, squares_to_gpb, gpb_envelope_center, read_only_connect
+from ..user_communication import DeferredUserCommunication
 from qgis.PyQt.QtWidgets import QApplication
 
 from ..utils import get_BC_Border, BC_BORDER
@@ -23,16 +27,215 @@ class Flo2dGeoPackage(GeoPackageUtils):
     """
     Class for proper import and export FLO-2D data.
     """
+
+    # Importers which have to be run before the given importer.
+    IMPORT_DEPENDENCIES = {
+        "import_cont_toler": (),
+        "import_mannings_n_topo": ("import_cont_toler",),
+        "import_inflow": ("import_mannings_n_topo",),
+        "import_outflow": ("import_mannings_n_topo",),
+        "import_rain": ("import_mannings_n_topo",),
+        "import_raincell": ("import_mannings_n_topo",),
+        "import_evapor": ("import_mannings_n_topo",),
+        "import_infil": ("import_mannings_n_topo", "import_chan"),
+        "import_chan": ("import_mannings_n_topo",),
+        "import_xsec": ("import_chan",),
+        "import_hystruc": ("import_mannings_n_topo", "import_chan"),
+        "import_street": ("import_mannings_n_topo",),
+        "import_arf": ("import_mannings_n_topo",),
+        "import_mult": ("import_mannings_n_topo", "import_chan"),
+        "import_sed": ("import_mannings_n_topo",),
+        "import_levee": ("import_mannings_n_topo",),
+        "import_fpxsec": ("import_mannings_n_topo",),
+        "import_breach": ("import_mannings_n_topo", "import_levee"),
+        "import_gutter": ("import_mannings_n_topo",),
+        "import_fpfroude": ("import_mannings_n_topo",),
+        "import_swmmflo": ("import_mannings_n_topo",),
+        "import_swmmflort": ("import_swmmflo",),
+        "import_swmmoutf": ("import_mannings_n_topo",),
+        "import_tolspatial": ("import_mannings_n_topo",),
+        "import_wsurf": ("import_mannings_n_topo",),
+        "import_wstime": ("import_mannings_n_topo",),
+    }
+
+    # Parsers which can be run ahead of their importers in the worker pool.
+    # MANNINGS_N.DAT/TOPO.DAT are streamed and CHAN.DAT/MULT.DAT parsers may interact with the user.
+    IMPORT_PARSERS = {
+        "import_cont_toler": ("parse_cont", "parse_toler"),
+        "import_inflow": ("parse_inflow",),
+        "import_outflow": ("parse_outflow",),
+        "import_rain": ("parse_rain",),
+        "import_raincell": ("parse_raincell",),
+        "import_evapor": ("parse_evapor",),
+        "import_infil": ("parse_infil",),
+        "import_xsec": ("parse_xsec",),
+        "import_hystruc": ("parse_hystruct",),
+        "import_street": ("parse_street",),
+        "import_arf": ("parse_arf",),
+        "import_sed": ("parse_sed",),
+        "import_levee": ("parse_levee",),
+        "import_fpxsec": ("parse_fpxsec",),
+        "import_breach": ("parse_breach",),
+        "import_gutter": ("parse_gutter",),
+        "import_fpfroude": ("parse_fpfroude",),
+        "import_swmmflo": ("parse_swmmflo",),
+        "import_swmmflort": ("parse_swmmflort",),
+        "import_swmmoutf": ("parse_swmmoutf",),
+        "import_tolspatial": ("parse_tolspatial",),
+        "import_wsurf": ("parse_wsurf",),
+        "import_wstime": ("parse_wstime",),
+    }
+
+    # Exporters which only read the database and write their own files.
+    # They are safe to run concurrently on separate read-only connections.
+    PARALLEL_EXPORTS = (
+        "export_tolspatial",
+        "export_inflow",
+        "export_outflow",
+        "export_rain",
+        "export_raincell",
+        "export_evapor",
+        "export_infil",
+        "export_chan",
+        "export_xsec",
+        "export_hystruc",
+        "export_street",
+        "export_arf",
+        "export_sed",
+        "export_levee",
+        "export_fpxsec",
+        "export_breach",
+        "export_fpfroude",
+        "export_swmmflo",
+        "export_swmmoutf",
+        "export_wsurf",
+        "export_wstime",
+        "export_shallowNSpatial",
+        "export_mannings_n_topo",
+    )
+
     def __init__(self, con, iface):
         super(Flo2dGeoPackage, self).__init__(con, iface)
         self.parser = None
         self.cell_size = None
         self.buffer = None
         self.shrink = None
-        self.chunksize = float("inf")
+        self.chunksize = 100000
         self.gutils = GeoPackageUtils(con, iface)
         self.export_messages = ""
         
+    def fetch_chunks(self, sql, inputs=None):
+        """
+        Generator yielding query results in lists of 'self.chunksize' rows.
+        """
+        cursor = self.execute(sql, inputs)
+        while True:
+            rows = cursor.fetchmany(self.chunksize)
+            if not rows:
+                break
+            yield rows
+
+    def import_parallel(self, calls, debug=False, max_workers=None):
+        """
+        Running importers following IMPORT_DEPENDENCIES. DAT files are parsed concurrently in the worker pool
+        while parsed rows are written through the single connection of this object, as soon as the parsers
+        and the importer dependencies are done. Returns dictionary {call: seconds} in the order of execution.
+        """
+        calls = list(calls)
+        parser = self.parser
+        timings = OrderedDict()
+        with parser_executor(max_workers) as executor:
+            futures = {}
+            for call in calls:
+                for method in self.IMPORT_PARSERS.get(call, ()):
+                    futures[method] = executor.submit(run_parser, parser, method)
+            pending = list(calls)
+            try:
+                while pending:
+                    ready = None
+                    for call in pending:
+                        dependencies = [dep for dep in self.IMPORT_DEPENDENCIES.get(call, ()) if dep in calls]
+                        if any(dep in pending for dep in dependencies):
+                            continue
+                        if all(futures[method].done() for method in self.IMPORT_PARSERS.get(call, ())):
+                            ready = call
+                            break
+                    if ready is None:
+                        running = [future for future in futures.values() if not future.done()]
+                        if not running:
+                            raise ValueError("Circular dependency between importers: {}".format(", ".join(pending)))
+                        wait(running, return_when=FIRST_COMPLETED)
+                        continue
+
+                    # Failed parsers are run again by the importer to get the error reported in the usual way.
+                    results = {}
+                    for method in self.IMPORT_PARSERS.get(ready, ()):
+                        if futures[method].exception() is None:
+                            results[method] = futures[method].result()
+                    self.parser = PrefetchedParser(parser, results)
+                    start_time = time.time()
+                    try:
+                        getattr(self, ready)()
+                    except Exception as e:
+                        if debug is True:
+                            self.uc.log_info(traceback.format_exc())
+                        else:
+                            raise
+                    timings[ready] = time.time() - start_time
+                    pending.remove(ready)
+            finally:
+                self.parser = parser
+                for future in futures.values():
+                    future.cancel()
+        return timings
+
+    def restore_override_cursor(self):
+        """
+        Restoring the override cursor. Exporters running in worker threads defer it to the main thread.
+        """
+        if isinstance(self.uc, DeferredUserCommunication):
+            self.uc.restore_override_cursor()
+        else:
+            QApplication.restoreOverrideCursor()
+
+    def export_read_only(self, gpkg_path, call, outdir, uc):
+        """
+        Running single exporter on its own read-only connection to the GeoPackage.
+        Messages and cursor changes are collected in 'uc'. Returns export result and execution time.
+        """
+        start_time = time.time()
+        con = read_only_connect(gpkg_path, check_same_thread=False)
+        try:
+            f2g = Flo2dGeoPackage(con, None)
+            f2g.chunksize = self.chunksize
+            f2g.uc = f2g.gutils.uc = uc
+            result = getattr(f2g, call)(outdir)
+            return result, time.time() - start_time
+        finally:
+            con.close()
+
+    def export_parallel(self, calls, outdir, max_workers=None):
+        """
+        Running exporters concurrently in a thread pool. Messages from exporters are shown in the 'calls' order
+        from the calling thread, also for exporters which failed.
+        Returns dictionary {call: (result, seconds)} and dictionary {call: exception} of the failed exporters.
+        """
+        gpkg_path = self.get_gpkg_path()
+        ucs = {call: DeferredUserCommunication("FLO-2D") for call in calls}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                call: executor.submit(self.export_read_only, gpkg_path, call, outdir, ucs[call]) for call in calls
+            }
+        results, errors = {}, {}
+        for call in calls:
+            try:
+                results[call] = futures[call].result()
+            except Exception as e:
+                errors[call] = e
+            finally:
+                ucs[call].flush(self.uc)
+        return results, errors
+
     def set_parser(self, fpath):
         self.parser = ParseDAT()
         self.parser.scan_project_dir(fpath)
@@ -66,35 +269,30 @@ class Flo2dGeoPackage(GeoPackageUtils):
         self.batch_execute(sql)
 
     def import_mannings_n_topo(self):
-        
+        """
+        Streaming import of MANNINGS_N.DAT and TOPO.DAT.
+        Files are parsed in chunks and squares are encoded in Python, all chunks are inserted in one transaction.
+        Triggers are suspended and the 'grid' R-tree is filled once after all rows are written.
+        """
         try:
-            sql = ["""INSERT INTO grid (fid, n_value, elevation, geom) VALUES""", 4]
-            
-            self.clear_tables("grid")
-            data = self.parser.parse_mannings_n_topo()
-            
-            c = 0
-            man = slice(0, 2)
-            coords = slice(2, 4)
-            elev = slice(4, None)
-            for row in data:
-                if c < self.chunksize:
-                    geom = " ".join(row[coords])
-                    g = self.build_square(geom, self.cell_size)
-                    sql += [tuple(row[man] + row[elev] + [g])]
-                    c += 1
-                else:
-                    self.batch_execute(sql)
-                    c = 0
-            if len(sql) > 2:
-                self.batch_execute(sql)
-            else:
-                pass
-        
+            start_time = time.time()
+            sql = """INSERT INTO grid (fid, n_value, elevation, geom) VALUES (?,?,?,?);"""
+
+            with self.bulk_write("grid"):
+                self.clear_tables("grid")
+                cells = 0
+                cur = self.con.cursor()
+                for mannings, topo in self.parser.parse_mannings_n_topo_chunks(self.chunksize):
+                    fids = mannings[:, 0].astype(int).tolist()
+                    geoms = squares_to_gpb(topo[:, 0], topo[:, 1], self.cell_size)
+                    cur.executemany(sql, zip(fids, mannings[:, 1].tolist(), topo[:, 2].tolist(), geoms))
+                    cells += len(fids)
+            self.uc.log_info("{0} grid cells imported in {1:.3f} seconds".format(cells, time.time() - start_time))
+
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 040521.1154: importing TOP.DAT!.\n", e)
-            
+
     def import_inflow(self):
         cont_sql = ["""INSERT INTO cont (name, value, note) VALUES""", 3]
         inflow_sql = ["""INSERT INTO inflow (time_series_fid, ident, inoutfc, bc_fid) VALUES""", 4]
@@ -644,7 +842,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 )
 
         except Exception:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_warn(
                 "ERROR 040220.0742: Importing hydraulic structures failed!\nPlease check HYSTRUC.DAT data format and values."
             )
@@ -1107,7 +1305,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 self.batch_execute(swmmflort_sql, data_sql)
                 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 150221.1535: importing SWMMFLORT.DAT failed!.\n", e)
         
     def import_swmmoutf(self):
@@ -1235,34 +1433,35 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1535: exporting CONT.DAT or TOLER.DAT failed!.\n", e)
             return False
 
     def export_mannings_n_topo(self, outdir):
         try:
-            sql = (
-                """SELECT fid, n_value, elevation, ST_AsText(ST_Centroid(GeomFromGPB(geom))) FROM grid ORDER BY fid;"""
-            )
-            records = self.execute(sql)
+            sql = """SELECT fid, n_value, elevation, geom FROM grid ORDER BY fid;"""
+            centroid_sql = """SELECT ST_X(ST_Centroid(GeomFromGPB(?))), ST_Y(ST_Centroid(GeomFromGPB(?)));"""
             mannings = os.path.join(outdir, "MANNINGS_N.DAT")
             topo = os.path.join(outdir, "TOPO.DAT")
 
-            mline = "{0: >10} {1: >10}\n"
-            tline = "{0: >15} {1: >15} {2: >10}\n"
+            mline = "%10d %10.3f\n"
+            tline = "%15.4f %15.4f %10.4f\n"
 
             with open(mannings, "w") as m, open(topo, "w") as t:
-                for row in records:
-                    fid, man, elev, geom = row
-                    x, y = geom.strip("POINT()").split()
-                    m.write(mline.format(fid, "{0:.3f}".format(man)))
-                    t.write(
-                        tline.format("{0:.4f}".format(float(x)), "{0:.4f}".format(float(y)), "{0:.4f}".format(elev))
-                    )
+                for rows in self.fetch_chunks(sql):
+                    mvalues, tvalues = [], []
+                    for fid, man, elev, geom in rows:
+                        center = gpb_envelope_center(geom)
+                        if center is None:
+                            center = self.execute(centroid_sql, (geom, geom)).fetchone()
+                        mvalues.extend((fid, man))
+                        tvalues.extend((center[0], center[1], elev))
+                    m.write(mline * len(rows) % tuple(mvalues))
+                    t.write(tline * len(rows) % tuple(tvalues))
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1541: exporting MANNINGS_N.DAT or TOPO.DAT failed!.\n", e)
             return False
 
@@ -1371,7 +1570,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
                             else:
                                 i.write(res_line1.format(*res))
 
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             if warning != "":
                 self.uc.show_warn(
                     "ERROR 180319.1020: error while exporting INFLOW.DAT!\n\n"
@@ -1382,7 +1581,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1542: exporting INFLOW.DAT failed!.\n", e)
             return False
 
@@ -1475,7 +1674,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
                     for b in border:
                         o.write(o_line.format("O", b)) 
                 
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             if warning != "":
                 msg = "ERROR 170319.2018: error while exporting OUTFLOW.DAT!<br><br>" +  warning
                 msg += "<br><br><FONT COLOR=red>Did you schematize the Boundary Conditions?</FONT>"
@@ -1483,7 +1682,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
  
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1543: exporting OUTFLOW.DAT failed!.\n", e)
             return False
 
@@ -1554,7 +1753,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1543: exporting RAIN.DAT failed!.\n", e)
             return False
 
@@ -1566,26 +1765,26 @@ class Flo2dGeoPackage(GeoPackageUtils):
             data_sql = """SELECT rrgrid, iraindum FROM raincell_data ORDER BY time_interval, rrgrid;"""
 
             line1 = "{0} {1} {2}\n"
-            line2 = "{0} {1}\n"
+            line2_nodata = "{0} 0\n"
+            line2_data = "{0} {1:.6f}\n"
 
             raincell_head = self.execute(head_sql).fetchone()
-            raincell_rows = self.execute(data_sql)
 
             raincell = os.path.join(outdir, "RAINCELL.DAT")
             with open(raincell, "w") as r:
                 r.write(line1.format(*raincell_head))
-                for row in raincell_rows:
-                    if row[1] is None:
-                        r.write(line2.format(row[0], "0"))
-                    else:
-                        # r.write(line2.format(*row))
-                        r.write(line2.format(row[0], "{0:.6f}".format(float(row[1]))))
-                        # r.write(tline.format('{0:.3f}'.format(float(x)), '{0:.3f}'.format(float(y)), '{0:.2f}'.format(elev)))
+                for rows in self.fetch_chunks(data_sql):
+                    r.write(
+                        "".join(
+                            line2_nodata.format(rrgrid) if iraindum is None else line2_data.format(rrgrid, float(iraindum))
+                            for rrgrid, iraindum in rows
+                        )
+                    )
 
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1558: exporting RAINCELL.DAT failed!.\n", e)
             return False
 
@@ -1669,7 +1868,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1559: exporting INFIL.DAT failed!.\n", e)
             return False
 
@@ -1703,7 +1902,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1544: exporting EVAPOR.DAT failed!.\n", e)
             return False
 
@@ -1842,7 +2041,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1607:  exporting XSEC.DAT  failed!.\n", e)
             return False
 
@@ -1923,7 +2122,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1608: exporting HYSTRUC.DAT failed!.\n", e)
             return False
 
@@ -1962,7 +2161,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1609: exporting STREET.DAT failed!.\n", e)
             return False
 
@@ -1972,11 +2171,16 @@ class Flo2dGeoPackage(GeoPackageUtils):
             if self.is_table_empty("blocked_cells"):
                 return False
             cont_sql = """SELECT name, value FROM cont WHERE name = 'IARFBLOCKMOD';"""
-            tbc_sql = """SELECT grid_fid, area_fid FROM blocked_cells WHERE arf = 1 ORDER BY grid_fid;"""
+            tbc_sql = """SELECT bc.grid_fid, uba.collapse
+                         FROM blocked_cells AS bc
+                         LEFT JOIN user_blocked_areas AS uba ON uba.fid = bc.area_fid
+                         WHERE bc.arf = 1 ORDER BY bc.grid_fid;"""
 
-            pbc_sql = """SELECT grid_fid, area_fid,  arf, wrf1, wrf2, wrf3, wrf4, wrf5, wrf6, wrf7, wrf8
-                         FROM blocked_cells WHERE arf < 1 ORDER BY grid_fid;"""
-            collapse_sql = """SELECT collapse FROM user_blocked_areas WHERE fid = ?;"""
+            pbc_sql = """SELECT bc.grid_fid, uba.collapse, bc.arf, bc.wrf1, bc.wrf2, bc.wrf3, bc.wrf4,
+                                bc.wrf5, bc.wrf6, bc.wrf7, bc.wrf8
+                         FROM blocked_cells AS bc
+                         LEFT JOIN user_blocked_areas AS uba ON uba.fid = bc.area_fid
+                         WHERE bc.arf < 1 ORDER BY bc.grid_fid;"""
 
             line1 = "S  {}\n"
             line2 = " T   {}\n"
@@ -1995,41 +2199,25 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 else:
                     pass
 
-                # Totally blocked grid elements:
-                for row in self.execute(tbc_sql):
-                    collapse = self.execute(collapse_sql, (row[1],)).fetchone()
-                    if collapse:
-                        cll = collapse[0]
-                    else:
-                        cll = 0
-                    cll = [cll if cll is not None else 0]
-                    cell = row[0]
-                    if cll[0] == 1:
-                        cell = -cell
-                    a.write(line2.format(cell))
+                # Totally blocked grid elements (collapsing ones are written with negative cell number):
+                for rows in self.fetch_chunks(tbc_sql):
+                    a.write("".join(line2.format(-cell if collapse == 1 else cell) for cell, collapse in rows))
 
                 # Partially blocked grid elements:
-                for row in self.execute(pbc_sql):
-                    row = [x if x is not None else "" for x in row]
-                    # Is there any side blocked? If not omit it:
-                    any_blocked = sum(row) - row[0] - row[1]
-                    if any_blocked > 0:
-                        collapse = self.execute(collapse_sql, (row[1],)).fetchone()
-                        if collapse:
-                            cll = collapse[0]
-                        else:
-                            cll = 0
-                        cll = [cll if cll is not None else 0]
-                        cell = row[0]
-                        if cll[0] == 1:
-                            cell = -cell
-                        a.write(line3.format(cell, *row[2:]))
-            #                     a.write(line3.format(*row))
+                for rows in self.fetch_chunks(pbc_sql):
+                    lines = []
+                    for cell, collapse, *factors in rows:
+                        # Is there any side blocked? If not omit it:
+                        if sum(factors) > 0:
+                            if collapse == 1:
+                                cell = -cell
+                            lines.append(line3.format(cell, *factors))
+                    a.write("".join(lines))
 
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1610: exporting ARF.DAT failed!.", e)
             return False
 
@@ -2072,7 +2260,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
                         m.write(line2.format(*vals))
                 
             except Exception as e:
-                QApplication.restoreOverrideCursor()
+                self.restore_override_cursor()
                 self.uc.show_error("ERROR 101218.1611: exporting MULT.DAT failed!.\n", e)
                 return False
         
@@ -2101,7 +2289,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 return True
     
             except Exception as e:
-                QApplication.restoreOverrideCursor()
+                self.restore_override_cursor()
                 self.uc.show_error("ERROR 101218.1611: exporting SIMPLE_MULT.DAT failed!.\n", e)
                 return False
             
@@ -2113,7 +2301,10 @@ class Flo2dGeoPackage(GeoPackageUtils):
             if self.is_table_empty("tolspatial"):
                 return False
             tol_poly_sql = """SELECT fid, tol FROM tolspatial ORDER BY fid;"""
-            tol_cells_sql = """SELECT grid_fid FROM tolspatial_cells WHERE area_fid = ? ORDER BY grid_fid;"""
+            tol_cells_sql = """SELECT tc.grid_fid, t.tol
+                               FROM tolspatial AS t
+                               JOIN tolspatial_cells AS tc ON tc.area_fid = t.fid
+                               ORDER BY t.fid, tc.grid_fid;"""
 
             line1 = "{0}  {1}\n"
 
@@ -2125,14 +2316,12 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 pass
             tolspatial_dat = os.path.join(outdir, "TOLSPATIAL.DAT")  # path and name of file to write
             with open(tolspatial_dat, "w") as t:
-                for fid, tol in tol_poly_rows:
-                    for row in self.execute(tol_cells_sql, (fid,)):
-                        gid = row[0]
-                        t.write(line1.format(gid, tol))
+                for rows in self.fetch_chunks(tol_cells_sql):
+                    t.write("".join(line1.format(gid, tol) for gid, tol in rows))
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1539: exporting TOLSPATIAL.DAT failed!", e)
             return False
 
@@ -2217,7 +2406,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
         except Exception:
             self.uc.log_info(traceback.format_exc())
             self.uc.show_warn('WARNING 060319.1613: Export to "GUTTER.DAT" failed!.')
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             return False
 
     def export_sed(self, outdir):
@@ -2294,7 +2483,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1612: exporting SED.DAT failed!.\n", e)
             return False
 
@@ -2350,7 +2539,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1614: exporting LEVEE.DAT failed!.\n", e)
             return False
 
@@ -2385,7 +2574,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1613: exporting FPXSEC.DAT failed!.\n", e)
             return False
 
@@ -2472,7 +2661,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1616: exporting BREACH.DAT failed!.\n", e)
             return False
 
@@ -2482,7 +2671,10 @@ class Flo2dGeoPackage(GeoPackageUtils):
             if self.is_table_empty("fpfroude"):
                 return False
             fpfroude_sql = """SELECT fid, froudefp FROM fpfroude ORDER BY fid;"""
-            cell_sql = """SELECT grid_fid FROM fpfroude_cells WHERE area_fid = ? ORDER BY grid_fid;"""
+            cell_sql = """SELECT fc.grid_fid, f.froudefp
+                          FROM fpfroude AS f
+                          JOIN fpfroude_cells AS fc ON fc.area_fid = f.fid
+                          ORDER BY f.fid, fc.grid_fid;"""
 
             line1 = "F {0} {1}\n"
 
@@ -2493,15 +2685,13 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 pass
             fpfroude_dat = os.path.join(outdir, "FPFROUDE.DAT")
             with open(fpfroude_dat, "w") as f:
-                for fid, froudefp in fpfroude_rows:
-                    for row in self.execute(cell_sql, (fid,)):
-                        gid = row[0]
-                        f.write(line1.format(gid, froudefp))
+                for rows in self.fetch_chunks(cell_sql):
+                    f.write("".join(line1.format(gid, froudefp) for gid, froudefp in rows))
 
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1617: exporting FPFROUDE.DAT failed!.\n", e)
             return False
 
@@ -2511,7 +2701,10 @@ class Flo2dGeoPackage(GeoPackageUtils):
             if self.is_table_empty("spatialshallow"):
                 return False
             shallow_sql = """SELECT fid, shallow_n FROM spatialshallow ORDER BY fid;"""
-            cell_sql = """SELECT grid_fid FROM spatialshallow_cells WHERE area_fid = ? ORDER BY grid_fid;"""
+            cell_sql = """SELECT sc.grid_fid, s.shallow_n
+                          FROM spatialshallow AS s
+                          JOIN spatialshallow_cells AS sc ON sc.area_fid = s.fid
+                          ORDER BY s.fid, sc.grid_fid;"""
 
             line1 = "{0} {1}\n"
 
@@ -2522,15 +2715,13 @@ class Flo2dGeoPackage(GeoPackageUtils):
                 pass
             shallow_dat = os.path.join(outdir, "SHALLOWN_SPATIAL.DAT")
             with open(shallow_dat, "w") as s:
-                for fid, shallow_n in shallow_rows:
-                    for row in self.execute(cell_sql, (fid,)):
-                        gid = row[0]
-                        s.write(line1.format(gid, shallow_n))
+                for rows in self.fetch_chunks(cell_sql):
+                    s.write("".join(line1.format(gid, shallow_n) for gid, shallow_n in rows))
 
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1901: exporting SHALLOWN_SPATIAL.DAT failed!", e)
             return False
 
@@ -2564,7 +2755,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1618: exporting SWMMFLO.DAT failed!.\n", e)
             return False
 
@@ -2672,7 +2863,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1619: exporting SWMMFLORT.DAT failed!.\n", e)
             return False
 
@@ -2699,7 +2890,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1620: exporting SWMMOUTF.DAT failed!.\n", e)
             return False
 
@@ -2729,7 +2920,7 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1621: exporting WSURF.DAT failed!.\n", e)
             return False
 
@@ -2759,6 +2950,6 @@ class Flo2dGeoPackage(GeoPackageUtils):
             return True
 
         except Exception as e:
-            QApplication.restoreOverrideCursor()
+            self.restore_override_cursor()
             self.uc.show_error("ERROR 101218.1622: exporting WSTIME.DAT failed!.\n", e)
             return False
@@ -9,7 +9,9 @@
 # of the License, or (at your option) any later version
 import os
 import numpy as np
-from ..flo2d_tools.grid_tools import rasters2centroids
+from itertools import repeat
+from ..flo2d_tools.grid_tools import layer_centroids
+from ..misc.gdal_utils import Affine, rowcol
 
 try:
     import h5py
@@ -17,9 +19,50 @@ except ImportError:
     pass
 
 
+def read_asc(asc_path):
+    """
+    Reading ESRI ASCII grid into a header dictionary and a (nrows, ncols) float array.
+    """
+    header = {}
+    with open(asc_path) as asc_file:
+        data = asc_file.read().split()
+    i = 0
+    while i < len(data) and data[i][0].isalpha():
+        header[data[i].lower()] = float(data[i + 1])
+        i += 2
+    nrows, ncols = int(header["nrows"]), int(header["ncols"])
+    values = np.array(data[i : i + nrows * ncols], dtype=float).reshape(nrows, ncols)
+    if "nodata_value" in header:
+        values[values == header["nodata_value"]] = np.nan
+    return header, values
+
+
+def asc_transform(header):
+    """
+    Affine transform of the ESRI ASCII grid upper left corner.
+    """
+    dx = header.get("cellsize", header.get("dx"))
+    dy = header.get("cellsize", header.get("dy"))
+    if "xllcenter" in header:
+        xmin = header["xllcenter"] - dx * 0.5
+    else:
+        xmin = header["xllcorner"]
+    if "yllcenter" in header:
+        ymin = header["yllcenter"] - dy * 0.5
+    else:
+        ymin = header["yllcorner"]
+    ymax = ymin + dy * header["nrows"]
+    return Affine(dx, 0.0, xmin, 0.0, -dy, ymax)
+
+
+IRAINDUM_DESCRIPTION = "Cumulative rainfall in inches or mm over the time interval."
+HDF_CHUNK_VALUES = 2 ** 18
+
+
 class ASCProcessor(object):
-    def __init__(self, vlayer, asc_dir):
+    def __init__(self, vlayer, asc_dir, gutils=None):
         self.vlayer = vlayer
+        self.gutils = gutils
         self.asc_dir = asc_dir
         self.asc_files = []
         self.rfc = None
@@ -45,29 +88,79 @@ class ASCProcessor(object):
             self.header += [interval_time, intervals_number, timestamp]
         return self.header
 
-    def rainfall_sampling(self):
+    def rainfall_intervals(self, xs, ys):
+        """
+        Generator of rainfall values sampled from the ASCII grids at the given points, one array per grid file.
+        Pixel indices are computed once and reused while the grids share the same geometry.
+        Points outside of the ASCII grid or on NODATA pixels are NaN.
+        """
+        geometry = None
+        rows, cols, inside = None, None, None
+        for pth in self.asc_files:
+            header, values = read_asc(pth)
+            asc_geometry = sorted((k, v) for k, v in header.items() if k != "nodata_value")
+            if asc_geometry != geometry:
+                geometry = asc_geometry
+                nrows, ncols = values.shape
+                rows, cols = rowcol(asc_transform(header), xs, ys, op=np.floor)
+                inside = np.flatnonzero((rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols))
+                rows, cols = rows[inside], cols[inside]
+            interval_values = np.full(xs.size, np.nan)
+            interval_values[inside] = values[rows, cols]
+            yield np.round(interval_values, 4)
 
-        for raster_values in rasters2centroids(self.vlayer, None, *self.asc_files):
-            yield raster_values
+    def rainfall_rows(self, time_step):
+        """
+        Generator of (time_interval, rrgrid, iraindum) rows for bulk insert into 'raincell_data'.
+        ASCII grids are read and sampled one at a time, so only a single interval is kept in memory.
+        """
+        fids, xs, ys = layer_centroids(self.vlayer, None, self.gutils)
+        fids = fids.tolist()
+        for i, interval_values in enumerate(self.rainfall_intervals(xs, ys)):
+            values = [None if val != val else val for val in interval_values.tolist()]
+            for row in zip(repeat(i * time_step), fids, values):
+                yield row
 
 
 class HDFProcessor(object):
     def __init__(self, hdf_path):
         self.hdf_path = hdf_path
 
-    def export_rainfall_to_binary_hdf5(self, header, data):
+    def write_header(self, hdf_file, header):
+        rainintime, irinters, timestamp = header
+        hdf_file.attrs["hdf5_version"] = np.array([h5py.version.hdf5_version], dtype=np.string_)
+        hdf_file.attrs["plugin"] = np.array(["FLO-2D"], dtype=np.string_)
+        grp = hdf_file.create_group("raincell")
+        tstamp = np.array([timestamp], dtype=np.string_)
+        datasets = [
+            ("RAININTIME", int(rainintime), "Time interval in minutes of the realtime rainfall data."),
+            ("IRINTERS", int(irinters), "Number of intervals in the dataset."),
+            ("TIMESTAMP", tstamp, "Timestamp indicates the start and end time of the storm."),
+        ]
+        for name, value, description in datasets:
+            dts = grp.create_dataset(name, data=value)
+            dts.attrs["description"] = np.array([description], dtype=np.string_)
+        return grp
+
+    def export_rainfall_chunks(self, header, cells_number, chunks, progress=None):
+        """
+        Writing rainfall into HDF5 file block by block of cells.
+        'chunks' yields arrays of (cells, IRINTERS) rainfall values in the 'rrgrid' order.
+        Only one block is kept in memory, 'progress' is called with the number of cells written so far.
+        """
+        irinters = int(header[1])
         with h5py.File(self.hdf_path, "w") as hdf_file:
-            rainintime, irinters, timestamp = header
-            hdf_file.attrs["hdf5_version"] = np.array([h5py.version.hdf5_version], dtype=np.string_)
-            hdf_file.attrs["plugin"] = np.array(["FLO-2D"], dtype=np.string_)
-            grp = hdf_file.create_group("raincell")
-            tstamp = np.array([timestamp], dtype=np.string_)
-            datasets = [
-                ("RAININTIME", np.int(rainintime), "Time interval in minutes of the realtime rainfall data."),
-                ("IRINTERS", np.int(irinters), "Number of intervals in the dataset."),
-                ("TIMESTAMP", tstamp, "Timestamp indicates the start and end time of the storm."),
-                ("IRAINDUM", np.array(data), "Cumulative rainfall in inches or mm over the time interval."),
-            ]
-            for name, value, description in datasets:
-                dts = grp.create_dataset(name, data=value)
-                dts.attrs["description"] = np.array([description], dtype=np.string_)
+            grp = self.write_header(hdf_file, header)
+            options = {}
+            if cells_number and irinters:
+                chunk_cells = max(1, min(cells_number, HDF_CHUNK_VALUES // irinters))
+                options = {"chunks": (chunk_cells, irinters, 1), "compression": "gzip", "shuffle": True}
+            dts = grp.create_dataset("IRAINDUM", shape=(cells_number, irinters, 1), dtype=float, **options)
+            dts.attrs["description"] = np.array([IRAINDUM_DESCRIPTION], dtype=np.string_)
+            written = 0
+            for block in chunks:
+                block_cells = block.shape[0]
+                dts[written : written + block_cells, :, 0] = block
+                written += block_cells
+                if progress is not None:
+                    progress(written)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+import time
+
+import numpy as np
+
+# Components placed on grid cells: (name, table, cell column, optional filter of the table rows).
+INFLOWS = ("Inflows", "inflow_cells", "grid_fid", None)
+OUTFLOWS = ("Outflows", "outflow_cells", "grid_fid", None)
+REDUCTION_FACTORS = ("Reduction Factors", "blocked_cells", "grid_fid", None)
+PARTIAL_ARF = ("Partial ARF", "blocked_cells", "grid_fid", "arf < 1.0")
+FULL_ARF = ("Full ARF", "blocked_cells", "grid_fid", "arf = 1.0")
+STRUCT_IN_CELLS = ("Hydr. Structures", "struct", "inflonod", None)
+STRUCT_OUT_CELLS = ("Hydr. Structures", "struct", "outflonod", None)
+LEFT_BANKS = ("Channels (Left Bank)", "chan_elems", "fid", None)
+RIGHT_BANKS = ("Channels (Right Bank)", "chan_elems", "rbankgrid", None)
+LEVEES = ("Levees", "levee_data", "grid_fid", None)
+MULT_CHANNELS = ("Mult. Channels", "mult_cells", "grid_fid", None)
+SD_INLETS = ("Storm Drain Inlets", "swmmflo", "swmm_jt", None)
+SD_OUTFALLS = ("Storm Drain Outfalls", "swmmoutf", "grid_fid", None)
+STREETS = ("Streets", "street_seg", "igridn", None)
+
+# Conflict rules: (component 1, component 2, description).
+# Rule with the same component twice reports cells holding more than one of its elements.
+CONFLICT_RULES = [
+    # Inflow conflicts:
+    (INFLOWS, INFLOWS, "2 or more inflows"),
+    (INFLOWS, OUTFLOWS, "Inflow and outflow in same cell"),
+    (INFLOWS, REDUCTION_FACTORS, "Inflow and Reduction Factors in same cell (check partial ARF, full ARF, or WRF)"),
+    (INFLOWS, STRUCT_IN_CELLS, "Inflow and Hyd. Struct in-cell in same cell"),
+    (INFLOWS, STRUCT_OUT_CELLS, "Inflow and Hyd. Struct out-cell in same cell"),
+    (INFLOWS, LEFT_BANKS, "Inflow and Channel Left Bank in same cell"),
+    (INFLOWS, RIGHT_BANKS, "Inflow and Channel Right Bank in same cell"),
+    (INFLOWS, LEVEES, "Inflow and levee in same cell"),
+    (INFLOWS, MULT_CHANNELS, "Inflow and Multiple Channels in same cell"),
+    (INFLOWS, SD_INLETS, "Inflow and Storm Drain Inlet in same cell"),
+    (INFLOWS, SD_OUTFALLS, "Inflow and Storm Drain Outfall in same cell"),
+    # Outflow conflicts:
+    (OUTFLOWS, OUTFLOWS, "2 or more outflows"),
+    (OUTFLOWS, REDUCTION_FACTORS, "Outflow and Reduction Factors in same cell (check partial ARF, full ARF, or WRF)"),
+    (OUTFLOWS, STRUCT_IN_CELLS, "Outflow and Hyd. Struct in-cell in same cell"),
+    (OUTFLOWS, STRUCT_OUT_CELLS, "Outflow and Hyd. Struct out-cell in same cell"),
+    (OUTFLOWS, LEFT_BANKS, "Outflow and Channel Left Bank in same cell"),
+    (OUTFLOWS, RIGHT_BANKS, "Outflow and Channel Right Bank in same cell"),
+    (OUTFLOWS, LEVEES, "Outflow and levee in same cell"),
+    (OUTFLOWS, MULT_CHANNELS, "Outflow and Multiple Channels in same cell"),
+    (OUTFLOWS, SD_INLETS, "Outflow and Storm Drain Inlet in same cell"),
+    (OUTFLOWS, SD_OUTFALLS, "Outflow and Storm Drain Outfall in same cell"),
+    (OUTFLOWS, STREETS, "Outflow and Street in same cell"),
+    # Reduction Factors conflicts:
+    (
+        REDUCTION_FACTORS,
+        REDUCTION_FACTORS,
+        "Duplicate Reduction Factors in same cell (check partial ARF, full ARF, or WRF)",
+    ),
+    (REDUCTION_FACTORS, STRUCT_IN_CELLS, "Reduction Factors and Hyd. Struct in-cell in same cell (not recomended)"),
+    (REDUCTION_FACTORS, STRUCT_OUT_CELLS, "Reduction Factors and Hyd. Struc out-cell in same cell (not recomended)"),
+    (REDUCTION_FACTORS, LEFT_BANKS, "Reduction Factors and Channel Left Bank in same cell"),
+    (REDUCTION_FACTORS, RIGHT_BANKS, "Reduction Factors and Channel Right Bank in same cell"),
+    (REDUCTION_FACTORS, LEVEES, "Reduction Factors and Levees in same cell (not recomended)"),
+    (REDUCTION_FACTORS, MULT_CHANNELS, "Reduction Factors and Multiple Channels in same cell (not recomended)"),
+    (REDUCTION_FACTORS, SD_INLETS, "Reduction Factors and Storm Drain Inlet in same cell (not recomended)"),
+    (REDUCTION_FACTORS, SD_OUTFALLS, "Reduction Factors and Storm Drain Outfall in same cell (not recomended)"),
+    # Hydraulic Structures conflicts:
+    (STRUCT_IN_CELLS, STRUCT_IN_CELLS, "More than one Hyd. Struct in-cell in same element"),
+    (STRUCT_OUT_CELLS, STRUCT_OUT_CELLS, "More than one Hyd. Struc out-cell in same element"),
+    (STRUCT_IN_CELLS, STRUCT_OUT_CELLS, "Hyd. Struct in-cell and Hyd. Struct out-cell in same element"),
+    (STRUCT_IN_CELLS, RIGHT_BANKS, "Hyd. Struc in-cell and Channel Right Bank in same cell"),
+    (STRUCT_OUT_CELLS, RIGHT_BANKS, "Hyd. Struc out-cell and Channel Right Bank in same cell"),
+    (STRUCT_IN_CELLS, LEVEES, "Hyd. Struc in-cell and Levee in same element (not recomended)"),
+    (STRUCT_OUT_CELLS, LEVEES, "Hyd. Struct out-cell and Levee in same element (not recomended)"),
+    (STRUCT_IN_CELLS, MULT_CHANNELS, "Hyd. Struc in-cell and Multiple Channel in same cell"),
+    (STRUCT_OUT_CELLS, MULT_CHANNELS, "Hyd. Struct out-cell and Multiple Channel in same cell"),
+    (STRUCT_IN_CELLS, SD_INLETS, "Hyd. Struc in-cell and Storm Drain Inlet in same cell"),
+    (STRUCT_OUT_CELLS, SD_OUTFALLS, "Hyd. Struct out-cell and Storm Drain Outlet in same cell (not recomended)"),
+    (STRUCT_IN_CELLS, STREETS, "Hyd. Struc in-cell and Street in same cell"),
+    (STRUCT_OUT_CELLS, STREETS, "Hyd. Struct out-cell and Streett in same cell"),
+    # Channels conflicts:
+    (LEFT_BANKS, LEFT_BANKS, "2 or more Channel Left Banks in same cell"),
+    (LEFT_BANKS, RIGHT_BANKS, "Channel Left Bank and Channel Right Bank in same cell"),
+    # TODO: left bank and right bank are in same attribute, this is wrong!!
+    (RIGHT_BANKS, RIGHT_BANKS, "2 or more Channel Right Banks in same cell"),
+    (LEFT_BANKS, LEVEES, "Channel Left Bank and Levee in same cell"),
+    (RIGHT_BANKS, LEVEES, "Channel Right Bank and Levee in same cell"),
+    (LEFT_BANKS, MULT_CHANNELS, "Channel Left Bank and Multiple Channel in same cell"),
+    (RIGHT_BANKS, MULT_CHANNELS, "Channel Right Bank and Multiple Channel same cell"),
+    (RIGHT_BANKS, SD_INLETS, "Channel Right Bank and Storm Drain Inlet same cell"),
+    (RIGHT_BANKS, SD_OUTFALLS, "Channel Right Bank and Storm Drain Outfall same cell"),
+    (LEFT_BANKS, STREETS, "Channel Left Bank and Street in same cell"),
+    (RIGHT_BANKS, STREETS, "Channel Right Bank and Street in same cell"),
+    # Levee conflicts:
+    (LEVEES, LEVEES, "2 or more Levees in same cell (review)"),
+    (LEVEES, MULT_CHANNELS, "Levee and Multiple Channels in same cell"),
+    (LEVEES, SD_INLETS, "Levee and Storm Drain Inlet in same cell"),
+    (LEVEES, SD_OUTFALLS, "Levee and Storm Drain Outfall in same cell"),
+    # Multiple Channels conflicts:
+    (MULT_CHANNELS, MULT_CHANNELS, "2 or more Multiple Channels in same cell"),
+    (MULT_CHANNELS, SD_INLETS, "Multiple Channels and Storm Drain Inlet in same cell"),
+    (MULT_CHANNELS, SD_OUTFALLS, "Multiple Channels and Storm Drain Outfall in same cell"),
+    (MULT_CHANNELS, STREETS, "Multiple Channels and Street in same cell"),
+    # Storm Drain inlets conflicts:
+    (SD_INLETS, SD_INLETS, "2 or more Storm Drain Inlets in same cell"),
+    (SD_INLETS, SD_OUTFALLS, "Storm Drain Inlet and Storm Drain Outfall in same cell"),
+    # Storm Drain outfalls conflicts:
+    (SD_OUTFALLS, SD_OUTFALLS, "2 or more Storm Drain Outfalls in same cell"),
+    # Street conflicts:
+    (STREETS, STREETS, "2 or more Streets in same cell"),
+]
+
+
+def rule_selected(comp1, comp2, issue1, issue2):
+    """
+    Checking if the rule between components named 'comp1' and 'comp2' matches the issues chosen by the user.
+    """
+    return (
+        (issue1 == "All" and issue2 in ("All", ""))
+        or (issue1 == "" and issue2 == "All")
+        or (issue1 == "All" and issue2 in (comp1, comp2))
+        or (issue2 == "All" and issue1 in (comp1, comp2))
+        or (comp1 == issue1 and comp2 in issue2)
+        or (comp2 == issue1 and comp1 in issue2)
+    )
+
+
+class Conflicts(object):
+    """
+    Finding cells shared by components which shouldn't be placed together.
+    Cells of all components are read at once into the map of component cells and every rule is evaluated on it.
+    """
+
+    def __init__(self, gutils):
+        self.gutils = gutils
+        self.components = {}
+        self.timings = []
+
+    @staticmethod
+    def component_key(component):
+        return component[1:]
+
+    def load_components(self, components):
+        """
+        Materializing sorted unique cells (with number of elements in each cell) of the components in one query.
+        """
+        keys = []
+        for component in components:
+            key = self.component_key(component)
+            if key not in self.components and key not in keys:
+                keys.append(key)
+        if not keys:
+            return
+        selects = []
+        for i, (table, column, condition) in enumerate(keys):
+            where = "{0} IS NOT NULL".format(column)
+            if condition:
+                where += " AND {0}".format(condition)
+            selects.append("SELECT {0}, CAST({1} AS INTEGER) FROM {2} WHERE {3}".format(i, column, table, where))
+        qry = " UNION ALL ".join(selects) + ";"
+        rows = np.array(self.gutils.execute(qry).fetchall(), dtype=np.int64).reshape(-1, 2)
+        for i, key in enumerate(keys):
+            self.components[key] = np.unique(rows[rows[:, 0] == i, 1], return_counts=True)
+
+    def component_cells(self, component):
+        key = self.component_key(component)
+        if key not in self.components:
+            self.load_components([component])
+        return self.components[key]
+
+    def shared_cells(self, comp1, comp2):
+        """
+        Sorted cells holding both components (or more than one element if both components are the same).
+        """
+        cells1, counts1 = self.component_cells(comp1)
+        if self.component_key(comp1) == self.component_key(comp2):
+            return cells1[counts1 > 1]
+        cells2, counts2 = self.component_cells(comp2)
+        return np.intersect1d(cells1, cells2, assume_unique=True)
+
+    def check(self, rules):
+        """
+        Evaluating conflict rules. Returns list of [cell, component 1 name, component 2 name, description] errors.
+        Time spent on each rule is stored in 'timings' as (description, seconds, number of conflicting cells).
+        """
+        start_time = time.time()
+        self.load_components([comp for comp1, comp2, description in rules for comp in (comp1, comp2)])
+        self.timings = [("Reading cells of the components", time.time() - start_time, 0)]
+        errors = []
+        for comp1, comp2, description in rules:
+            start_time = time.time()
+            cells = self.shared_cells(comp1, comp2)
+            errors += [[str(cell), comp1[0], comp2[0], description] for cell in cells.tolist()]
+            self.timings.append((description, time.time() - start_time, cells.size))
+        return errors
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+import re
+import numpy as np
+
+# Cell number written as an optionally signed integer.
+CELL_PATTERN = re.compile(r"[+-]?[0-9]+")
+
+
+def parse_cells(values):
+    """
+    Converting cell numbers written as text into integers.
+    Returns (cells, valid) arrays, cells lower than 1 are moved to cell 1 and values which aren't integers are invalid.
+    """
+    texts = [str(value).strip() for value in values]
+    valid = np.array([CELL_PATTERN.fullmatch(text) is not None for text in texts], dtype=bool)
+    cells = np.ones(len(texts), dtype=np.int64)
+    if valid.any():
+        cells[valid] = [int(text) for text, is_valid in zip(texts, valid.tolist()) if is_valid]
+    cells[cells < 1] = 1
+    return cells, valid
+
+
+def read_debug_file(debug_file):
+    """
+    Reading issues reported in the FLO-2D DEBUG file.
+    Returns list of [cell, code, description] errors together with the array of their cells.
+    Lines with less than 3 values or with a cell which isn't an integer are skipped.
+    """
+    with open(debug_file, "r") as f:
+        rows = [row for row in (line.split(",") for line in f.read().splitlines()) if len(row) >= 3]
+    cells, valid = parse_cells([row[0] for row in rows])
+    errors = []
+    for row, cell, is_valid in zip(rows, cells.tolist(), valid.tolist()):
+        if is_valid:
+            errors.append([str(cell), row[1].strip(), ", ".join(row[2:]).strip()])
+    return errors, cells[valid]
+
+
+def read_issues_file(issues_file, header_lines):
+    """
+    Reading rows of whitespace separated values from the FLO-2D issues file (e.g. DEPRESSED_ELEMENTS.OUT).
+    Header lines and empty rows are skipped.
+    """
+    with open(issues_file, "r") as f:
+        lines = f.read().splitlines()[header_lines:]
+    return [values for values in (line.split() for line in lines) if values]
@@ -8,14 +8,35 @@
 # as published by the Free Software Foundation; either version 2
 # of the License, or (at your option) any later version
 from qgis.PyQt.QtCore import QVariant
-from qgis.core import QgsFeatureRequest, QgsField, QgsFeature, QgsGeometry, QgsVectorLayer, QgsWkbTypes, NULL
+from qgis.core import QgsFeatureRequest, QgsField, QgsFeature, QgsGeometry, QgsPoint, QgsVectorLayer, QgsWkbTypes, NULL
 from qgis.analysis import QgsZonalStatistics
 from collections import defaultdict
-from .grid_tools import TINInterpolator, spatial_index, spatial_centroids_index, poly2grid, poly2poly, polygons_statistics, gridRegionGenerator
-from .schematic_tools import get_intervals, interpolate_along_line, polys2levees
+from .grid_index import cached_grid_index
+from .grid_tools import (
+    Delaunay,
+    DelaunayInterpolator,
+    TINInterpolator,
+    spatial_index,
+    spatial_centroids_index,
+    poly2grid,
+    poly2poly,
+    polygons_statistics,
+    raster_grid_statistics,
+    raster_zonal_statistics,
+    gridRegionGenerator,
+)
+from .schematic_tools import (
+    get_intervals,
+    interpolate_intervals,
+    levee_sides_by_line,
+    locate_on_line,
+    polygon_levee_value,
+)
 import functools
 import time
 
+import numpy as np
+
 
 def timer(func):
     """Print the runtime of the decorated function"""
@@ -152,23 +173,31 @@ class LeveesElevation(ElevationCorrector):
 
     @timer
     def elevation_from_points(self, search_buffer):
-        cur = self.gutils.con.cursor()
+        sides = levee_sides_by_line(self.gutils)
+        set_qry = "UPDATE levee_data SET levcrest = ? WHERE fid = ?;"
+        add_qry = "UPDATE levee_data SET levcrest = levcrest + ? WHERE fid = ?;"
+        set_values, add_values = [], []
         for feat in self.user_levees.getFeatures():
-            rect_bounds = feat.geometry().buffer(search_buffer,5).boundingBox()
-            user_point_features = self.user_points.getFeatures(QgsFeatureRequest().setFilterRect(rect_bounds))
+            if feat["fid"] not in sides:
+                continue
+            rect_bounds = feat.geometry().buffer(search_buffer, 5).boundingBox()
+            user_point_features = list(self.user_points.getFeatures(QgsFeatureRequest().setFilterRect(rect_bounds)))
             try:
-                qry = "UPDATE levee_data SET levcrest = ? WHERE fid = ?;"
+                qry_values = set_values
                 intervals = get_intervals(feat, user_point_features, self.ELEVATION_FIELD, search_buffer)
             except TypeError:
-                qry = "UPDATE levee_data SET levcrest = levcrest + ? WHERE fid = ?;"
+                qry_values = add_values
                 intervals = get_intervals(feat, user_point_features, self.CORRECTION_FIELD, search_buffer)
-            interpolated = interpolate_along_line(feat, self.schema_levees.getFeatures(), intervals)
-            try:
-                for elev, fid in interpolated:
-                    cur.execute(qry, (round(elev, 3), fid))
-            except IndexError:
+            if not intervals:
                 continue
-        self.gutils.con.commit()
+            fids, xs, ys, levcrests = sides[feat["fid"]]
+            lgeom = feat.geometry()
+            distances = locate_on_line(lgeom, xs, ys)[0]
+            elevs = interpolate_intervals(distances / lgeom.length(), intervals)
+            qry_values += [(round(elev, 3), fid) for elev, fid in zip(elevs.tolist(), fids.tolist())]
+        with self.gutils.transaction():
+            self.gutils.execute_many(set_qry, set_values)
+            self.gutils.execute_many(add_qry, add_values)
 
     def elevation_from_lines(self, regionReq=None):
         cur = self.gutils.con.cursor()
@@ -213,17 +242,40 @@ class LeveesElevation(ElevationCorrector):
                 
     @timer
     def elevation_from_polygons(self):
+        sides = levee_sides_by_line(self.gutils)
+        allfeatures, index = spatial_index(self.user_polygons)
+        engines = {}
         qry_values = []
         qry = "UPDATE levee_data SET levcrest = ? WHERE fid = ?;"
         for feat in self.user_levees.getFeatures():
-            poly_values = polys2levees(
-                feat, self.user_polygons, self.schema_levees, self.ELEVATION_FIELD, self.CORRECTION_FIELD
-            )
-            for elev, fid in poly_values:
-                qry_values.append((round(elev, 3), fid))
-        cur = self.gutils.con.cursor()
-        cur.executemany(qry, qry_values)
-        self.gutils.con.commit()
+            if feat["fid"] not in sides:
+                continue
+            lgeom = feat.geometry()
+            poly_fids = [
+                fid for fid in index.intersects(lgeom.boundingBox()) if allfeatures[fid].geometry().intersects(lgeom)
+            ]
+            if not poly_fids:
+                continue
+            for fid in poly_fids:
+                if fid not in engines:
+                    engine = QgsGeometry.createGeometryEngine(allfeatures[fid].geometry().constGet())
+                    engine.prepareGeometry()
+                    engines[fid] = engine
+            fids, xs, ys, levcrests = sides[feat["fid"]]
+            # Levee sides centroids are snapped to the user levee line and next tested for intersecting with polygons.
+            __, snapped_xs, snapped_ys = locate_on_line(lgeom, xs, ys)
+            for fid, x, y, levcrest in zip(fids.tolist(), snapped_xs.tolist(), snapped_ys.tolist(), levcrests):
+                pnt = QgsPoint(x, y)
+                for poly_fid in poly_fids:
+                    if not engines[poly_fid].contains(pnt):
+                        continue
+                    poly = allfeatures[poly_fid]
+                    poly_val = polygon_levee_value(poly[self.ELEVATION_FIELD], poly[self.CORRECTION_FIELD], levcrest)
+                    if poly_val is None:
+                        continue
+                    qry_values.append((round(poly_val, 3), fid))
+                    break
+        self.gutils.execute_many(qry, qry_values)
 
 
 class GridElevation(ElevationCorrector):
@@ -236,6 +288,7 @@ class GridElevation(ElevationCorrector):
         self.threshold = 1
         self.only_selected = None
         self.request = None
+        self.numpy_tin = False
 
     def setup_layers(self):
         self.setup_elevation_layers()
@@ -281,30 +334,43 @@ class GridElevation(ElevationCorrector):
 
         self.gutils.con.commit()
 
+    def use_numpy_tin(self):
+        """
+        Checking if TIN should be built with scipy Delaunay triangulation instead of QGIS TIN interpolator.
+        """
+        return self.numpy_tin is True and Delaunay is not None
+
+    def grid_elevations_from_tin(self, tin, grid_fids):
+        """
+        Setting elevation of the grid cells to TIN values interpolated at cells centroids.
+        Cells outside of the TIN are left unchanged.
+        """
+        fids = np.unique(np.asarray(grid_fids, dtype=np.int64))
+        xs, ys = cached_grid_index(self.gutils).centroids(fids)
+        found = ~np.isnan(xs)
+        fids, xs, ys = fids[found], xs[found], ys[found]
+        values = tin.tin_at_points(xs, ys)
+        interpolated = ~np.isnan(values)
+        qry = "UPDATE grid SET elevation = ? WHERE fid = ?;"
+        qry_values = zip(np.round(values[interpolated], 3).tolist(), fids[interpolated].tolist())
+        with self.gutils.transaction():
+            self.gutils.execute_many(qry, qry_values)
+
     def elevation_from_tin(self):
         if self.only_selected is True:
             request = self.request
         else:
             request = None
         self.add_virtual_sum(self.user_points)
-        tin = TINInterpolator(self.user_points, self.VIRTUAL_SUM)
-        tin.setup_layer_data()
+        if self.use_numpy_tin():
+            tin = DelaunayInterpolator.from_layer(self.user_points, self.VIRTUAL_SUM)
+        else:
+            tin = TINInterpolator(self.user_points, self.VIRTUAL_SUM)
+            tin.setup_layer_data()
         grid_fids = [
             val[-1] for val in poly2grid(self.grid, self.user_polygons, request, True, True, False, self.threshold)
         ]
-        request = QgsFeatureRequest().setFilterFids(grid_fids)
-        qry_values = []
-        qry = "UPDATE grid SET elevation = ? WHERE fid = ?;"
-        for feat in self.grid.getFeatures(request):
-            geom = feat.geometry()
-            centroid = geom.centroid().asPoint()
-            succes, value = tin.tin_at_xy(centroid.x(), centroid.y())
-            if succes != 0:
-                continue
-            qry_values.append((round(value, 3), feat.id()))
-        cur = self.gutils.con.cursor()
-        cur.executemany(qry, qry_values)
-        self.gutils.con.commit()
+        self.grid_elevations_from_tin(tin, grid_fids)
         self.remove_virtual_sum(self.user_points)
 
     def tin_elevation_within_polygons(self):
@@ -327,26 +393,20 @@ class GridElevation(ElevationCorrector):
                 grid_geom = grid_feat.geometry()
                 if line_geom_engine.intersects(grid_geom.constGet()):
                     boundary_grid_fids.append(gid)
-        boundary_request = QgsFeatureRequest().setFilterFids(boundary_grid_fids)
-        grid_centroids = self.centroid_layer(self.grid, boundary_request)
-        tin = TINInterpolator(grid_centroids, "elevation")
-        tin.setup_layer_data()
+        if self.use_numpy_tin():
+            grid_index = cached_grid_index(self.gutils)
+            boundary_fids = np.unique(np.asarray(boundary_grid_fids, dtype=np.int64))
+            xs, ys = grid_index.centroids(boundary_fids)
+            tin = DelaunayInterpolator(xs, ys, grid_index.elevations(boundary_fids))
+        else:
+            boundary_request = QgsFeatureRequest().setFilterFids(boundary_grid_fids)
+            grid_centroids = self.centroid_layer(self.grid, boundary_request)
+            tin = TINInterpolator(grid_centroids, "elevation")
+            tin.setup_layer_data()
         grid_fids = [
             val[-1] for val in poly2grid(self.grid, self.user_polygons, request, True, True, False, self.threshold)
         ]
-        request = QgsFeatureRequest().setFilterFids(grid_fids)
-        qry_values = []
-        qry = "UPDATE grid SET elevation = ? WHERE fid = ?;"
-        for feat in self.grid.getFeatures(request):
-            geom = feat.geometry()
-            centroid = geom.centroid().asPoint()
-            succes, value = tin.tin_at_xy(centroid.x(), centroid.y())
-            if succes != 0:
-                continue
-            qry_values.append((round(value, 3), feat.id()))
-        cur = self.gutils.con.cursor()
-        cur.executemany(qry, qry_values)
-        self.gutils.con.commit()
+        self.grid_elevations_from_tin(tin, grid_fids)
 
     def elevation_within_arf(self, calculation_type):
         if calculation_type == "Mean":
@@ -431,11 +491,12 @@ class ExternalElevation(ElevationCorrector):
         self.raster = raster
         self.statistics_per_grid = statistics_per_grid
 
-    def import_features(self, fids_values):
+    def import_features(self, fids_values, source=None):
+        source = self.polygons if source is None else source
         copy_request = QgsFeatureRequest().setFilterFids(list(fids_values.keys()))
         fields = self.user_polygons.fields()
         self.user_polygons.startEditing()
-        for feat in self.polygons.getFeatures(copy_request):
+        for feat in source.getFeatures(copy_request):
             values = fids_values[feat.id()]
             new_feat = QgsFeature()
             new_feat.setFields(fields)
@@ -532,25 +593,71 @@ class ExternalElevation(ElevationCorrector):
             self.import_features(fids_elevs)
 
     def elevation_raster_statistics(self):
+        if self.statistics not in ("Mean", "Max", "Min"):
+            raise ValueError
+        grid_fids = self.selected_grid_fids() if self.statistics_per_grid else None
+        try:
+            zones_values = self.numpy_raster_statistics(grid_fids)
+        except (ImportError, RuntimeError, ValueError):
+            # Raster which can't be read with GDAL (or a rotated one) is processed with QGIS zonal statistics.
+            self.qgis_raster_statistics()
+            return
+        if self.statistics_per_grid:
+            grid_values = [(round(value, 3), gid) for gid, value in zones_values]
+            copied_values = {gid: {"elev": elev} for elev, gid in grid_values}
+            source = self.grid
+        else:
+            poly_values = {fid: round(value, 3) for fid, value in zones_values}
+            grid_gen = poly2grid(
+                self.grid, self.polygons, self.request, self.only_centroids, True, False, self.threshold
+            )
+            grid_values = [(poly_values[fid], gid) for fid, gid in grid_gen if fid in poly_values]
+            copied_values = {fid: {"elev": elev} for fid, elev in poly_values.items()}
+            source = self.polygons
+        qry = "UPDATE grid SET elevation = ? WHERE fid = ?;"
+        with self.gutils.transaction():
+            self.gutils.execute_many(qry, grid_values)
+        if self.copy_features is True:
+            self.import_features(copied_values, source)
+
+    def selected_grid_fids(self):
+        grid_fids = set()
+        allfeatures, index = spatial_centroids_index(self.grid) if self.only_centroids else spatial_index(self.grid)
+        poly_feats = self.polygons.getFeatures() if self.request is None else self.polygons.getFeatures(self.request)
+        for poly_feat in poly_feats:
+            poly_geom = poly_feat.geometry()
+            for gid in index.intersects(poly_geom.boundingBox()):
+                grid_feat = allfeatures[gid]
+                if grid_feat.geometry().intersects(poly_geom):
+                    grid_fids.add(gid)
+        return list(grid_fids)
+
+    def numpy_raster_statistics(self, grid_fids=None):
+        """
+        Raster statistics of the grid cells (or of the polygons if 'grid_fids' is None) calculated with NumPy.
+        Returns list of (fid, value).
+        """
+        raster_path = self.raster.source()
+        if grid_fids is not None:
+            fids_values = raster_grid_statistics(raster_path, self.gutils, grid_fids, self.statistics)
+            if fids_values is None:
+                grid_request = QgsFeatureRequest().setFilterFids(grid_fids)
+                zones = ((feat.id(), feat.geometry()) for feat in self.grid.getFeatures(grid_request))
+                fids_values = raster_zonal_statistics(raster_path, zones, self.statistics)
+            return fids_values
+        feats = self.polygons.getFeatures() if self.request is None else self.polygons.getFeatures(self.request)
+        zones = ((feat.id(), feat.geometry()) for feat in feats)
+        return raster_zonal_statistics(raster_path, zones, self.statistics)
+
+    def qgis_raster_statistics(self):
         if self.statistics == "Mean":
             stats = QgsZonalStatistics.Mean
         elif self.statistics == "Max":
             stats = QgsZonalStatistics.Max
-        elif self.statistics == "Min":
-            stats = QgsZonalStatistics.Min
         else:
-            raise ValueError
+            stats = QgsZonalStatistics.Min
         if self.statistics_per_grid:
-            selected_polygons_layer = self.duplicate_layer(self.polygons, self.request)
-            grid_fids = set()
-            allfeatures, index = spatial_centroids_index(self.grid) if self.only_centroids else spatial_index(self.grid)
-            for poly_feat in selected_polygons_layer.getFeatures():
-                poly_geom = poly_feat.geometry()
-                for gid in index.intersects(poly_geom.boundingBox()):
-                    grid_feat = allfeatures[gid]
-                    if grid_feat.geometry().intersects(poly_geom):
-                        grid_fids.add(gid)
-            subgrid_request = QgsFeatureRequest().setFilterFids(list(grid_fids))
+            subgrid_request = QgsFeatureRequest().setFilterFids(self.selected_grid_fids())
             self.polygons = self.duplicate_layer(self.grid, subgrid_request)
             self.only_centroids = True
         else:
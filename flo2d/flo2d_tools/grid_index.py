@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+
+import numpy as np
+
+GPB_ENVELOPE_DTYPE = np.dtype(
+    [("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("srid", "<i4"), ("envelope", "<f8", (4,))]
+)
+
+# Raster (row, column) offsets of the neighbour cells indexed with FLO-2D direction codes:
+# 1 - N, 2 - E, 3 - S, 4 - W, 5 - NE, 6 - SE, 7 - SW, 8 - NW (0 is the cell itself).
+DIRECTION_OFFSETS = np.array(
+    [[0, 0], [-1, 0], [0, 1], [1, 0], [0, -1], [-1, 1], [1, 1], [1, -1], [-1, -1]],
+    dtype=int,
+)
+
+# Order of neighbours used by the adjacent cells tools: N, NE, E, SE, S, SW, W, NW.
+ADJACENT_DIRECTIONS = np.array([1, 5, 2, 6, 3, 7, 4, 8], dtype=int)
+
+GRID_INDEXES = {}
+
+
+class GridIndex(object):
+    """
+    In-memory NumPy index of the 'grid' table.
+    Cells are placed into a raster of fids, so point, centroid and neighbour lookups are plain array indexing.
+    """
+
+    # Part of the grid above which changed cells are not patched one by one, but the whole index is reloaded.
+    PATCH_LIMIT = 0.1
+    PATCH_CHUNK = 500
+
+    def __init__(self, con):
+        self.con = con
+        self.watching = False
+        self.changed_fids = set()
+        self.reload_needed = True
+        self.transaction_fids = set()
+        self.transaction_reload = False
+        self.uncommitted = False
+        self.stamp = None
+        self.total_changes = None
+        self.regular = False
+        self.clear()
+        self.cell_size = None
+        self.xmin = None
+        self.ymax = None
+        self.refresh()
+
+    def grid_changed(self, fid):
+        """
+        Callback of the temporary grid triggers collecting changed fids (NULL for inserted or deleted cells).
+        """
+        if fid is None or len(self.changed_fids) > self.fids.size * self.PATCH_LIMIT:
+            self.reload_needed = True
+        elif not self.reload_needed:
+            self.changed_fids.add(fid)
+
+    def watch(self):
+        """
+        Creating temporary triggers reporting changes of the grid table made through this connection.
+        Updates report changed fids, inserts and deletes request a full reload.
+        """
+        triggers = (
+            ("insert", "INSERT", "NULL"),
+            ("delete", "DELETE", "NULL"),
+            ("update", "UPDATE OF fid, elevation, geom", "OLD.fid), flo2d_grid_index_changed(NEW.fid"),
+        )
+        try:
+            self.con.create_function("flo2d_grid_index_changed", 1, self.grid_changed)
+            for name, event, fids in triggers:
+                qry = """
+                CREATE TEMP TRIGGER IF NOT EXISTS grid_index_{0} AFTER {1} ON main.grid
+                BEGIN
+                    SELECT flo2d_grid_index_changed({2});
+                END;"""
+                self.con.execute(qry.format(name, event, fids))
+            self.watching = True
+        except Exception:
+            self.watching = False
+
+    def unwatch(self):
+        """
+        Dropping the temporary triggers, e.g. before bulk writes which would call them for each row.
+        """
+        try:
+            for name in ("insert", "delete", "update"):
+                self.con.execute("""DROP TRIGGER IF EXISTS temp.grid_index_{0};""".format(name))
+        except Exception:
+            pass
+        self.watching = False
+
+    def current_stamp(self):
+        """
+        Marker of commits from other connections and of schema changes.
+        """
+        return self.con.execute("""SELECT * FROM pragma_data_version, pragma_schema_version;""").fetchone()
+
+    def refresh(self):
+        """
+        Updating arrays if the grid table has changed since the last check.
+        Cells updated through this connection are patched, other changes reload the whole index.
+        Cells patched (or index reloaded) inside of a transaction are read again once the transaction is over,
+        because it might have been rolled back. The connection is never written to or committed.
+        """
+        in_transaction = self.con.in_transaction
+        if self.uncommitted and not in_transaction:
+            self.uncommitted = False
+            self.changed_fids |= self.transaction_fids
+            self.transaction_fids = set()
+            if self.transaction_reload:
+                # Temporary triggers created inside of the transaction are gone with a rollback.
+                self.transaction_reload = False
+                self.reload_needed = True
+        stamp = self.current_stamp()
+        if not self.watching and self.con.total_changes != self.total_changes:
+            self.reload_needed = True
+        if self.reload_needed or stamp != self.stamp:
+            self.reload(stamp, in_transaction)
+            return True
+        if self.changed_fids:
+            self.patch(in_transaction)
+            return True
+        return False
+
+    def reload(self, stamp, in_transaction):
+        self.reload_needed = False
+        self.changed_fids = set()
+        self.transaction_fids = set()
+        if in_transaction:
+            self.uncommitted = True
+            self.transaction_reload = True
+        self.watch()
+        self.stamp = stamp
+        self.total_changes = self.con.total_changes
+        self.load()
+
+    def patch(self, in_transaction):
+        """
+        Reading elevations of changed cells. Index is reloaded if a cell left its place on the lattice.
+        """
+        fids = sorted(self.changed_fids)
+        self.changed_fids = set()
+        if in_transaction:
+            self.uncommitted = True
+            self.transaction_fids.update(fids)
+        positions = self.fid_positions(fids)
+        rows = []
+        qry = """SELECT fid, elevation, geom FROM grid WHERE fid IN ({0}) ORDER BY fid;"""
+        for start in range(0, len(fids), self.PATCH_CHUNK):
+            chunk = fids[start : start + self.PATCH_CHUNK]
+            rows += self.con.execute(qry.format(",".join("?" * len(chunk))), chunk).fetchall()
+        if np.any(positions < 0) or len(rows) != len(fids) or any(row[2] is None for row in rows):
+            self.reload(self.stamp, in_transaction)
+            return
+        envelopes = self.header_envelopes([row[2] for row in rows])
+        if envelopes is None:
+            self.reload(self.stamp, in_transaction)
+            return
+        xs = (envelopes[:, 0] + envelopes[:, 1]) * 0.5
+        ys = (envelopes[:, 2] + envelopes[:, 3]) * 0.5
+        tolerance = self.cell_size * 1e-3
+        moved = not (
+            np.allclose(xs, self.x[positions], rtol=0, atol=tolerance)
+            and np.allclose(ys, self.y[positions], rtol=0, atol=tolerance)
+        )
+        if moved:
+            self.reload(self.stamp, in_transaction)
+            return
+        self.elevation[positions] = np.array([row[1] for row in rows], dtype=float)
+
+    @staticmethod
+    def header_envelopes(blobs):
+        """
+        Reading envelopes from GeoPackage binary headers (None if some blob is written without envelope).
+        """
+        if not all(len(blob) >= GPB_ENVELOPE_DTYPE.itemsize for blob in blobs):
+            return None
+        header_bytes = b"".join(blob[: GPB_ENVELOPE_DTYPE.itemsize] for blob in blobs)
+        headers = np.frombuffer(header_bytes, dtype=GPB_ENVELOPE_DTYPE)
+        flags = headers["flags"]
+        if np.all((flags & 0x01) == 1) and np.all((flags >> 1) & 0x07 > 0):
+            return headers["envelope"]
+        return None
+
+    def grid_envelopes(self, rows):
+        """
+        Reading envelopes from GeoPackage binary headers or with SpatiaLite when blobs are written without them.
+        """
+        envelopes = self.header_envelopes([row[2] for row in rows])
+        if envelopes is not None:
+            return envelopes
+        qry = """
+        SELECT
+            ST_MinX(GeomFromGPB(geom)),
+            ST_MaxX(GeomFromGPB(geom)),
+            ST_MinY(GeomFromGPB(geom)),
+            ST_MaxY(GeomFromGPB(geom))
+        FROM grid WHERE geom IS NOT NULL ORDER BY fid;"""
+        return np.array(self.con.execute(qry).fetchall(), dtype=float)
+
+    def load(self):
+        qry = """SELECT fid, elevation, geom FROM grid WHERE geom IS NOT NULL ORDER BY fid;"""
+        rows = self.con.execute(qry).fetchall()
+        self.regular = False
+        if not rows:
+            self.clear()
+            return
+        self.fids = np.array([row[0] for row in rows], dtype=int)
+        self.elevation = np.array([row[1] for row in rows], dtype=float)
+        envelopes = self.grid_envelopes(rows)
+        self.x = (envelopes[:, 0] + envelopes[:, 1]) * 0.5
+        self.y = (envelopes[:, 2] + envelopes[:, 3]) * 0.5
+        self.cell_size = float(np.median(envelopes[:, 1] - envelopes[:, 0]))
+
+        xc, yc = self.x.min(), self.y.max()
+        self.cols = np.rint((self.x - xc) / self.cell_size).astype(int)
+        self.rows = np.rint((yc - self.y) / self.cell_size).astype(int)
+        self.xmin = xc - self.cell_size * 0.5
+        self.ymax = yc + self.cell_size * 0.5
+
+        self.positions = np.full(self.fids.max() + 1, -1, dtype=int)
+        self.positions[self.fids] = np.arange(self.fids.size)
+        self.cells = np.zeros((self.rows.max() + 1, self.cols.max() + 1), dtype=int)
+        self.cells[self.rows, self.cols] = self.fids
+
+        # Cells have to lay on the regular lattice without overlaps, otherwise callers should fall back to SQL.
+        tolerance = self.cell_size * 1e-3
+        on_lattice = np.allclose(xc + self.cols * self.cell_size, self.x, rtol=0, atol=tolerance) and np.allclose(
+            yc - self.rows * self.cell_size, self.y, rtol=0, atol=tolerance
+        )
+        self.regular = bool(on_lattice and np.count_nonzero(self.cells) == self.fids.size)
+
+    def clear(self):
+        self.fids = np.zeros(0, dtype=int)
+        self.x = np.zeros(0, dtype=float)
+        self.y = np.zeros(0, dtype=float)
+        self.elevation = np.zeros(0, dtype=float)
+        self.cols = np.zeros(0, dtype=int)
+        self.rows = np.zeros(0, dtype=int)
+        self.positions = np.full(1, -1, dtype=int)
+        self.cells = np.zeros((0, 0), dtype=int)
+
+    def fid_positions(self, fids):
+        """
+        Positions of the given fids within index arrays (-1 for fids missing in the grid).
+        """
+        fids = np.atleast_1d(np.asarray(fids, dtype=int))
+        positions = np.full(fids.shape, -1, dtype=int)
+        valid = (fids > 0) & (fids < self.positions.size)
+        positions[valid] = self.positions[fids[valid]]
+        return positions
+
+    def cells_at(self, rows, cols):
+        """
+        Fids of cells in the given raster positions (0 outside of the grid).
+        """
+        rows, cols = np.broadcast_arrays(rows, cols)
+        fids = np.zeros(rows.shape, dtype=int)
+        inside = (rows >= 0) & (rows < self.cells.shape[0]) & (cols >= 0) & (cols < self.cells.shape[1])
+        fids[inside] = self.cells[rows[inside], cols[inside]]
+        return fids
+
+    def cells_on_points(self, xs, ys):
+        """
+        Fids of cells containing given points (0 for points outside of the grid).
+        """
+        xs = np.atleast_1d(np.asarray(xs, dtype=float))
+        ys = np.atleast_1d(np.asarray(ys, dtype=float))
+        if not self.fids.size:
+            return np.zeros(xs.shape, dtype=int)
+        cols = np.floor((xs - self.xmin) / self.cell_size).astype(int)
+        rows = np.floor((self.ymax - ys) / self.cell_size).astype(int)
+        return self.cells_at(rows, cols)
+
+    def cell_on_point(self, x, y):
+        fid = int(self.cells_on_points(x, y)[0])
+        return fid if fid else None
+
+    def centroids(self, fids):
+        """
+        Centroids coordinates of the given cells (NaN for fids missing in the grid).
+        """
+        positions = self.fid_positions(fids)
+        found = positions >= 0
+        xs = np.full(positions.shape, np.nan)
+        ys = np.full(positions.shape, np.nan)
+        xs[found] = self.x[positions[found]]
+        ys[found] = self.y[positions[found]]
+        return xs, ys
+
+    def centroid(self, fid):
+        xs, ys = self.centroids(fid)
+        if np.isnan(xs[0]):
+            return None
+        return float(xs[0]), float(ys[0])
+
+    def elevations(self, fids, nodata=np.nan):
+        """
+        Elevations of the given cells ('nodata' for fids equal to 0 or missing in the grid, NaN for NULL values).
+        """
+        positions = self.fid_positions(fids)
+        found = positions >= 0
+        elevs = np.full(positions.shape, nodata, dtype=float)
+        elevs[found] = self.elevation[positions[found]]
+        return elevs
+
+    def col_row(self, fids):
+        """
+        Column and row numbers of the given cells in the 'grid' table convention (first column 2, bottom row 2).
+        """
+        positions = self.fid_positions(fids)
+        found = positions >= 0
+        cols = np.zeros(positions.shape, dtype=int)
+        rows = np.zeros(positions.shape, dtype=int)
+        cols[found] = self.cols[positions[found]] + 2
+        rows[found] = self.cells.shape[0] - self.rows[positions[found]] + 1
+        return cols, rows
+
+    def neighbours(self, fids, directions=None):
+        """
+        Fids of the neighbour cells (0 if there is no cell).
+        With 'directions' (FLO-2D codes 1-8, one or a row of codes for each cell) neighbours in given directions
+        are returned, otherwise array of shape (n, 8) with neighbours in N, NE, E, SE, S, SW, W, NW order.
+        """
+        positions = self.fid_positions(fids)
+        found = positions >= 0
+        rows = np.full(positions.shape, -2, dtype=int)
+        cols = np.full(positions.shape, -2, dtype=int)
+        rows[found] = self.rows[positions[found]]
+        cols[found] = self.cols[positions[found]]
+        if directions is None:
+            offsets = DIRECTION_OFFSETS[ADJACENT_DIRECTIONS]
+            return self.cells_at(rows[:, None] + offsets[:, 0], cols[:, None] + offsets[:, 1])
+        directions = np.asarray(directions, dtype=int)
+        if directions.ndim == 2:
+            # Several directions for each cell.
+            rows, cols = rows[:, None], cols[:, None]
+        offsets = DIRECTION_OFFSETS[directions]
+        return self.cells_at(rows + offsets[..., 0], cols + offsets[..., 1])
+
+    def neighbour_elevations(self, fids, directions=None, nodata=-999):
+        """
+        Neighbour fids (as in 'neighbours') together with their elevations ('nodata' where there is no cell).
+        """
+        neighbours = self.neighbours(fids, directions)
+        return neighbours, self.elevations(neighbours, nodata)
+
+    def is_boundary(self, fids):
+        """
+        Flags of cells missing at least one of the eight neighbours.
+        """
+        return np.any(self.neighbours(fids) == 0, axis=1)
+
+
+def clear_grid_indexes(con=None):
+    """
+    Dropping cached grid index of the connection (or all cached indexes), e.g. when the GeoPackage is closed.
+    """
+    if con is None:
+        GRID_INDEXES.clear()
+    else:
+        index = GRID_INDEXES.pop(id(con), None)
+        if index is not None and index.con is con:
+            index.unwatch()
+
+
+def cached_grid_index(gutils):
+    """
+    Getting GridIndex shared by all tools using the same connection. Index is reloaded if the grid table changed.
+    """
+    index = GRID_INDEXES.get(id(gutils.con))
+    if index is None or index.con is not gutils.con:
+        index = GridIndex(gutils.con)
+        GRID_INDEXES[id(gutils.con)] = index
+    else:
+        index.refresh()
+    return index
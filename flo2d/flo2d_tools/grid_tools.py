@@ -12,8 +12,9 @@ import os
 import sys
 import math
 import uuid
+from itertools import repeat
 from qgis.PyQt.QtWidgets import QMessageBox, QApplication, QProgressDialog
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtCore import Qt, QSettings
 from collections import defaultdict
 from subprocess import Popen, PIPE, STDOUT
 from qgis.PyQt.QtGui import QColor
@@ -43,15 +44,43 @@ from qgis.analysis import QgsInterpolator, QgsTinInterpolator, QgsZonalStatistic
 from ..gui.ui_utils import center_canvas, zoom_show_n_cells
 from ..utils import is_number, get_file_path, grid_index, get_grid_index, set_grid_index
 from ..errors import GeometryValidityErrors, Flo2dError
+from ..geopackage_utils import squares_to_gpb, points_to_gpb, gpb_to_wkb, read_only_connect
+from ..flo2d_ie.flo2d_parser import parser_executor
+from .grid_index import cached_grid_index, DIRECTION_OFFSETS, ADJACENT_DIRECTIONS
+from .spatial_index_cache import cached_layer_index, layer_gpkg_table
+from .lidar_binning import LidarBins
 
 import numpy as np
 
+try:
+    from scipy.spatial import Delaunay
+except ImportError:
+    Delaunay = None
+
 cellIDNumpyArray = None
 xvalsNumpyArray = None
 yvalsNumpyArray = None
 
 cellElevNumpyArray = None
 
+# Maximum number of raster pixels read at once by zonal statistics.
+ZONAL_BAND_PIXELS = 4000000
+
+# FLO-2D direction codes of the adjacent cells.
+DIRECTION_CODES = {"N": 1, "E": 2, "S": 3, "W": 4, "NE": 5, "SE": 6, "SW": 7, "NW": 8}
+
+# Three cells adjacent to the given side of a cell, e.g. North => NW, N, NE.
+THREE_ADJACENT_DIRECTIONS = {
+    1: (8, 1, 5),
+    2: (5, 2, 6),
+    3: (6, 3, 7),
+    4: (7, 4, 8),
+    5: (1, 5, 2),
+    6: (2, 6, 3),
+    7: (3, 7, 4),
+    8: (4, 8, 1),
+}
+
 # GRID classes
 class TINInterpolator(object):
     def __init__(self, point_lyr, field_name):
@@ -74,6 +103,83 @@ class TINInterpolator(object):
         success, value = self.interpolator.interpolatePoint(x, y, feedback)
         return success, value
 
+    def tin_at_points(self, xs, ys):
+        """
+        Interpolated values at the points (NaN where interpolation failed).
+        """
+        feedback = QgsFeedback()
+        values = np.full(len(xs), np.nan)
+        for i, (x, y) in enumerate(zip(np.asarray(xs, dtype=float).tolist(), np.asarray(ys, dtype=float).tolist())):
+            success, value = self.interpolator.interpolatePoint(x, y, feedback)
+            if success == 0:
+                values[i] = value
+        return values
+
+
+class DelaunayInterpolator(object):
+    """
+    Linear TIN interpolation over the Delaunay triangulation of the control points (requires scipy).
+    All points are interpolated at once with barycentric coordinates within their triangles.
+    """
+
+    def __init__(self, xs, ys, values):
+        xs, ys, values = (np.asarray(arr, dtype=float).reshape(-1) for arr in (xs, ys, values))
+        valid = ~(np.isnan(xs) | np.isnan(ys) | np.isnan(values))
+        self.points = np.column_stack((xs[valid], ys[valid]))
+        self.values = values[valid]
+        self.triangulation = None
+        if self.points.shape[0] >= 3:
+            try:
+                self.triangulation = Delaunay(self.points)
+            except (ValueError, RuntimeError):
+                # Collinear or duplicated control points only.
+                self.triangulation = None
+
+    @classmethod
+    def from_layer(cls, point_lyr, field_name, request=None):
+        """
+        Control points taken from the point layer, features with NULL values are skipped.
+        """
+        xs, ys, values = [], [], []
+        feats = point_lyr.getFeatures() if request is None else point_lyr.getFeatures(request)
+        for feat in feats:
+            value = feat[field_name]
+            geom = feat.geometry()
+            if value == NULL or value is None or geom is None or geom.isEmpty():
+                continue
+            points = geom.asMultiPoint() if geom.isMultipart() else [geom.asPoint()]
+            for pnt in points:
+                xs.append(pnt.x())
+                ys.append(pnt.y())
+                values.append(value)
+        return cls(xs, ys, values)
+
+    def tin_at_points(self, xs, ys):
+        """
+        Interpolated values at the points (NaN for points outside of the triangulation).
+        """
+        targets = np.column_stack((np.asarray(xs, dtype=float).reshape(-1), np.asarray(ys, dtype=float).reshape(-1)))
+        values = np.full(targets.shape[0], np.nan)
+        if self.triangulation is None or targets.shape[0] == 0:
+            return values
+        simplex = self.triangulation.find_simplex(targets)
+        inside = simplex >= 0
+        corners = self.triangulation.simplices[simplex[inside]]
+        a, b, c = self.points[corners[:, 0]], self.points[corners[:, 1]], self.points[corners[:, 2]]
+        ab, ac, ap = b - a, c - a, targets[inside] - a
+        det = ab[:, 0] * ac[:, 1] - ac[:, 0] * ab[:, 1]
+        wb = (ap[:, 0] * ac[:, 1] - ac[:, 0] * ap[:, 1]) / det
+        wc = (ab[:, 0] * ap[:, 1] - ap[:, 0] * ab[:, 1]) / det
+        vals = self.values[corners]
+        values[inside] = vals[:, 0] * (1.0 - wb - wc) + vals[:, 1] * wb + vals[:, 2] * wc
+        return values
+
+    def tin_at_xy(self, x, y):
+        value = self.tin_at_points([x], [y])[0]
+        if np.isnan(value):
+            return 1, 0.0
+        return 0, float(value)
+
 
 class ZonalStatistics(object):
     def __init__(self, gutils, grid_lyr, point_lyr, field_name, calculation_type, search_distance=0):
@@ -130,6 +236,10 @@ class ZonalStatistics(object):
         """
         Method for calculating grid cell values from point layer.
         """
+        cells_index = cached_grid_index(self.gutils)
+        if cells_index.regular:
+            yield from self.points_elevation_np(cells_index)
+            return
         for feat in self.grid.getFeatures():
             geom = feat.geometry()
             geos_geom = QgsGeometry.createGeometryEngine(geom.constGet())
@@ -149,6 +259,73 @@ class ZonalStatistics(object):
             except (ValueError, ZeroDivisionError) as e:
                 pass
 
+    def points_elevation_np(self, cells_index):
+        """
+        Calculating cell values of the regular grid from all points at once with bincount-style reductions.
+        """
+        xs, ys, values = [], [], []
+        for point_feat in self.points_feats.values():
+            value = point_feat[self.field]
+            if value == NULL or value is None:
+                continue
+            pnt = point_feat.geometry().asPoint()
+            xs.append(pnt.x())
+            ys.append(pnt.y())
+            values.append(value)
+        positions = cells_index.fid_positions(cells_index.cells_on_points(xs, ys))
+        bins = LidarBins(cells_index.fids.size)
+        bins.add(positions, np.array(values, dtype=float))
+        cell_values = bins.statistic(self.calculation_type)
+        valid = ~np.isnan(cell_values)
+        for value, fid in zip(np.round(cell_values[valid], 4).tolist(), cells_index.fids[valid].tolist()):
+            yield value, fid
+
+    def lattice_null_elevation(self):
+        """
+        Filling NULL elevations of the regular grid with GDAL FillNodata run on the in-memory grid lattice.
+        Returns list of (elevation, fid) or None if the grid isn't a regular lattice.
+        """
+        cells_index = cached_grid_index(self.gutils)
+        if not cells_index.regular:
+            return None
+        from osgeo import gdal
+
+        nodata = -3.4e38
+        cells = cells_index.cells
+        occupied = cells > 0
+        lattice = np.full(cells.shape, nodata)
+        lattice[occupied] = cells_index.elevations(cells[occupied], nodata)
+        lattice[np.isnan(lattice)] = nodata
+        null_cells = occupied & (lattice == nodata)
+        if not null_cells.any():
+            return []
+        nrows, ncols = cells.shape
+        ds = gdal.GetDriverByName("MEM").Create("", ncols, nrows, 1, gdal.GDT_Float64)
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(nodata)
+        band.WriteArray(lattice)
+        max_distance = self.search_distance if self.search_distance > 0 else 100
+        gdal.FillNodata(band, None, max_distance, 0)
+        filled = band.ReadAsArray()[null_cells]
+        ds = None
+        fids = cells[null_cells]
+        found = filled != nodata
+        return list(zip(np.round(filled[found], 4).tolist(), fids[found].tolist()))
+
+    def fill_elevation_gaps(self):
+        """
+        Filling NULL elevations from the neighbouring cells. Regular grid is filled in memory, otherwise the grid is
+        rasterized and filled with GDAL utilities. Returns list of (command, output) of the utilities run.
+        """
+        null_elevation = self.lattice_null_elevation()
+        if null_elevation is not None:
+            self.set_elevation(null_elevation)
+            return []
+        commands = [self.rasterize_grid(), self.fill_nodata()]
+        self.set_elevation(self.null_elevation())
+        self.remove_rasters()
+        return commands
+
     def rasterize_grid(self):
         grid_extent = self.grid.extent()
         corners = (grid_extent.xMinimum(), grid_extent.yMinimum(), grid_extent.xMaximum(), grid_extent.yMaximum())
@@ -191,7 +368,7 @@ class ZonalStatistics(object):
 
     def null_elevation(self):
         req = QgsFeatureRequest().setFilterExpression('"elevation" IS NULL')
-        elev_fid = raster2grid(self.grid, self.filled_raster, request=req)
+        elev_fid = raster2grid(self.grid, self.filled_raster, request=req, gutils=self.gutils)
         return elev_fid
 
     def set_elevation(self, elev_fid):
@@ -199,10 +376,7 @@ class ZonalStatistics(object):
         Setting elevation values inside 'grid' table.
         """
         set_qry = "UPDATE grid SET elevation = ? WHERE fid = ?;"
-        cur = self.gutils.con.cursor()
-        for el, fid in elev_fid:
-            cur.execute(set_qry, (el, fid))
-        self.gutils.con.commit()
+        self.gutils.execute_many(set_qry, elev_fid)
 
 
 class ZonalStatisticsOther(object):
@@ -326,7 +500,7 @@ class ZonalStatisticsOther(object):
 
     def null_elevation(self):
         req = QgsFeatureRequest().setFilterExpression('"water_elevation" IS NULL')
-        elev_fid = raster2grid(self.grid, self.filled_raster, request=req)
+        elev_fid = raster2grid(self.grid, self.filled_raster, request=req, gutils=self.gutils)
         return elev_fid
 
     def set_other(self, elev_fid):
@@ -383,34 +557,60 @@ def polygons_statistics(vlayer, rlayer, statistics):
 
 
 # GRID functions
-def spatial_index(vlayer, request=None):
+def feature_copy(feat, attributes=True):
+    """
+    Copying feature with or without its attributes.
+    """
+    if attributes is True:
+        return QgsFeature(feat)
+    feat_copy = QgsFeature(feat.id())
+    feat_copy.setGeometry(feat.geometry())
+    return feat_copy
+
+
+def build_spatial_index(vlayer, attributes=True, request=None):
     """
     Creating spatial index over collection of features.
     """
     allfeatures = {}
     index = QgsSpatialIndex()
     for feat in vlayer.getFeatures() if request is None else vlayer.getFeatures(request):
-        feat_copy = QgsFeature(feat)
+        feat_copy = feature_copy(feat, attributes)
         allfeatures[feat.id()] = feat_copy
         index.insertFeature(feat_copy)
     return allfeatures, index
 
 
-def spatial_centroids_index(vlayer, request=None):
+def build_spatial_centroids_index(vlayer, attributes=True, request=None):
     """
     Creating spatial index over collection of features centroids.
     """
     allfeatures = {}
     index = QgsSpatialIndex()
     for feat in vlayer.getFeatures() if request is None else vlayer.getFeatures(request):
-        feat_copy = QgsFeature(feat)
+        feat_copy = feature_copy(feat, attributes)
         feat_copy.setGeometry(feat_copy.geometry().centroid())
         allfeatures[feat.id()] = feat_copy
         index.insertFeature(feat_copy)
     return allfeatures, index
 
 
-def intersection_spatial_index(vlayer, request=None):
+def valid_geometry_parts(geom):
+    """
+    Fixing invalid geometry (if possible) and dividing it into parts suitable for intersections.
+    """
+    if not geom.isGeosValid():
+        geom = geom.buffer(0.0, 5)
+        if not geom.isGeosValid():
+            error_messages = [
+                "{ge.what()} at location: {ge.where().toString()}"
+                for ge in geom.validateGeometry(method=QgsGeometry.ValidatorGeos)
+            ]
+            raise GeometryValidityErrors("\n".join(error_messages))
+    return divide_geom(geom)
+
+
+def build_intersection_spatial_index(vlayer, attributes=True, request=None):
     """
     Creating optimized for intersections spatial index over collection of features.
     """
@@ -418,21 +618,12 @@ def intersection_spatial_index(vlayer, request=None):
     index = QgsSpatialIndex()
     max_fid = max(vlayer.allFeatureIds()) + 1
     for feat in vlayer.getFeatures() if request is None else vlayer.getFeatures(request):
-        geom = feat.geometry()
-        if not geom.isGeosValid():
-            geom = geom.buffer(0.0, 5)
-            if not geom.isGeosValid():
-                error_messages = [
-                    "{ge.what()} at location: {ge.where().toString()}"
-                    for ge in geom.validateGeometry(method=QgsGeometry.ValidatorGeos)
-                ]
-                raise GeometryValidityErrors("\n".join(error_messages))
-        new_geoms = divide_geom(geom)
+        new_geoms = valid_geometry_parts(feat.geometry())
         new_fid = True if len(new_geoms) > 1 else False
         for g in new_geoms:
             engine = QgsGeometry.createGeometryEngine(g.constGet())
             engine.prepareGeometry()
-            feat_copy = QgsFeature(feat)
+            feat_copy = feature_copy(feat, attributes)
             feat_copy.setGeometry(g)
             if new_fid is True:
                 fid = max_fid
@@ -446,6 +637,34 @@ def intersection_spatial_index(vlayer, request=None):
     return allfeatures, index
 
 
+def spatial_index(vlayer, request=None):
+    """
+    Getting spatial index over collection of features.
+    Index over all layer features is cached and shared by tools, so returned objects mustn't be modified.
+    """
+    if request is not None:
+        return build_spatial_index(vlayer, request=request)
+    return cached_layer_index("features", vlayer, build_spatial_index)
+
+
+def spatial_centroids_index(vlayer, request=None):
+    """
+    Getting spatial index over collection of features centroids (cached like in 'spatial_index').
+    """
+    if request is not None:
+        return build_spatial_centroids_index(vlayer, request=request)
+    return cached_layer_index("centroids", vlayer, build_spatial_centroids_index)
+
+
+def intersection_spatial_index(vlayer, request=None):
+    """
+    Getting optimized for intersections spatial index over collection of features (cached like in 'spatial_index').
+    """
+    if request is not None:
+        return build_intersection_spatial_index(vlayer, request=request)
+    return cached_layer_index("intersection", vlayer, build_intersection_spatial_index)
+
+
 def count_polygon_vertices(geom):
     """
     Function for counting polygon vertices.
@@ -592,6 +811,59 @@ def build_grid_and_tableColRow(boundary, cell_size):
         x += cell_size
 
 
+def polygon_rings(geom):
+    """
+    Generator which returns polygon (or multipolygon) rings as NumPy arrays of vertices.
+    """
+    polygons = geom.asMultiPolygon() if geom.isMultipart() else [geom.asPolygon()]
+    for polygon in polygons:
+        for ring in polygon:
+            yield np.array([(pnt.x(), pnt.y()) for pnt in ring], dtype=float)
+
+
+def points_in_rings_mask(rings, xs, ys):
+    """
+    Scanline (even-odd rule) test of regular lattice of points against polygon rings.
+    Returns boolean array of shape (len(ys), len(xs)).
+    """
+    edges = np.concatenate([np.column_stack((ring[:-1], ring[1:])) for ring in rings])
+    x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+    mask = np.zeros((ys.shape[0], xs.shape[0]), dtype=bool)
+    for i, y in enumerate(ys):
+        crossing = (y1 > y) != (y2 > y)
+        if not crossing.any():
+            continue
+        cx1, cy1, cx2, cy2 = x1[crossing], y1[crossing], x2[crossing], y2[crossing]
+        intersections = np.sort(cx1 + (y - cy1) * (cx2 - cx1) / (cy2 - cy1))
+        mask[i] = np.searchsorted(intersections, xs, side="right") % 2 == 1
+    return mask
+
+
+def build_grid_np(boundary, cell_size, upper_left_coords=None):
+    """
+    Vectorized counterpart of 'build_grid' and 'build_grid_and_tableColRow'.
+    Returns cells centers coordinates with 'col' and 'row' indexes, in the same order as 'build_grid' yields them.
+    """
+    half_size = cell_size * 0.5
+    feature = next(boundary.getFeatures())
+    geom = feature.geometry()
+    bbox = geom.boundingBox()
+    xmin = bbox.xMinimum()
+    xmax = bbox.xMaximum()
+    ymax = bbox.yMaximum()
+    ymin = bbox.yMinimum()
+    if upper_left_coords:
+        xmin, ymax = upper_left_coords
+    cols = int(math.ceil(abs(xmax - xmin) / cell_size))
+    rows = int(math.ceil(abs(ymax - ymin) / cell_size))
+    xs = xmin + half_size + np.arange(cols) * cell_size
+    ys = ymax - half_size - np.arange(rows) * cell_size
+    mask = points_in_rings_mask(list(polygon_rings(geom)), xs, ys)
+    # Cells are ordered column by column, from top to bottom, exactly like in 'build_grid'.
+    col_idx, row_idx = np.nonzero(mask.T)
+    return xs[col_idx], ys[row_idx], col_idx + 2, rows - row_idx + 1
+
+
 def assign_col_row_indexes_to_grid(grid, gutils):
     cell_size = float(gutils.get_cont_par("CELLSIZE"))
     ext = grid.extent()
@@ -752,6 +1024,145 @@ def poly2poly_geos(base_polygons, polygons, request=None, *columns):
         yield base_fid, base_parts
 
 
+def parallel_sampling():
+    """
+    Checking if tiled sampling in worker threads is enabled.
+    """
+    return QSettings().value("FLO-2D/parallel_sampling", False, type=bool)
+
+
+def tiled_polygon_parts(polygons, *columns):
+    """
+    Collecting valid polygon parts as WKB together with their envelopes [xmin, ymin, xmax, ymax] and attribute values.
+    """
+    wkbs, envelopes, values = [], [], []
+    for feat in polygons.getFeatures():
+        attributes = tuple(feat[col] for col in columns)
+        for g in valid_geometry_parts(feat.geometry()):
+            bbox = g.boundingBox()
+            wkbs.append(bytes(g.asWkb()))
+            envelopes.append((bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()))
+            values.append(attributes)
+    return wkbs, np.array(envelopes, dtype=float).reshape(-1, 4), values
+
+
+def poly2poly_tile(gpkg_path, parts, tile):
+    """
+    Intersecting grid cells with centroids inside of the tile with the polygon parts from 'tiled_polygon_parts'.
+    Returns list of (grid fid, [(polygon part index, subarea), ...]).
+    """
+    wkbs, envelopes, values = parts
+    xmin, ymin, xmax, ymax = tile
+    con = read_only_connect(gpkg_path)
+    try:
+        qry = """SELECT g.fid, g.geom FROM grid AS g JOIN rtree_grid_geom AS r ON g.fid = r.id
+                 WHERE r.maxx >= ? AND r.minx <= ? AND r.maxy >= ? AND r.miny <= ?
+                 AND (r.minx + r.maxx) * 0.5 >= ? AND (r.minx + r.maxx) * 0.5 < ?
+                 AND (r.miny + r.maxy) * 0.5 >= ? AND (r.miny + r.maxy) * 0.5 < ?
+                 ORDER BY g.fid;"""
+        cells = con.execute(qry, (xmin, xmax, ymin, ymax, xmin, xmax, ymin, ymax)).fetchall()
+    finally:
+        con.close()
+    if not cells or not len(envelopes):
+        return []
+
+    cell_geoms = [QgsGeometry.fromWkb(gpb_to_wkb(blob)) for fid, blob in cells]
+    boxes = []
+    for g in cell_geoms:
+        bbox = g.boundingBox()
+        boxes.append((bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()))
+    boxes = np.array(boxes)
+    tile_parts = np.flatnonzero(
+        (envelopes[:, 0] <= boxes[:, 2].max())
+        & (envelopes[:, 2] >= boxes[:, 0].min())
+        & (envelopes[:, 1] <= boxes[:, 3].max())
+        & (envelopes[:, 3] >= boxes[:, 1].min())
+    )
+    tile_envelopes = envelopes[tile_parts]
+    engines = {}
+
+    def part_engine(idx):
+        if idx not in engines:
+            geom = QgsGeometry.fromWkb(wkbs[idx])
+            engine = QgsGeometry.createGeometryEngine(geom.constGet())
+            engine.prepareGeometry()
+            engines[idx] = (geom, engine)
+        return engines[idx]
+
+    results = []
+    for (fid, blob), base_geom, box in zip(cells, cell_geoms, boxes):
+        candidates = tile_parts[
+            (tile_envelopes[:, 0] <= box[2])
+            & (tile_envelopes[:, 2] >= box[0])
+            & (tile_envelopes[:, 1] <= box[3])
+            & (tile_envelopes[:, 3] >= box[1])
+        ]
+        if not candidates.size:
+            continue
+        base_area = base_geom.area()
+        base_geom_geos = base_geom.constGet()
+        base_geom_engine = QgsGeometry.createGeometryEngine(base_geom_geos)
+        base_geom_engine.prepareGeometry()
+        base_parts = []
+        for idx in candidates.tolist():
+            other_geom, other_geom_engine = part_engine(idx)
+            if other_geom_engine.intersects(base_geom_geos) is False:
+                continue
+            if other_geom_engine.contains(base_geom_geos):
+                subarea = 1
+            elif base_geom_engine.contains(other_geom.constGet()):
+                subarea = other_geom_engine.area() / base_area
+            else:
+                intersection_geom = other_geom_engine.intersection(base_geom_geos)
+                if not intersection_geom:
+                    continue
+                subarea = intersection_geom.area() / base_area
+            base_parts.append((idx, subarea))
+        results.append((fid, base_parts))
+    return results
+
+
+def poly2poly_geos_tiled(base_polygons, polygons, request=None, *columns, grid_span=100, max_workers=None):
+    """
+    Generator which calculates grid cells intersections with another polygon layer like 'poly2poly_geos'.
+    Grid is split into tiles of 'grid_span' x 'grid_span' cells intersected in worker threads, which read
+    the grid from the GeoPackage opened read-only. Results are yielded in the calling thread tile by tile.
+    """
+    gpkg_table = layer_gpkg_table(base_polygons)
+    if request is not None or gpkg_table is None or gpkg_table[1] != "grid":
+        for values in poly2poly_geos(base_polygons, polygons, request, *columns):
+            yield values
+        return
+    gpkg_path = gpkg_table[0]
+    try:
+        first = next(base_polygons.getFeatures())
+    except StopIteration:
+        return
+    tile_size = first.geometry().boundingBox().width() * grid_span
+    extent = base_polygons.extent()
+    cols = max(1, math.ceil(extent.width() / tile_size))
+    rows = max(1, math.ceil(extent.height() / tile_size))
+    tiles = [
+        (
+            extent.xMinimum() + c * tile_size,
+            extent.yMinimum() + r * tile_size,
+            extent.xMinimum() + (c + 1) * tile_size,
+            extent.yMinimum() + (r + 1) * tile_size,
+        )
+        for r in range(rows)
+        for c in range(cols)
+    ]
+    parts = tiled_polygon_parts(polygons, *columns)
+    values = parts[2]
+    executor = parser_executor(max_workers)
+    try:
+        for tile_results in executor.map(poly2poly_tile, repeat(gpkg_path), repeat(parts), tiles):
+            for gid, parts in tile_results:
+                yield gid, [values[idx] + (subarea,) for idx, subarea in parts]
+    finally:
+        executor.shutdown()
+
+
 def centroids2poly_geos(base_polygons, polygons, request=None, *columns):
     """
     Generator which calculates base polygons centroids intersections with another polygon layer.
@@ -968,25 +1379,74 @@ def calculate_gutter_variable_from_lines(grid, lines):
             else:
                 pass
 
-def raster2grid(grid, out_raster, request=None):
+def layer_centroids(vlayer, request=None, gutils=None):
     """
-    Generator for probing raster data within 'grid' features.
+    Getting fids and centroid coordinates of 'vlayer' features as NumPy arrays.
+    Centroids of the whole regular grid are taken from the cached grid index if 'gutils' is given.
     """
-    probe_raster = QgsRasterLayer(out_raster)
-    if not probe_raster.isValid():
-        return
-
-    features = grid.getFeatures() if request is None else grid.getFeatures(request)
+    if gutils is not None and request is None:
+        index = cached_grid_index(gutils)
+        if index.regular:
+            return index.fids, index.x, index.y
+    features = vlayer.getFeatures() if request is None else vlayer.getFeatures(request)
+    fids, xs, ys = [], [], []
     for feat in features:
         center = feat.geometry().centroid().asPoint()
-        ident = probe_raster.dataProvider().identify(center, QgsRaster.IdentifyFormatValue)
+        fids.append(feat.id())
+        xs.append(center.x())
+        ys.append(center.y())
+    return np.array(fids, dtype=int), np.array(xs, dtype=float), np.array(ys, dtype=float)
+
+
+def sample_raster(raster_path, fids, xs, ys):
+    """
+    Sampling raster at centroids with GDAL, returns a list of (value, fid) or None if the raster can't be read.
+    """
+    try:
+        from ..misc.gdal_utils import GDALRasterLayer
+
+        values = GDALRasterLayer(raster_path).sample(xs, ys)
+    except Exception:
+        return None
+    values = np.round(values, 4).tolist()
+    return [(None if val != val else val, fid) for val, fid in zip(values, fids.tolist())]
+
+
+def identify_raster(raster_path, fids, xs, ys):
+    """
+    Sampling raster at centroids with the QGIS data provider, one identify call per point.
+    """
+    rlayer = QgsRasterLayer(raster_path)
+    if not rlayer.isValid():
+        return []
+    raster_provider = rlayer.dataProvider()
+    raster_values = []
+    for fid, x, y in zip(fids.tolist(), xs.tolist(), ys.tolist()):
+        ident = raster_provider.identify(QgsPointXY(x, y), QgsRaster.IdentifyFormatValue)
         # ident is the value of the query provided by the identify method of the dataProvider.
         if ident.isValid():
             if is_number(ident.results()[1]):
                 val = round(ident.results()[1], 4)
             else:
                 val = None
-            yield val, feat.id()
+            raster_values.append((val, fid))
+    return raster_values
+
+
+def raster2grid(grid, out_raster, request=None, gutils=None):
+    """
+    Generator for probing raster data within 'grid' features.
+    """
+    probe_raster = QgsRasterLayer(out_raster)
+    if not probe_raster.isValid():
+        return
+
+    fids, xs, ys = layer_centroids(grid, request, gutils)
+    raster_values = sample_raster(out_raster, fids, xs, ys)
+    if raster_values is None:
+        raster_values = identify_raster(out_raster, fids, xs, ys)
+    for val, fid in raster_values:
+        yield val, fid
 
 
 def rasters2centroids(vlayer, request, *raster_paths):
@@ -1000,96 +1460,144 @@ def rasters2centroids(vlayer, request, *raster_paths):
         *raster_pathts: list of ASCII files (with path).
 
     """
-    features = vlayer.getFeatures() if request is None else vlayer.getFeatures(request)
-    centroids = []
-    for feat in features:
-        fid = feat.id()
-        center_point = feat.geometry().centroid().asPoint()
-        centroids.append((fid, center_point))
-
-    # 'centroids' has the coordinates (x,y) of the centroids of all features of vlayer (ususlly the grid layer)
+    # Coordinates (x,y) of the centroids of all features of vlayer (ususlly the grid layer).
+    fids, xs, ys = layer_centroids(vlayer, request)
     for pth in raster_paths:
-        raster_values = []
-        rlayer = QgsRasterLayer(
-            pth
-        )  # rlayer is an instance of the layer constructed from file pth (from list raster_paths).
-        # Loads (or assigns a raster style), populates its bands, calculates its extend,
-        # determines if the layers is gray, paletted, or multiband, assign sensible
-        # defaults for the red, green, blue and gray bands.
-        if not rlayer.isValid():
+        if not QgsRasterLayer(pth).isValid():
             continue
-        raster_provider = rlayer.dataProvider()
-        for fid, point in centroids:
-            ident = raster_provider.identify(point, QgsRaster.IdentifyFormatValue)
-            # ident is the value of the query provided by the identify method of the dataProvider.
-            if ident.isValid():
-                if is_number(ident.results()[1]):
-                    val = round(ident.results()[1], 4)
-                else:
-                    val = None
-                raster_values.append((val, fid))
+        raster_values = sample_raster(pth, fids, xs, ys)
+        if raster_values is None:
+            raster_values = identify_raster(pth, fids, xs, ys)
         yield raster_values
 
 
+def raster_zonal_statistics(raster_path, zones, statistics, band_pixels=ZONAL_BAND_PIXELS):
+    """
+    Calculating 'Mean', 'Max' or 'Min' of raster values within polygons with NumPy (no temporary layers or files).
+    'zones' is an iterable of (zone id, polygon geometry). Raster is read once in horizontal bands, pixels with centers
+    inside a polygon belong to its zone and zone values are reduced with bincount. Polygons which don't cover any pixel
+    center take the value of the pixel under their point on surface.
+    Returns list of (zone id, value) for zones with valid (not NODATA) pixels.
+    """
+    from ..misc.gdal_utils import GDALRasterLayer
+
+    raster = GDALRasterLayer(raster_path)
+    ids, geoms, rings, bboxes = [], [], [], []
+    for zone_id, geom in zones:
+        if geom is None or geom.isEmpty():
+            continue
+        bbox = geom.boundingBox()
+        ids.append(zone_id)
+        geoms.append(geom)
+        rings.append(list(polygon_rings(geom)))
+        bboxes.append((bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()))
+    if not ids:
+        return []
+    bboxes = np.array(bboxes, dtype=float)
+    bins = LidarBins(len(ids))
+    extent = bboxes[:, 0].min(), bboxes[:, 1].min(), bboxes[:, 2].max(), bboxes[:, 3].max()
+    for values, xs, ys in raster.read_bands(*extent, band_pixels=band_pixels):
+        positions, zone_values = [], []
+        in_band = np.flatnonzero((bboxes[:, 1] <= ys[0]) & (bboxes[:, 3] >= ys[-1]))
+        for zone in in_band.tolist():
+            zxmin, zymin, zxmax, zymax = bboxes[zone]
+            c0, c1 = np.searchsorted(xs, zxmin), np.searchsorted(xs, zxmax, side="right")
+            # Rows go from the top, so coordinates are searched in reversed order.
+            r0 = ys.size - np.searchsorted(ys[::-1], zymax, side="right")
+            r1 = ys.size - np.searchsorted(ys[::-1], zymin)
+            if c0 >= c1 or r0 >= r1:
+                continue
+            mask = points_in_rings_mask(rings[zone], xs[c0:c1], ys[r0:r1])
+            window = values[r0:r1, c0:c1][mask]
+            window = window[~np.isnan(window)]
+            positions.append(np.full(window.size, zone, dtype=np.int64))
+            zone_values.append(window)
+        if positions:
+            bins.add(np.concatenate(positions), np.concatenate(zone_values))
+    empty = np.flatnonzero(bins.count == 0)
+    if empty.size:
+        points = [geoms[zone].pointOnSurface().asPoint() for zone in empty.tolist()]
+        sampled = raster.sample([pnt.x() for pnt in points], [pnt.y() for pnt in points])
+        found = ~np.isnan(sampled)
+        bins.add(empty[found], sampled[found])
+    result = bins.statistic(statistics)
+    return [(zone_id, value) for zone_id, value in zip(ids, result.tolist()) if value == value]
+
+
+def raster_grid_statistics(raster_path, gutils, grid_fids, statistics, band_pixels=ZONAL_BAND_PIXELS):
+    """
+    Calculating 'Mean', 'Max' or 'Min' of raster values within each of the given grid cells with NumPy.
+    Pixel centers are mapped to the cells of the regular grid lattice, cells without any pixel center take
+    the value of the pixel under their centroid.
+    Returns list of (fid, value) for cells with valid pixels or None if the grid isn't a regular lattice.
+    """
+    from ..misc.gdal_utils import GDALRasterLayer
+
+    index = cached_grid_index(gutils)
+    if not index.regular:
+        return None
+    fids = np.unique(np.asarray(grid_fids, dtype=int))
+    cxs, cys = index.centroids(fids)
+    found = ~np.isnan(cxs)
+    fids, cxs, cys = fids[found], cxs[found], cys[found]
+    if not fids.size:
+        return []
+    raster = GDALRasterLayer(raster_path)
+    lookup = np.full(index.positions.size, -1, dtype=np.int64)
+    lookup[fids] = np.arange(fids.size)
+    bins = LidarBins(fids.size)
+    half = index.cell_size * 0.5
+    extent = cxs.min() - half, cys.min() - half, cxs.max() + half, cys.max() + half
+    for values, xs, ys in raster.read_bands(*extent, band_pixels=band_pixels):
+        cells = index.cells_on_points(np.tile(xs, ys.size), np.repeat(ys, xs.size))
+        positions = lookup[cells]
+        values = values.reshape(-1)
+        valid = (positions >= 0) & ~np.isnan(values)
+        bins.add(positions[valid], values[valid])
+    empty = np.flatnonzero(bins.count == 0)
+    if empty.size:
+        sampled = raster.sample(cxs[empty], cys[empty])
+        valid = ~np.isnan(sampled)
+        bins.add(empty[valid], sampled[valid])
+    result = bins.statistic(statistics)
+    return [(fid, value) for fid, value in zip(fids.tolist(), result.tolist()) if value == value]
+
+
 # Tools which use GeoPackageUtils instance
-def square_grid(gutils, boundary, upper_left_coords=None):
+def square_grid(gutils, boundary, upper_left_coords=None, chunksize=100000):
     """
     Function for calculating and writing square grid into 'grid' table.
+    Cells geometries are encoded in Python and written in chunks together with 'col' and 'row' values,
+    the 'grid' R-tree is rebuilt once at the end.
     """
     cellsize = float(gutils.get_cont_par("CELLSIZE"))
     update_cellsize = "UPDATE user_model_boundary SET cell_size = ?;"
     gutils.execute(update_cellsize, (cellsize,))
-    gutils.clear_tables("grid")
-
-    polygons = ((gutils.build_square_from_polygon(poly),) for poly in build_grid(boundary, cellsize, upper_left_coords))
-    sql = ["""INSERT INTO grid (geom) VALUES""", 1]
-    for g_tuple in polygons:
-        sql.append(g_tuple)
-    if len(sql) > 2:
-        gutils.batch_execute(sql)
+
+    xs, ys, cols, rows = build_grid_np(boundary, cellsize, upper_left_coords)
+    with_col_row = "col" in gutils.table_info("grid", only_columns=True)
+    if with_col_row:
+        sql = """INSERT INTO grid (geom, col, row) VALUES (?,?,?);"""
     else:
-        pass
+        sql = """INSERT INTO grid (geom) VALUES (?);"""
+    with gutils.bulk_write("grid"):
+        gutils.clear_tables("grid")
+        for start in range(0, xs.shape[0], chunksize):
+            stop = start + chunksize
+            geoms = squares_to_gpb(xs[start:stop], ys[start:stop], cellsize)
+            if with_col_row:
+                data = zip(geoms, cols[start:stop].tolist(), rows[start:stop].tolist())
+            else:
+                data = ((g,) for g in geoms)
+            gutils.execute_many(sql, data)
+
 
 def square_grid_with_col_and_row_fields(gutils, boundary, upper_left_coords=None):
-    
-    # """
-    # Function for calculating and writing square grid into 'grid' table.
-    # """
-    #
-    # cellsize = float(gutils.get_cont_par("CELLSIZE"))
-    # update_cellsize = "UPDATE user_model_boundary SET cell_size = ?;"
-    # gutils.execute(update_cellsize, (cellsize,))
-    # gutils.clear_tables("grid")
-    #
-    # sql = ["""INSERT INTO grid (geom, col, row) VALUES""", 3] 
-    # polygonsClRw  = ((gutils.build_square_from_polygon2(polyColRow), ) for polyColRow in build_grid_and_tableColRow(boundary, cellsize))
-    # for g_tuple in polygonsClRw:
-        # sql.append((g_tuple[0][0], g_tuple[0][1], g_tuple[0][2],))
-    # if len(sql) > 2:
-        # gutils.batch_execute(sql)
-    # else:
-        # pass    
-    
-    
-    
     """
-    Function for calculating and writing square grid into 'grid' table.
+    Function for calculating and writing square grid with 'col' and 'row' fields into 'grid' table.
     """
     try:
-        cellsize = float(gutils.get_cont_par("CELLSIZE"))
-        update_cellsize = "UPDATE user_model_boundary SET cell_size = ?;"
-        gutils.execute(update_cellsize, (cellsize,))
-        gutils.clear_tables("grid")
-        
-        sql = ["""INSERT INTO grid (geom, col, row) VALUES""", 3] 
-        polygonsClRw  = ((gutils.build_square_from_polygon2(polyColRow), ) 
-                                for polyColRow in build_grid_and_tableColRow(boundary, cellsize))
-        for g_tuple in polygonsClRw:
-            sql.append((g_tuple[0][0], g_tuple[0][1], g_tuple[0][2],))
-        if len(sql) > 2:
-            gutils.batch_execute(sql)
-        else:
-            pass
+        square_grid(gutils, boundary, upper_left_coords)
         return True
     except:
         QApplication.restoreOverrideCursor()
@@ -1097,7 +1605,8 @@ def square_grid_with_col_and_row_fields(gutils, boundary, upper_left_coords=None
             "ERROR 300521.0526: creating grid with 'col' and 'row' fields failed !\n"
             "_____________________________________________________________________"
         )
-        return False        
+        return False
+
 
 def add_col_and_row_fields(grid):
     try:
@@ -1272,7 +1781,25 @@ def update_roughness(gutils, grid, roughness, column_name, reset=False):
         else:
             pass
         qry = "UPDATE grid SET n_value=? WHERE fid=?;"
-        
+
+        if parallel_sampling():
+            # Tiles intersected in worker threads, values written here in batches.
+            writeVals = []
+            for gid, values in poly2poly_geos_tiled(grid, roughness, None, column_name):
+                if values:
+                    manning = sum(ma * float(subarea) for ma, subarea in values)
+                    manning = manning + (1.0 - sum(float(subarea) for ma, subarea in values)) * float(globalnValue)
+                    manning = "{0:.4}".format(manning)
+                    writeVals.append((manning, gid))
+                if len(writeVals) >= 10000:
+                    gutils.con.executemany(qry, writeVals)
+                    gutils.con.commit()
+                    writeVals = []
+            if len(writeVals) > 0:
+                gutils.con.executemany(qry, writeVals)
+                gutils.con.commit()
+            return True
+
         gridCount = 0
         for request in gridRegionGenerator(gutils, grid, gridSpan = 100, regionPadding = 50, showProgress = True):
             writeVals = []
@@ -1366,15 +1893,23 @@ def evaluate_arfwrf(gutils, grid, areas):
         ]
         gutils.execute(del_cells)
 
-        for row, was_null in calculate_arfwrf(grid, areas):
-            # "row" is a tuple like  (u'Point (368257 1185586)', 1075L, 1L, 0.06, 0.0, 1.0, 0.0, 0.0, 0.14, 0.32, 0.0, 0.0)
-            point_wkt = row[0]  # Fist element of tuple "row" is a POINT (centroid of cell?)
-            point_gpb = gutils.wkt_to_gpb(point_wkt)
-            new_row = (point_gpb,) + row[1:]
-            qry_cells.append(new_row)
+        if QSettings().value("FLO-2D/raster_arfwrf", False, type=bool):
+            # Rasterized blocked areas, centroids encoded to GeoPackage binary in bulk.
+            rows = list(calculate_arfwrf_raster(grid, areas, gutils))
+            centroids_gpb = points_to_gpb([row[11] for row in rows], [row[12] for row in rows])
+            for point_gpb, row in zip(centroids_gpb, rows):
+                qry_cells.append((point_gpb,) + row[:11])
+            nulls = sum(1 for row in rows if row[13])
+        else:
+            for row, was_null in calculate_arfwrf(grid, areas):
+                # "row" is a tuple like  (u'Point (368257 1185586)', 1075L, 1L, 0.06, 0.0, 1.0, 0.0, 0.0, 0.14, 0.32, 0.0, 0.0)
+                point_wkt = row[0]  # Fist element of tuple "row" is a POINT (centroid of cell?)
+                point_gpb = gutils.wkt_to_gpb(point_wkt)
+                new_row = (point_gpb,) + row[1:]
+                qry_cells.append(new_row)
 
-            if was_null:
-                nulls += 1
+                if was_null:
+                    nulls += 1
 
         gutils.batch_execute(qry_cells)
 
@@ -1470,6 +2005,139 @@ def calculate_arfwrf(grid, areas):
         )
 
 
+# Octagon sides used for WRF (in 'calculate_arfwrf' order): start and end points as multiples of
+# (half square, half octagon side) offsets from the cell center.
+OCTAGON_SIDES = (
+    ((0.0, 1.0, -1.0, 0.0), (0.0, 1.0, 1.0, 0.0)),  # N
+    ((1.0, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, -1.0)),  # E
+    ((0.0, -1.0, 1.0, 0.0), (0.0, -1.0, -1.0, 0.0)),  # S
+    ((-1.0, 0.0, 0.0, -1.0), (-1.0, 0.0, 0.0, 1.0)),  # W
+    ((0.0, 1.0, 1.0, 0.0), (1.0, 0.0, 0.0, 1.0)),  # NE
+    ((1.0, 0.0, 0.0, -1.0), (0.0, -1.0, 1.0, 0.0)),  # SE
+    ((0.0, -1.0, -1.0, 0.0), (-1.0, 0.0, 0.0, -1.0)),  # SW
+    ((-1.0, 0.0, 0.0, 1.0), (0.0, 1.0, -1.0, 0.0)),  # NW
+)
+
+# Maximum number of sub-cell pixels rasterized at once.
+ARFWRF_BAND_PIXELS = 4000000
+
+
+def grid_lattice(grid, gutils=None):
+    """
+    Getting regular grid lattice as (cells, xmin, ymax, cell_size), where 'cells' is 2D array of grid fids
+    (0 where there is no cell) with the first row at the top of the grid.
+    """
+    if gutils is not None:
+        index = cached_grid_index(gutils)
+        if index.regular:
+            return index.cells, index.xmin, index.ymax, index.cell_size
+    fids, xs, ys = layer_centroids(grid)
+    if fids.size == 0:
+        return np.zeros((0, 0), dtype=int), 0.0, 0.0, 0.0
+    first = next(grid.getFeatures())
+    cell_size = first.geometry().boundingBox().width()
+    xmin = xs.min() - cell_size * 0.5
+    ymax = ys.max() + cell_size * 0.5
+    cols = np.rint((xs - xmin) / cell_size - 0.5).astype(int)
+    rows = np.rint((ymax - ys) / cell_size - 0.5).astype(int)
+    cells = np.zeros((rows.max() + 1, cols.max() + 1), dtype=int)
+    cells[rows, cols] = fids
+    return cells, xmin, ymax, cell_size
+
+
+def side_samples(subcells):
+    """
+    Sub-cell pixels (rows and columns from the cell upper left corner) sampled along each octagon side.
+    Returns arrays of shape (8, subcells).
+    """
+    half_square, half_octagon = 0.5, 0.5 / 2.414
+    t = (np.arange(subcells) + 0.5) / subcells
+    rows, cols = [], []
+    for start, end in OCTAGON_SIDES:
+        x1, y1 = start[0] * half_square + start[2] * half_octagon, start[1] * half_square + start[3] * half_octagon
+        x2, y2 = end[0] * half_square + end[2] * half_octagon, end[1] * half_square + end[3] * half_octagon
+        x = x1 + (x2 - x1) * t
+        y = y1 + (y2 - y1) * t
+        cols.append(np.clip(np.floor((x + 0.5) * subcells), 0, subcells - 1).astype(int))
+        rows.append(np.clip(np.floor((0.5 - y) * subcells), 0, subcells - 1).astype(int))
+    return np.array(rows), np.array(cols)
+
+
+def calculate_arfwrf_raster(grid, areas, gutils=None, subcells=10):
+    """
+    Generator which calculates ARF and WRF values like 'calculate_arfwrf', but with blocked areas rasterized
+    at 'subcells' x 'subcells' pixels per grid cell. ARF is the fraction of blocked pixels within the cell and WRF
+    is the fraction of blocked pixels along each octagon side.
+    Yields (grid fid, area fid, arf, wrf1, ..., wrf8, x, y, was_null) with the cell centroid coordinates.
+    """
+    cells, xmin, ymax, cell_size = grid_lattice(grid, gutils)
+    if cells.size == 0:
+        return
+    nrows, ncols = cells.shape
+    pixel = cell_size / subcells
+    side_rows, side_cols = side_samples(subcells)
+    band_rows = max(1, ARFWRF_BAND_PIXELS // (subcells * subcells * ncols))
+    was_null = False
+    for feat in areas.getFeatures():
+        if feat["calc_arf"] == NULL or feat["calc_wrf"] == NULL:
+            was_null = True
+        farf = int(1 if feat["calc_arf"] == NULL else feat["calc_arf"])
+        fwrf = int(1 if feat["calc_wrf"] == NULL else feat["calc_wrf"])
+        geom = feat.geometry()
+        if geom.isEmpty():
+            continue
+        rings = list(polygon_rings(geom))
+        bbox = geom.boundingBox()
+        c0 = max(0, int(math.floor((bbox.xMinimum() - xmin) / cell_size)))
+        c1 = min(ncols - 1, int(math.floor((bbox.xMaximum() - xmin) / cell_size)))
+        r0 = max(0, int(math.floor((ymax - bbox.yMaximum()) / cell_size)))
+        r1 = min(nrows - 1, int(math.floor((ymax - bbox.yMinimum()) / cell_size)))
+        if c0 > c1 or r0 > r1:
+            continue
+        nc = c1 - c0 + 1
+        xs = xmin + c0 * cell_size + (np.arange(nc * subcells) + 0.5) * pixel
+        for br0 in range(r0, r1 + 1, band_rows):
+            br1 = min(r1, br0 + band_rows - 1)
+            nr = br1 - br0 + 1
+            ys = ymax - br0 * cell_size - (np.arange(nr * subcells) + 0.5) * pixel
+            mask = points_in_rings_mask(rings, xs, ys).reshape(nr, subcells, nc, subcells)
+            fraction = mask.mean(axis=(1, 3))
+            # Blocked pixels along each side, shape (nr, nc, 8).
+            sides = mask[:, side_rows, :, side_cols].mean(axis=1).transpose(1, 2, 0)
+            window = cells[br0 : br1 + 1, c0 : c1 + 1]
+            touched = (window > 0) & ((fraction > 0) | sides.any(axis=2))
+            for ri, ci in zip(*np.nonzero(touched)):
+                arf = round(float(fraction[ri, ci]), 2) if farf == 1 else 0
+                if arf >= 0.9:
+                    wrf = (1,) * 8 if fwrf == 1 else (0,) * 8
+                    arf = 1
+                elif fwrf == 1:
+                    wrf = tuple(round(float(v), 2) for v in sides[ri, ci])
+                else:
+                    wrf = (0,) * 8
+                x = xmin + (c0 + ci + 0.5) * cell_size
+                y = ymax - (br0 + ri + 0.5) * cell_size
+                yield (int(window[ri, ci]), feat.id(), arf) + wrf + (x, y, was_null)
+
+
+def compare_arfwrf(reference_rows, rows, tolerance=0.1):
+    """
+    Comparing ARF/WRF rows (grid fid, area fid, arf, wrf1, ..., wrf8, ...) calculated with different engines.
+    Returns list of (grid fid, area fid, reference values, values) for pairs differing more than 'tolerance'
+    (pairs missing in one of the results are compared against zeros).
+    """
+    zeros = (0,) * 9
+    reference = {(row[0], row[1]): tuple(row[2:11]) for row in reference_rows}
+    values = {(row[0], row[1]): tuple(row[2:11]) for row in rows}
+    differences = []
+    for key in sorted(set(reference) | set(values)):
+        ref_vals = reference.get(key, zeros)
+        vals = values.get(key, zeros)
+        if any(abs(float(a) - float(b)) > tolerance for a, b in zip(ref_vals, vals)):
+            differences.append(key + (ref_vals, vals))
+    return differences
+
+
 def evaluate_spatial_tolerance(gutils, grid, areas):
     """
     Calculating and inserting tolerance values into 'tolspatial_cells' table.
@@ -1782,6 +2450,11 @@ def adjacent_grid_elevations(gutils, grid_lyr, cell, cell_size):
             grid_count = gutils.count("grid", field = "fid")                                                
             #grid_count = len(list(grid_lyr.getFeatures()))
             if grid_count >= cell and cell > 0:
+                cells_index = cached_grid_index(gutils)
+                if cells_index.regular:
+                    elevs = cells_index.elevations(cells_index.neighbours(cell)[0], nodata=-999)
+                    return [None if np.isnan(e) else float(e) for e in elevs]
+
                 currentCell = next(grid_lyr.getFeatures(QgsFeatureRequest(cell)))
                 xx, yy = currentCell.geometry().centroid().asPoint()
 
@@ -1869,67 +2542,77 @@ def adjacent_grid_elevations(gutils, grid_lyr, cell, cell_size):
                 return elevs
 
 
-def adjacent_average_elevation(gutils, grid_lyr, xx, yy, cell_size):
-    # sel_elev_qry = "SELECT elevation FROM grid WHERE fid = ?;"
-    if grid_lyr is not None:
-        elevs = []
-        
-        # North cell:
-        y = yy + cell_size
-        x = xx
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
-
-        # NorthEast cell
-        y = yy + cell_size
-        x = xx + cell_size
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
-            
-        # East cell:
-        x = xx + cell_size
-        y = yy
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
+def adjacent_points_elevations(gutils, xx, yy, cell_size):
+    elevs = []
+    # North cell:
+    y = yy + cell_size
+    x = xx
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
 
-        # SouthEast cell:
-        y = yy - cell_size
-        x = xx + cell_size
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
-            
-        # South cell:
-        y = yy - cell_size
-        x = xx
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
+    # NorthEast cell
+    y = yy + cell_size
+    x = xx + cell_size
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
 
-        # SouthWest cell:
-        y = yy - cell_size
-        x = xx - cell_size
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
+    # East cell:
+    x = xx + cell_size
+    y = yy
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
 
-        # West cell:
-        y = yy
-        x = xx - cell_size
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
+    # SouthEast cell:
+    y = yy - cell_size
+    x = xx + cell_size
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
+
+    # South cell:
+    y = yy - cell_size
+    x = xx
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
+
+    # SouthWest cell:
+    y = yy - cell_size
+    x = xx - cell_size
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
+
+    # West cell:
+    y = yy
+    x = xx - cell_size
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
+
+    # NorthWest cell:
+    y = yy + cell_size
+    x = xx - cell_size
+    e = gutils.grid_elevation_on_point(x, y)
+    # if e is not None and e != -9999:
+    elevs.append(e)
+    return elevs
+
+
+def adjacent_average_elevation(gutils, grid_lyr, xx, yy, cell_size):
+    # sel_elev_qry = "SELECT elevation FROM grid WHERE fid = ?;"
+    if grid_lyr is not None:
+        cells_index = cached_grid_index(gutils)
+        if cells_index.regular:
+            offsets = DIRECTION_OFFSETS[ADJACENT_DIRECTIONS]
+            cells = cells_index.cells_on_points(xx + offsets[:, 1] * cell_size, yy - offsets[:, 0] * cell_size)
+            elevs = [None if np.isnan(e) else float(e) for e in cells_index.elevations(cells)]
+        else:
+            elevs = adjacent_points_elevations(gutils, xx, yy, cell_size)
 
-        # NorthWest cell:
-        y = yy + cell_size
-        x = xx - cell_size
-        e = gutils.grid_elevation_on_point(x, y)
-        # if e is not None and e != -9999:
-        elevs.append(e)
-        
         # Return average elevation of adjacent cells:    
         n= 0
         avrg = 0
@@ -1955,6 +2638,11 @@ def three_adjacent_grid_elevations(gutils, grid_lyr, cell, direction, cell_size)
 
     try:
         # Expects a cell number inside the computational domain.
+        cells_index = cached_grid_index(gutils)
+        if cells_index.regular:
+            elevs = cells_index.neighbour_elevations(cell, THREE_ADJACENT_DIRECTIONS.get(direction, ()), -99999)[1]
+            return [None if np.isnan(e) else float(e) for e in elevs]
+
         sel_elev_qry = """SELECT elevation FROM grid WHERE fid = ?;"""
         currentCell = next(grid_lyr.getFeatures(QgsFeatureRequest(cell)))
         xx, yy = currentCell.geometry().centroid().asPoint()
@@ -2189,8 +2877,41 @@ def three_adjacent_grid_elevations(gutils, grid_lyr, cell, direction, cell_size)
     except:
         show_error("ERROR 040420.1715: could not evaluate adjacent cell elevation!")
 
+def adjacent_cells_elevations(gutils, cells, directions, nodata=-999):
+    """
+    Batched version of 'get_adjacent_cell_elevation'.
+    Takes arrays of cells and FLO-2D direction codes and returns arrays of adjacent cells (0 if there is no cell)
+    and their elevations ('nodata' if there is no cell).
+    """
+    cells = np.atleast_1d(np.asarray(cells, dtype=int))
+    directions = np.asarray(directions, dtype=int)
+    cells_index = cached_grid_index(gutils)
+    if cells_index.regular:
+        return cells_index.neighbour_elevations(cells, directions, nodata)
+
+    cell_size = float(gutils.get_cont_par("CELLSIZE"))
+    directions = np.broadcast_to(directions, cells.shape)
+    adjacent = np.zeros(cells.shape, dtype=int)
+    elevs = np.full(cells.shape, nodata, dtype=float)
+    for i, (cell, direction) in enumerate(zip(cells, directions)):
+        xx, yy = [float(c) for c in gutils.single_centroid(int(cell)).strip("POINT()").split()]
+        row_offset, col_offset = DIRECTION_OFFSETS[direction]
+        grid = gutils.grid_on_point(xx + col_offset * cell_size, yy - row_offset * cell_size)
+        if grid is not None:
+            adjacent[i] = grid
+            elev = gutils.grid_value(grid, "elevation")
+            elevs[i] = np.nan if elev is None else elev
+    return adjacent, elevs
+
+
 def get_adjacent_cell_elevation(gutils, grid_lyr, cell, dir, cell_size):
     try:
+        cells_index = cached_grid_index(gutils)
+        if cells_index.regular and dir in DIRECTION_CODES.values():
+            adjacent, elevs = cells_index.neighbour_elevations(cell, dir)
+            grid = int(adjacent[0]) if adjacent[0] else None
+            return grid, (None if np.isnan(elevs[0]) else float(elevs[0]))
+
         sel_elev_qry = """SELECT elevation FROM grid WHERE fid = ?;"""
         currentCell = next(grid_lyr.getFeatures(QgsFeatureRequest(cell)))
         xx, yy = currentCell.geometry().centroid().asPoint()
@@ -2269,6 +2990,11 @@ def get_adjacent_cell_elevation(gutils, grid_lyr, cell, dir, cell_size):
 
 def get_adjacent_cell(gutils, grid_lyr, cell, dir, cell_size):
     try:
+        cells_index = cached_grid_index(gutils)
+        if cells_index.regular and dir in DIRECTION_CODES:
+            grid = int(cells_index.neighbours(cell, DIRECTION_CODES[dir])[0])
+            return grid if grid else None
+
         currentCell = next(grid_lyr.getFeatures(QgsFeatureRequest(cell)))
         xx, yy = currentCell.geometry().centroid().asPoint()
 
@@ -2332,6 +3058,12 @@ def get_adjacent_cell(gutils, grid_lyr, cell, dir, cell_size):
 def adjacent_grids(gutils, currentCell, cell_size):
     xx, yy = currentCell.geometry().centroid().asPoint()
 
+    cells_index = cached_grid_index(gutils)
+    if cells_index.regular:
+        offsets = DIRECTION_OFFSETS[ADJACENT_DIRECTIONS]
+        cells = cells_index.cells_on_points(xx + offsets[:, 1] * cell_size, yy - offsets[:, 0] * cell_size)
+        return tuple(int(c) if c else None for c in cells)
+
     # North cell:
     y = yy + cell_size
     x = xx
@@ -2417,6 +3149,9 @@ def is_boundary_cell(gutils, grid_lyr, cell, cell_size):
         if cell:
             n_cells = number_of_elements(gutils, grid_lyr)
             if n_cells >= cell and cell > 0:
+                cells_index = cached_grid_index(gutils)
+                if cells_index.regular:
+                    return bool(cells_index.is_boundary(cell)[0])
 
                 currentCell = next(grid_lyr.getFeatures(QgsFeatureRequest(cell)))
                 xx, yy = currentCell.geometry().centroid().asPoint()
@@ -9,7 +9,7 @@
 # of the License, or (at your option) any later version
 from math import log, exp, log10
 from qgis.PyQt.QtWidgets import QApplication
-from .grid_tools import poly2poly_geos, centroids2poly_geos
+from .grid_tools import poly2poly_geos, poly2poly_geos_tiled, centroids2poly_geos, parallel_sampling
 from ..user_communication import UserCommunication
 from qgis.utils import iface
 from qgis.PyQt.QtCore import QSettings
@@ -101,9 +101,10 @@ class InfiltrationCalculator(object):
         try:
             grid_params = {}
             green_ampt = GreenAmpt()
+            grid_poly2poly = poly2poly_geos_tiled if parallel_sampling() else poly2poly_geos
 
             try:
-                soil_values = poly2poly_geos(
+                soil_values = grid_poly2poly(
                     self.grid_lyr,
                     self.soil_lyr,
                     None,
@@ -156,7 +157,7 @@ class InfiltrationCalculator(object):
             #                 except ValueError as e:
             #                     raise ValueError('Calculation of soil variables failed for grid cell with fid: {}'.format(gid)) from e
 
-            land_values = poly2poly_geos(
+            land_values = grid_poly2poly(
                 self.grid_lyr, self.land_lyr, None, self.saturation_fld, self.vc_fld, self.ia_fld, self.rtimpl_fld
             )
 
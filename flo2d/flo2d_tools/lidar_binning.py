@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+import os
+from itertools import islice
+
+import numpy as np
+
+from ..flo2d_ie.flo2d_parser import parser_executor
+
+LIDAR_CHUNK_LINES = 500000
+
+
+def lidar_columns(lidar_file):
+    """
+    Checking delimiter and position of X, Y, Z columns in the LiDAR file (based on the first non empty line).
+    Returns (delimiter, (x, y, z) columns) or None if the file layout is not supported.
+    """
+    with open(lidar_file, "r") as f:
+        for line in f:
+            if line.strip() != "":
+                break
+        else:
+            return None
+    n_commas = line.count(",")
+    if n_commas == 0:
+        delimiter, n_values = None, len(line.split())
+    else:
+        delimiter, n_values = ",", n_commas + 1
+    if n_values in (3, 4):
+        return delimiter, (0, 1, 2)
+    elif n_values == 5:
+        return delimiter, (1, 2, 3)
+    return None
+
+
+def read_lidar_chunks(lidar_file, delimiter, usecols, chunk_lines=LIDAR_CHUNK_LINES):
+    """
+    Generator of (first line number, (n, 3) array of X, Y, Z) read from the LiDAR file in fixed size chunks.
+    ValueError raised for a chunk with a malformed line has the line number in 'lineno' attribute.
+    """
+    first_line = 1
+    with open(lidar_file, "r") as f:
+        while True:
+            lines = list(islice(f, chunk_lines))
+            if not lines:
+                break
+            try:
+                xyz = np.loadtxt(lines, delimiter=delimiter, usecols=usecols, ndmin=2)
+            except ValueError:
+                # Keep the points preceding the malformed line and report its number.
+                valid = []
+                for i, line in enumerate(lines):
+                    if line.strip() == "":
+                        continue
+                    try:
+                        values = line.split(delimiter)
+                        valid.append([float(values[c]) for c in usecols])
+                    except (ValueError, IndexError):
+                        if valid:
+                            yield first_line, np.array(valid, dtype=float)
+                        error = ValueError("Wrong LiDAR line")
+                        error.lineno = first_line + i
+                        raise error
+                xyz = np.array(valid, dtype=float).reshape(-1, 3)
+            yield first_line, xyz
+            first_line += len(lines)
+
+
+class LidarLattice(object):
+    """
+    Lookup of grid cells positions by FLO-2D 'col' and 'row' indexes.
+    """
+
+    def __init__(self, fids, cols, rows, xmin, ymin, cell_size):
+        self.fids = np.asarray(fids, dtype=int)
+        self.cols = np.asarray(cols, dtype=int)
+        self.rows = np.asarray(rows, dtype=int)
+        self.xmin = xmin
+        self.ymin = ymin
+        self.cell_size = cell_size
+        self.ncols = int(self.cols.max()) - 1 if self.fids.size else 0
+        self.nrows = int(self.rows.max()) - 1 if self.fids.size else 0
+        self.lookup = np.full(self.ncols * self.nrows, -1, dtype=np.int64)
+        self.lookup[(self.rows - 2) * self.ncols + (self.cols - 2)] = np.arange(self.fids.size)
+
+    @classmethod
+    def from_grid(cls, gutils, xmin, ymin, cell_size):
+        rows = gutils.execute("SELECT fid, col, row FROM grid WHERE col IS NOT NULL AND row IS NOT NULL;").fetchall()
+        cells = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        return cls(cells[:, 0], cells[:, 1], cells[:, 2], xmin, ymin, cell_size)
+
+    def positions(self, xs, ys):
+        """
+        Positions of the cells containing the points, -1 for points outside of the grid.
+        """
+        cols = np.floor((xs - self.xmin) / self.cell_size).astype(np.int64)
+        rows = np.floor((ys - self.ymin) / self.cell_size).astype(np.int64)
+        inside = (cols >= 0) & (cols < self.ncols) & (rows >= 0) & (rows < self.nrows)
+        positions = np.full(xs.size, -1, dtype=np.int64)
+        positions[inside] = self.lookup[rows[inside] * self.ncols + cols[inside]]
+        return positions
+
+
+class LidarBins(object):
+    """
+    Sum, count, min and max of the points elevations per grid cell.
+    """
+
+    def __init__(self, cells_number):
+        self.sum = np.zeros(cells_number)
+        self.count = np.zeros(cells_number, dtype=np.int64)
+        self.min = np.full(cells_number, np.inf)
+        self.max = np.full(cells_number, -np.inf)
+        self.inside = 0
+        self.outside = 0
+        self.errors = []
+
+    def add(self, positions, zs):
+        inside = positions >= 0
+        positions, zs = positions[inside], zs[inside]
+        self.inside += positions.size
+        self.outside += inside.size - positions.size
+        size = self.sum.size
+        self.sum += np.bincount(positions, weights=zs, minlength=size)
+        self.count += np.bincount(positions, minlength=size)
+        np.minimum.at(self.min, positions, zs)
+        np.maximum.at(self.max, positions, zs)
+
+    def merge(self, other):
+        self.sum += other.sum
+        self.count += other.count
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        self.inside += other.inside
+        self.outside += other.outside
+        self.errors += other.errors
+
+    def mean(self):
+        """
+        Mean elevations, NaN for cells without points.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum / self.count
+
+    def statistic(self, statistics):
+        """
+        'Mean', 'Max' or 'Min' values of the bins, NaN for bins without points.
+        """
+        if statistics == "Mean":
+            return self.mean()
+        elif statistics == "Max":
+            values = self.max.copy()
+        elif statistics == "Min":
+            values = self.min.copy()
+        else:
+            raise ValueError("Unknown statistics: {}".format(statistics))
+        values[self.count == 0] = np.nan
+        return values
+
+
+def bin_lidar_file(lattice, lidar_file, killed=None):
+    """
+    Binning all points of the LiDAR file into the grid lattice.
+    Reading stops after the current chunk when 'killed' returns True.
+    """
+    bins = LidarBins(lattice.fids.size)
+    layout = lidar_columns(lidar_file)
+    if layout is None:
+        return bins
+    delimiter, usecols = layout
+    try:
+        for first_line, xyz in read_lidar_chunks(lidar_file, delimiter, usecols):
+            bins.add(lattice.positions(xyz[:, 0], xyz[:, 1]), xyz[:, 2])
+            if killed is not None and killed():
+                break
+    except ValueError as e:
+        bins.errors.append((os.path.basename(lidar_file), getattr(e, "lineno", 0)))
+    return bins
+
+
+def bin_lidar_files(lattice, lidar_files, max_workers=None, progress=None, killed=None):
+    """
+    Binning LiDAR files in parallel workers and merging the partial sums.
+    'progress' is called with the number of files processed so far.
+    'killed' is checked after every chunk, None is returned when it gives True.
+    """
+    bins = LidarBins(lattice.fids.size)
+    executor = parser_executor(max_workers) if len(lidar_files) > 1 else None
+    futures = []
+    try:
+        if executor is None:
+            results = (bin_lidar_file(lattice, lidar_file, killed) for lidar_file in lidar_files)
+        else:
+            futures = [executor.submit(bin_lidar_file, lattice, lidar_file, killed) for lidar_file in lidar_files]
+            results = (future.result() for future in futures)
+        for i, partial in enumerate(results, 1):
+            if killed is not None and killed():
+                return None
+            bins.merge(partial)
+            if progress is not None:
+                progress(i)
+    finally:
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown()
+    return bins
@@ -31,9 +31,10 @@ from .grid_tools import (
     fid_from_grid_features,
     adjacent_grid_elevations,
     three_adjacent_grid_elevations,
-    get_adjacent_cell_elevation,
+    adjacent_cells_elevations,
     buildCellIDNPArray)
-from ..geopackage_utils import GeoPackageUtils
+from .grid_index import cached_grid_index
+from ..geopackage_utils import GeoPackageUtils, multilinestrings_to_gpb, gpb_envelope_center
 from ..user_communication import UserCommunication
 from qgis.PyQt.QtWidgets import QApplication
 
@@ -119,40 +120,106 @@ def interpolate_along_line(line_feature, sampling_features, intervals, id_col="f
         return
 
 
-def polys2levees(line_feature, poly_lyr, levees_lyr, value_col, correct_val, id_col="fid", join_col="user_line_fid"):
+def levee_sides_by_line(gutils):
     """
-    Generator for assigning elevation values from polygons to levees.
-    Levee sides centroids are snapped to the user levee line feature and next tested for intersecting with polygons.
+    Getting schematized levee sides grouped by the parent user levee line with one indexed query.
+    Returns dictionary {user_line_fid: (fids, centroids xs, centroids ys, levcrests)}.
     """
-    lgeom = line_feature.geometry()
-    lid = line_feature[id_col]
-    allfeatures, index = spatial_index(poly_lyr)
-    fids = index.intersects(lgeom.boundingBox())
-    sel_polys = [allfeatures[fid] for fid in fids if allfeatures[fid].geometry().intersects(lgeom)]
-    for feat in levees_lyr.getFeatures():
-        if feat[join_col] == lid:
-            pass
-        else:
-            continue
-        levcrest = feat["levcrest"]
-        center = feat.geometry().centroid()
-        pos = lgeom.lineLocatePoint(center)
-        pnt = lgeom.interpolate(pos)
-        for poly in sel_polys:
-            if poly.geometry().contains(pnt):
-                abs_val, cor = poly[value_col], poly[correct_val]
-                if abs_val and cor:
-                    poly_val = abs_val + cor
-                elif abs_val and not cor:
-                    poly_val = abs_val
-                elif not abs_val and cor:
-                    poly_val = cor + levcrest
-                else:
-                    continue
-                yield (poly_val, feat[id_col])
-                break
-            else:
-                pass
+    gutils.execute("""CREATE INDEX IF NOT EXISTS leveeDataUser_Line_FID ON levee_data (user_line_fid);""")
+    qry = """
+    SELECT user_line_fid, fid, levcrest, geom
+    FROM levee_data
+    WHERE user_line_fid IS NOT NULL AND geom IS NOT NULL
+    ORDER BY user_line_fid, fid;"""
+    centroid_qry = """
+    SELECT ST_X(ST_Centroid(GeomFromGPB(geom))), ST_Y(ST_Centroid(GeomFromGPB(geom)))
+    FROM levee_data
+    WHERE fid = ?;"""
+    rows = gutils.execute(qry).fetchall()
+    centroids = []
+    for row in rows:
+        # Levee sides are straight segments, so centers of their envelopes are the centroids.
+        center = gpb_envelope_center(row[3])
+        centroids.append(center if center is not None else gutils.execute(centroid_qry, (row[1],)).fetchone())
+    sides = {}
+    line_fids = np.array([row[0] for row in rows], dtype=np.int64)
+    line_fids, starts = np.unique(line_fids, return_index=True)
+    bounds = np.append(starts, len(rows)).tolist()
+    for i, line_fid in enumerate(line_fids.tolist()):
+        start, end = bounds[i], bounds[i + 1]
+        xy = np.array(centroids[start:end], dtype=float).reshape(-1, 2)
+        fids = np.array([row[1] for row in rows[start:end]], dtype=np.int64)
+        sides[line_fid] = (fids, xy[:, 0], xy[:, 1], [row[2] for row in rows[start:end]])
+    return sides
+
+
+def line_locate_points(vertices, xs, ys, chunk_size=1000000):
+    """
+    Locating all points on the polyline at once.
+    Returns distances along the line (like 'lineLocatePoint' does) and coordinates of the points snapped to the line.
+    """
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    points = np.column_stack((xs, ys)).astype(float)
+    starts, vectors = vertices[:-1], np.diff(vertices, axis=0)
+    lengths2 = np.einsum("ij,ij->i", vectors, vectors)
+    lengths = np.sqrt(lengths2)
+    along = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+    distances = np.zeros(points.shape[0])
+    snapped = np.zeros(points.shape)
+    step = max(1, chunk_size // max(starts.shape[0], 1))
+    for first in range(0, points.shape[0], step):
+        pts = points[first : first + step]
+        # Position of the projection on each segment (0 - start, 1 - end), the nearest projection is used.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.einsum("ijk,jk->ij", pts[:, None, :] - starts, vectors) / lengths2
+        t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+        projections = starts + t[..., None] * vectors
+        nearest = np.argmin(np.sum((pts[:, None, :] - projections) ** 2, axis=2), axis=1)
+        idx = np.arange(pts.shape[0])
+        distances[first : first + step] = along[nearest] + t[idx, nearest] * lengths[nearest]
+        snapped[first : first + step] = projections[idx, nearest]
+    return distances, snapped[:, 0], snapped[:, 1]
+
+
+def locate_on_line(line_geom, xs, ys):
+    """
+    Distances along the line geometry and coordinates of the points snapped to it.
+    Multipart lines are handled by QGIS point by point.
+    """
+    polyline = [] if line_geom.isMultipart() else line_geom.asPolyline()
+    if len(polyline) >= 2:
+        return line_locate_points([(pnt.x(), pnt.y()) for pnt in polyline], xs, ys)
+    distances, snapped_xs, snapped_ys = [], [], []
+    for x, y in zip(xs, ys):
+        distance = line_geom.lineLocatePoint(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        snapped = line_geom.interpolate(distance).asPoint()
+        distances.append(distance)
+        snapped_xs.append(snapped.x())
+        snapped_ys.append(snapped.y())
+    return np.array(distances, dtype=float), np.array(snapped_xs, dtype=float), np.array(snapped_ys, dtype=float)
+
+
+def interpolate_intervals(positions, intervals):
+    """
+    Interpolating values of the 'get_intervals' intervals at relative positions along the line.
+    Values before the first and after the last snapped point are taken from these points.
+    """
+    xp = [interval[0] for interval in intervals] + [intervals[-1][1]]
+    fp = [interval[3] for interval in intervals] + [intervals[-1][4]]
+    return np.interp(positions, xp, fp)
+
+
+def polygon_levee_value(abs_val, cor, levcrest):
+    """
+    Levee crest elevation taken from the polygon elevation and correction (None if the polygon has no values).
+    """
+    if abs_val and cor:
+        return abs_val + cor
+    elif abs_val and not cor:
+        return abs_val
+    elif not abs_val and cor:
+        return cor + levcrest
+    return None
 
 
 def levee_grid_isect_pts(levee_fid, grid_fid, levee_lyr, grid_lyr, with_centroid=True):
@@ -233,6 +300,9 @@ def generate_schematic_levees(gutils, levee_lyr, grid_lyr):
             grid_levee_seg = {}
             data = []
             fail_data = []
+            fail_params = {}
+            # Positions in 'fail_data' of failures defined with failDepth, together with their cells and directions.
+            depth_fails = []
             for gid, gdata in schem_lines.items():
     
                 elev = gdata["elev"]
@@ -257,7 +327,9 @@ def generate_schematic_levees(gutils, levee_lyr, grid_lyr):
                                     )
                                 )
     
-                                fail = gutils.con.execute(select_fail_qry, (lid,)).fetchone()
+                                if lid not in fail_params:
+                                    fail_params[lid] = gutils.con.execute(select_fail_qry, (lid,)).fetchone()
+                                fail = fail_params[lid]
                                 if fail:
                                     if not all(v == 0 for v in fail):
                                         if not fail[0] == 0.0:
@@ -267,20 +339,28 @@ def generate_schematic_levees(gutils, levee_lyr, grid_lyr):
                                             )
                                         elif not fail[1] == 0.0:
                                             # failDepth selected, use adjacent cell elevations to calculate fail elevation.
-    
-                                            adj_cell, adj_elev = get_adjacent_cell_elevation(
-                                                gutils, grid_lyr, gid, ldir, cell_size
-                                            )
-                                            grid_elev = gutils.grid_value(gid, "elevation")
-                                            max_elev = max(adj_elev, grid_elev)
-    
+                                            # Elevations are evaluated below for all cells at once.
+                                            depth_fails.append((len(fail_data), gid, ldir))
                                             fail_data.append(
-                                                (gid, ldir, max_elev + fail[1], fail[2], fail[3], fail[4], fail[5], fail[6])
+                                                (gid, ldir, fail[1], fail[2], fail[3], fail[4], fail[5], fail[6])
                                             )
                                         else:  # do not set failure data for this direction.
                                             pass
     
             
+            if depth_fails:
+                positions, gids, ldirs = zip(*depth_fails)
+                adj_cells, adj_elevs = adjacent_cells_elevations(gutils, gids, ldirs)
+                grid_index = cached_grid_index(gutils)
+                if grid_index.regular:
+                    grid_elevs = grid_index.elevations(gids)
+                else:
+                    grid_elevs = [gutils.grid_value(gid, "elevation") for gid in gids]
+                for i, adj_elev, grid_elev in zip(positions, adj_elevs, grid_elevs):
+                    gid, ldir, fail_depth = fail_data[i][:3]
+                    max_elev = max(float(adj_elev), float(grid_elev))
+                    fail_data[i] = (gid, ldir, max_elev + fail_depth) + fail_data[i][3:]
+
             gutils.con.executemany(ins_levees_sql, data)
     
             
@@ -699,6 +779,63 @@ def bresenham_line(x1, y1, x2, y2):
     return points
 
 
+def bresenham_lines(x1, y1, x2, y2):
+    """
+    Vectorized Bresenham's Line Algorithm for many segments at once.
+    Returns (segment indexes, xs, ys) arrays with points of all segments in the 'bresenham_line' order.
+    """
+    x1, y1, x2, y2 = (np.asarray(a, dtype=np.int64).ravel() for a in (x1, y1, x2, y2))
+    # Rotate steep lines and swap start and end points where necessary
+    is_steep = np.abs(y2 - y1) > np.abs(x2 - x1)
+    us, vs = np.where(is_steep, y1, x1), np.where(is_steep, x1, y1)
+    ue, ve = np.where(is_steep, y2, x2), np.where(is_steep, x2, y2)
+    swapped = us > ue
+    us, ue = np.where(swapped, ue, us), np.where(swapped, us, ue)
+    vs, ve = np.where(swapped, ve, vs), np.where(swapped, vs, ve)
+    du = ue - us
+    dv = np.abs(ve - vs)
+    vstep = np.where(vs < ve, 1, -1)
+
+    # Each segment has (du + 1) points, 'k' is the point position along the major axis
+    counts = du + 1
+    seg = np.repeat(np.arange(du.size), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    k = np.where(swapped[seg], du[seg] - k, k)
+    # Number of minor axis steps taken by the error accumulator before reaching point 'k'
+    steps = -((du[seg] // 2 - k * dv[seg]) // np.maximum(du[seg], 1))
+    u = us[seg] + k
+    v = vs[seg] + vstep[seg] * steps
+    steep = is_steep[seg]
+    return seg, np.where(steep, v, u), np.where(steep, u, v)
+
+
+def rasterize_polylines(polylines, cell_size, offset_x, offset_y):
+    """
+    Snapping all polylines to the grid lattice and rasterizing their segments at once.
+    Returns (polyline indexes, xt, yt) arrays of integer lattice coordinates, like 'schematize_lines' does
+    the first point of each following segment is skipped. Polylines with less than 2 vertices are omitted.
+    """
+    vertices = [np.asarray(pl, dtype=float).reshape(-1, 2) for pl in polylines]
+    sizes = np.array([v.shape[0] for v in vertices], dtype=np.int64)
+    empty = np.zeros(0, dtype=np.int64)
+    if not np.any(sizes >= 2):
+        return empty, empty, empty
+    xy = np.concatenate([v for v in vertices if v.shape[0] >= 2])
+    line_idx = np.repeat(np.flatnonzero(sizes >= 2), sizes[sizes >= 2])
+    xt = np.rint((xy[:, 0] + offset_x) / float(cell_size)).astype(np.int64)
+    yt = np.rint((xy[:, 1] + offset_y) / float(cell_size)).astype(np.int64)
+    # Segments are pairs of consecutive vertices of the same polyline
+    starts = np.flatnonzero(line_idx[:-1] == line_idx[1:])
+    seg, xs, ys = bresenham_lines(xt[starts], yt[starts], xt[starts + 1], yt[starts + 1])
+    first_point = np.ones(seg.size, dtype=bool)
+    first_point[1:] = seg[1:] != seg[:-1]
+    following = np.ones(starts.size, dtype=bool)
+    following[1:] = line_idx[starts[1:]] == line_idx[starts[:-1]]
+    following[0] = False
+    keep = ~(first_point & following[seg])
+    return line_idx[starts][seg][keep], xs[keep], ys[keep]
+
+
 def schematize_lines(lines, cell_size, offset_x, offset_y, feats_only=False, get_id=False):
     """
     Generator for finding grid centroids coordinates for each schematized line segment.
@@ -707,26 +844,19 @@ def schematize_lines(lines, cell_size, offset_x, offset_y, feats_only=False, get
     Wikipedia: Bresenham's line algorithm is an algorithm that determines the points of an n-dimensional raster
     that should be selected in order to form a close approximation to a straight line between two points.
     """
-    line_features = lines.getFeatures() if feats_only is False else lines
-    for line in line_features:
-        segment = []
-        try:
-            vertices = line.geometry().asPolyline()
-            iver = iter(vertices)
-            x1, y1 = next(iver)
-            x2, y2 = next(iver)
-            vals = [x for x in snap_line(x1, y1, x2, y2, cell_size, offset_x, offset_y)]
-            segment += vals
-            while True:
-                x1, y1 = x2, y2
-                x2, y2 = next(iver)
-                vals = [x for x in snap_line(x1, y1, x2, y2, cell_size, offset_x, offset_y)][1:]
-                segment += vals
-        except StopIteration:
-            if get_id is True:
-                yield line.id(), segment
-            else:
-                yield segment
+    line_features = list(lines.getFeatures() if feats_only is False else lines)
+    polylines = [line.geometry().asPolyline() for line in line_features]
+    line_idx, xt, yt = rasterize_polylines(polylines, cell_size, offset_x, offset_y)
+    xs = (xt * cell_size - offset_x).tolist()
+    ys = (yt * cell_size - offset_y).tolist()
+    bounds = np.searchsorted(line_idx, np.arange(len(line_features) + 1)).tolist()
+    for i, line in enumerate(line_features):
+        start, end = bounds[i], bounds[i + 1]
+        segment = list(zip(xs[start:end], ys[start:end]))
+        if get_id is True:
+            yield line.id(), segment
+        else:
+            yield segment
 
 
 def inject_points(line_geom, points):
@@ -808,54 +938,78 @@ def populate_directions(coords, grids):
         return
 
 
+# Street directions between neighbouring cells indexed by (sign(dx) + 1, sign(dy) + 1).
+STREET_DIRECTIONS = np.array([[7, 4, 8], [3, 0, 1], [6, 2, 5]])
+# Direction back from the neighbour cell.
+OPPOSITE_DIRECTIONS = np.array([0, 3, 4, 1, 2, 7, 8, 5, 6])
+# Unit shifts of the street element end point from the cell centroid for each direction.
+DIRECTION_SHIFTS = np.array([[0, 0], [0, 1], [1, 0], [0, -1], [-1, 0], [1, 1], [1, -1], [-1, -1], [-1, 1]])
+
+
 def schematize_streets(gutils, line_layer, cell_size):
     """
     Calculating and writing schematized streets into the 'street_seg' table.
     """
     streets_sql = """INSERT INTO streets (fid) VALUES (?);"""
-    seg_sql = """INSERT INTO street_seg (geom, str_fid) VALUES (AsGPB(ST_GeomFromText('MULTILINESTRING({0})')), ?)"""
-    elems_sql = """INSERT INTO street_elems (seg_fid, istdir) VALUES (?,?)"""
-    gpb_part = """({0} {1}, {2} {3})"""
+    seg_sql = """INSERT INTO street_seg (fid, geom, str_fid, igridn) VALUES (?,?,?,?);"""
+    elems_sql = """INSERT INTO street_elems (seg_fid, istdir) VALUES (?,?);"""
     half_cell = cell_size * 0.5
     gutils.clear_tables("streets", "street_seg", "street_elems")
-    functions = {
-        1: (lambda x, y, shift: (x, y + shift)),
-        2: (lambda x, y, shift: (x + shift, y)),
-        3: (lambda x, y, shift: (x, y - shift)),
-        4: (lambda x, y, shift: (x - shift, y)),
-        5: (lambda x, y, shift: (x + shift, y + shift)),
-        6: (lambda x, y, shift: (x + shift, y - shift)),
-        7: (lambda x, y, shift: (x - shift, y - shift)),
-        8: (lambda x, y, shift: (x - shift, y + shift)),
-    }
     x_offset, y_offset = gutils.calculate_offset(cell_size)
-    fid_segments = schematize_lines(line_layer, cell_size, x_offset, y_offset, get_id=True)
-    cursor = gutils.con.cursor()
-    fid_coords = {}
-    coords = defaultdict(set)
-    # Populating directions within each grid cell
-    for fid, grids in fid_segments:
-        populate_directions(coords, grids)
-        # Assigning user line fid for each grid centroid coordinates
-        for xy in coords.keys():
-            if xy not in fid_coords:
-                fid_coords[xy] = fid
-            else:
-                continue
-        cursor.execute(streets_sql, (fid,))
-    for i, (xy, directions) in enumerate(iter(coords.items()), 1):
-        x1, y1 = xy
-        xy_dir = []
-        for d in directions:
-            cursor.execute(elems_sql, (i, d))
-            xy_dir.append(functions[d](x1, y1, half_cell))
-        multiline = ",".join((gpb_part.format(x1, y1, x2, y2) for x2, y2 in xy_dir))
-        gpb_insert = seg_sql.format(multiline)
-        cursor.execute(gpb_insert, (fid_coords[xy],))
-    gutils.con.commit()
-    fid_grid = fid_from_grid(gutils, "street_seg", grid_center=True, switch=True)
-    grid_sql = """UPDATE street_seg SET igridn = ? WHERE fid = ?;"""
-    gutils.execute_many(grid_sql, fid_grid)
+    features = list(line_layer.getFeatures())
+    fids = [feat.id() for feat in features]
+    line_idx, xt, yt = rasterize_polylines(
+        [feat.geometry().asPolyline() for feat in features], cell_size, x_offset, y_offset
+    )
+    # Pairs of consecutive cells of the same street with directions in both cells
+    pairs = np.flatnonzero(line_idx[:-1] == line_idx[1:])
+    first, second = pairs, pairs + 1
+    start_dirs = STREET_DIRECTIONS[np.sign(xt[second] - xt[first]) + 1, np.sign(yt[second] - yt[first]) + 1]
+    end_dirs = OPPOSITE_DIRECTIONS[start_dirs]
+    pair_cells = np.column_stack((first, second)).ravel()
+    pair_dirs = np.column_stack((start_dirs, end_dirs)).ravel()
+
+    # Unique cells in order of appearance, each one belongs to the first street reaching it
+    cell_xy = np.column_stack((xt[pair_cells], yt[pair_cells]))
+    unique_xy, first_seen, cell_ids = np.unique(cell_xy, axis=0, return_index=True, return_inverse=True)
+    cell_ids = cell_ids.ravel()
+    order = np.argsort(first_seen, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    seg_fids = rank[cell_ids] + 1
+    seg_xy = unique_xy[order]
+    seg_str = line_idx[pair_cells[first_seen[order]]]
+    masks = np.zeros(order.size, dtype=np.int64)
+    np.bitwise_or.at(masks, seg_fids - 1, 1 << pair_dirs)
+
+    # Street elements (one per cell direction) in ascending direction order
+    bits = (masks[:, None] >> np.arange(1, 9)) & 1
+    elem_seg, elem_dir = np.nonzero(bits)
+    elem_dir = elem_dir + 1
+    counts = np.count_nonzero(bits, axis=1)
+    xs = seg_xy[:, 0] * cell_size - x_offset
+    ys = seg_xy[:, 1] * cell_size - y_offset
+    x1, y1 = xs[elem_seg], ys[elem_seg]
+    shifts = DIRECTION_SHIFTS[elem_dir] * half_cell
+    parts = np.stack((np.column_stack((x1, y1)), np.column_stack((x1 + shifts[:, 0], y1 + shifts[:, 1]))), axis=1)
+    geoms = multilinestrings_to_gpb(parts, counts)
+
+    # Cells are resolved from the grid lattice, irregular grids need the spatial join
+    grid_index = cached_grid_index(gutils)
+    if grid_index.regular:
+        igridn = [fid if fid else None for fid in grid_index.cells_on_points(xs, ys).tolist()]
+    else:
+        igridn = [None] * order.size
+    seg_rows = zip(range(1, order.size + 1), geoms, (fids[i] for i in seg_str.tolist()), igridn)
+    elem_rows = zip((elem_seg + 1).tolist(), elem_dir.tolist())
+    with gutils.transaction():
+        gutils.execute_many(streets_sql, ((fid,) for fid in fids))
+        gutils.execute_many(seg_sql, seg_rows)
+        gutils.execute_many(elems_sql, elem_rows)
+    if not grid_index.regular:
+        fid_grid = fid_from_grid(gutils, "street_seg", grid_center=True, switch=True)
+        grid_sql = """UPDATE street_seg SET igridn = ? WHERE fid = ?;"""
+        gutils.execute_many(grid_sql, fid_grid)
     update_streets = """
     UPDATE streets SET
         stname = (SELECT name FROM user_streets WHERE fid = streets.fid),
@@ -938,12 +1092,11 @@ class ChannelsSchematizer(GeoPackageUtils):
                 elems[fid] = (lelev, relev, typ)
     
             update_qry = """UPDATE {0} SET {1} = ? WHERE user_xs_fid = ? AND {1} IS NULL;"""
-            for fid, (lelev, relev, typ) in list(elems.items()):
-                table = update_table[typ]
-                cur = self.con.cursor()
-                cur.execute(update_qry.format(table, "bankell"), (lelev, fid))
-                cur.execute(update_qry.format(table, "bankelr"), (relev, fid))
-            self.con.commit()
+            with self.transaction():
+                for fid, (lelev, relev, typ) in list(elems.items()):
+                    table = update_table[typ]
+                    self.execute(update_qry.format(table, "bankell"), (lelev, fid))
+                    self.execute(update_qry.format(table, "bankelr"), (relev, fid))
         except Exception as e:
             self.uc.log_info(traceback.format_exc())
             self.uc.show_error("ERROR 080721.1126: Error while updating bank elevations around (left, right) cells: (" + str(lgid) + ", " + str(rgid) + ")", e)            
@@ -1144,9 +1297,10 @@ class ChannelsSchematizer(GeoPackageUtils):
         self.schematized_rbank_lyr.triggerRepaint()
 
         # update nxsecnum in user_chan_n table
-        for i in range(0, len(nxsecnum)):
-            sql = """UPDATE user_chan_n SET nxsecnum = ? WHERE user_xs_fid = ?;"""
-            self.execute(sql, (i + 1, nxsecnum[i]))
+        sql = """UPDATE user_chan_n SET nxsecnum = ? WHERE user_xs_fid = ?;"""
+        with self.transaction():
+            for i in range(0, len(nxsecnum)):
+                self.execute(sql, (i + 1, nxsecnum[i]))
 
     def create_schematized_xsections(self):
         """
@@ -2091,12 +2245,13 @@ class Confluences(GeoPackageUtils):
         FROM chan_elems
         WHERE seg_fid = ? AND nr_in_seg = ?;
         """
-        for i, (tributary_fid, main_fid, tvertex, mvertex, side) in enumerate(vertex_range, 1):
-            tributary_gid, tributary_geom = self.execute(qry, (tributary_fid, tvertex)).fetchone()
-            main_gid, main_geom = self.execute(qry, (tributary_fid, mvertex)).fetchone()
-            self.execute(insert_qry, (i, 0, tributary_gid, tributary_geom))
-            self.execute(insert_qry, (i, 1, main_gid, main_geom))
-            self.remove_xs_after_vertex(tributary_fid, tvertex)
+        with self.transaction():
+            for i, (tributary_fid, main_fid, tvertex, mvertex, side) in enumerate(vertex_range, 1):
+                tributary_gid, tributary_geom = self.execute(qry, (tributary_fid, tvertex)).fetchone()
+                main_gid, main_geom = self.execute(qry, (tributary_fid, mvertex)).fetchone()
+                self.execute(insert_qry, (i, 0, tributary_gid, tributary_geom))
+                self.execute(insert_qry, (i, 1, main_gid, main_geom))
+                self.remove_xs_after_vertex(tributary_fid, tvertex)
 
     def remove_xs_after_vertex(self, seg_fid, vertex_id):
         del_sql = """DELETE FROM chan_elems WHERE seg_fid = ? AND nr_in_seg > ?;"""
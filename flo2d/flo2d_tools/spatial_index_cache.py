@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+import os
+import pathlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Spatial indexes of the grid layers, one entry per kind of index (geometries only).
+GRID_SPATIAL_INDEXES = {}
+# Spatial indexes of the other layers, the least recently used ones are evicted.
+LAYER_SPATIAL_INDEXES = OrderedDict()
+LAYER_SPATIAL_INDEXES_LIMIT = 6
+SPATIAL_INDEXES_LOCK = threading.RLock()
+
+
+def layer_gpkg_table(vlayer):
+    """
+    Getting (GeoPackage path, table name) of the layer or None if the layer isn't stored in the GeoPackage.
+    """
+    if vlayer.providerType() != "ogr":
+        return None
+    parts = vlayer.source().split("|")
+    gpkg_path = parts[0]
+    if not gpkg_path.lower().endswith(".gpkg") or not os.path.isfile(gpkg_path):
+        return None
+    table = None
+    for part in parts[1:]:
+        if part.startswith("layername="):
+            table = part[len("layername=") :]
+    return gpkg_path, table
+
+
+def gpkg_file_stamp(gpkg_path):
+    """
+    Last modification stamp of the GeoPackage file together with its write-ahead log.
+    """
+    stamp = []
+    for pth in (gpkg_path, gpkg_path + "-wal"):
+        try:
+            st = os.stat(pth)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def grid_geometry_stamp(gpkg_path):
+    """
+    Signature of the grid geometries taken from the grid R-tree (changes of the other grid columns are ignored).
+    """
+    uri = pathlib.Path(gpkg_path).as_uri() + "?mode=ro"
+    try:
+        con = sqlite3.connect(uri, uri=True)
+        try:
+            qry = "SELECT COUNT(id), MAX(id), TOTAL(minx), TOTAL(maxx), TOTAL(miny), TOTAL(maxy) FROM rtree_grid_geom;"
+            return con.execute(qry).fetchone()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return gpkg_file_stamp(gpkg_path)
+
+
+def cached_layer_index(kind, vlayer, build):
+    """
+    Getting spatial index of 'kind' over all features of the layer.
+    The index is built with 'build(vlayer, attributes)' and reused until the layer data changes.
+    Grid indexes hold geometries only, so they survive updates of grid attributes (elevation, n_value etc.).
+    """
+    gpkg_table = layer_gpkg_table(vlayer)
+    if gpkg_table is None or (vlayer.isEditable() and vlayer.isModified()):
+        return build(vlayer, True)
+    gpkg_path, table = gpkg_table
+    key = (kind, os.path.normcase(os.path.abspath(gpkg_path)), table, vlayer.subsetString())
+    with SPATIAL_INDEXES_LOCK:
+        if table == "grid":
+            stamp = grid_geometry_stamp(gpkg_path)
+            cached = GRID_SPATIAL_INDEXES.get(kind)
+            if cached is not None and cached[0] == key and cached[1] == stamp:
+                return cached[2]
+            spatial_index = build(vlayer, False)
+            GRID_SPATIAL_INDEXES[kind] = (key, stamp, spatial_index)
+            return spatial_index
+        stamp = gpkg_file_stamp(gpkg_path)
+        cached = LAYER_SPATIAL_INDEXES.get(key)
+        if cached is not None and cached[0] == stamp:
+            LAYER_SPATIAL_INDEXES.move_to_end(key)
+            return cached[1]
+        spatial_index = build(vlayer, True)
+        LAYER_SPATIAL_INDEXES[key] = (stamp, spatial_index)
+        LAYER_SPATIAL_INDEXES.move_to_end(key)
+        while len(LAYER_SPATIAL_INDEXES) > LAYER_SPATIAL_INDEXES_LIMIT:
+            LAYER_SPATIAL_INDEXES.popitem(last=False)
+        return spatial_index
+
+
+def clear_spatial_index_cache():
+    """
+    Dropping all cached spatial indexes (e.g. when the GeoPackage is closed).
+    """
+    with SPATIAL_INDEXES_LOCK:
+        GRID_SPATIAL_INDEXES.clear()
+        LAYER_SPATIAL_INDEXES.clear()
@@ -8,11 +8,48 @@
 # as published by the Free Software Foundation; either version 2
 # of the License, or (at your option) any later version
 import os
+import re
+import pathlib
+import struct
 import traceback
+from contextlib import contextmanager
 from functools import wraps
 from collections import defaultdict
 from .user_communication import UserCommunication
-from qgis.core import QgsGeometry
+from .flo2d_tools.grid_index import cached_grid_index, clear_grid_indexes
+from qgis.core import QgsGeometry, QgsMessageLog, Qgis
+from qgis.PyQt.QtCore import QSettings
+
+import numpy as np
+
+# GeoPackage binary header as written by SpatiaLite 'AsGPB': little endian with [minx, maxx, miny, maxy] envelope.
+GPB_MAGIC = b"GP"
+GPB_FLAGS = 0x03
+GPB_HEADER = [("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("srid", "<i4"), ("envelope", "<f8", (4,))]
+WKB_HEADER = [("byte_order", "u1"), ("wkb_type", "<u4")]
+# Envelope sizes (bytes) by the envelope contents indicator of the GeoPackage binary flags.
+GPB_ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+SQUARE_GPB_DTYPE = np.dtype(GPB_HEADER + WKB_HEADER + [("rings", "<u4"), ("points", "<u4"), ("coords", "<f8", (5, 2))])
+POINT_GPB_DTYPE = np.dtype(GPB_HEADER + WKB_HEADER + [("coords", "<f8", (2,))])
+LINE_WKB_DTYPE = np.dtype(WKB_HEADER + [("points", "<u4"), ("coords", "<f8", (2, 2))])
+
+# Depth of nested 'transaction' blocks per connection, shared by all GeoPackageUtils using the same connection.
+TRANSACTION_DEPTHS = {}
+
+# Grid cells which bounding boxes overlap the geometry, taken from the grid R-tree.
+GRID_RTREE_FILTER = """g.fid IN (
+            SELECT id FROM rtree_grid_geom
+            WHERE
+                minx <= ST_MaxX({0}) AND
+                maxx >= ST_MinX({0}) AND
+                miny <= ST_MaxY({0}) AND
+                maxy >= ST_MinY({0}))"""
+
+
+# Connection tuning: page cache (KiB), memory-mapped I/O (bytes) and number of cached prepared statements.
+CONNECTION_CACHE_KIB = 65536
+CONNECTION_MMAP_SIZE = 268435456
+CONNECTION_CACHED_STATEMENTS = 512
 
 
 def connection_required(fn):
@@ -63,7 +100,154 @@ def spatialite_connect(*args, **kwargs):
     return dbapi2.connect(*args, **kwargs)
 
 
-def database_create(path):
+def tune_connection(con, cache_kib=CONNECTION_CACHE_KIB, mmap_size=CONNECTION_MMAP_SIZE, wal=False):
+    """
+    Setting page cache, memory-mapped I/O and in-memory temporary storage of the connection.
+    With 'wal' the database is switched to write-ahead log, so QGIS layers reading the GeoPackage
+    and plugin writes don't block each other. Returns the journal mode in use.
+    """
+    cur = con.cursor()
+    cur.execute("PRAGMA cache_size = -{0};".format(int(cache_kib)))
+    cur.execute("PRAGMA mmap_size = {0};".format(int(mmap_size)))
+    cur.execute("PRAGMA temp_store = MEMORY;")
+    journal_mode = cur.execute("PRAGMA journal_mode;").fetchone()[0]
+    if wal and journal_mode.lower() != "wal":
+        try:
+            journal_mode = cur.execute("PRAGMA journal_mode = WAL;").fetchone()[0]
+        except Exception as e:
+            # Database is locked by other process or opened read-only.
+            msg = "WARNING 181026.1512: Switching GeoPackage to write-ahead log failed, keeping '{0}' journal mode.\n{1}"
+            QgsMessageLog.logMessage(msg.format(journal_mode, e), "FLO-2D", Qgis.Warning)
+    if journal_mode.lower() == "wal":
+        cur.execute("PRAGMA synchronous = NORMAL;")
+    cur.close()
+    return journal_mode
+
+
+def read_only_connect(gpkg_path, **kwargs):
+    """
+    Opening tuned read-only connection to the GeoPackage (e.g. for worker threads).
+    """
+    uri = pathlib.Path(gpkg_path).as_uri() + "?mode=ro"
+    kwargs.setdefault("cached_statements", CONNECTION_CACHED_STATEMENTS)
+    con = spatialite_connect(uri, uri=True, **kwargs)
+    tune_connection(con, wal=False)
+    return con
+
+
+def split_gpb_records(records):
+    """
+    Split structured array of fixed size GeoPackage binary records into list of blobs.
+    """
+    size = records.dtype.itemsize
+    buff = records.tobytes()
+    return [buff[i : i + size] for i in range(0, len(buff), size)]
+
+
+def squares_to_gpb(xs, ys, size, srid=0):
+    """
+    Encoding squares centered at xs, ys coordinates as GeoPackage binary polygons without SQL round-trips.
+    Vertices order matches the one used by 'build_square_from_polygon'.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    half_size = float(size) * 0.5
+    xmin, xmax = xs - half_size, xs + half_size
+    ymin, ymax = ys - half_size, ys + half_size
+
+    records = np.zeros(xs.shape[0], dtype=SQUARE_GPB_DTYPE)
+    records["magic"] = GPB_MAGIC
+    records["flags"] = GPB_FLAGS
+    records["srid"] = srid
+    records["envelope"] = np.column_stack((xmin, xmax, ymin, ymax))
+    records["byte_order"] = 1
+    records["wkb_type"] = 3
+    records["rings"] = 1
+    records["points"] = 5
+    records["coords"] = np.stack(
+        (
+            np.column_stack((xmin, ymin)),
+            np.column_stack((xmax, ymin)),
+            np.column_stack((xmax, ymax)),
+            np.column_stack((xmin, ymax)),
+            np.column_stack((xmin, ymin)),
+        ),
+        axis=1,
+    )
+    return split_gpb_records(records)
+
+
+def points_to_gpb(xs, ys, srid=0):
+    """
+    Encoding points as GeoPackage binary geometries without SQL round-trips.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    records = np.zeros(xs.shape[0], dtype=POINT_GPB_DTYPE)
+    records["magic"] = GPB_MAGIC
+    records["flags"] = GPB_FLAGS
+    records["srid"] = srid
+    records["envelope"] = np.column_stack((xs, xs, ys, ys))
+    records["byte_order"] = 1
+    records["wkb_type"] = 1
+    records["coords"] = np.column_stack((xs, ys))
+    return split_gpb_records(records)
+
+
+def multilinestrings_to_gpb(coords, counts, srid=0):
+    """
+    Encoding multilinestrings made of two-point lines as GeoPackage binary geometries without SQL round-trips.
+    'coords' holds lines of all geometries with shape (lines, 2, 2), 'counts' is the number of lines of each geometry.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2, 2)
+    counts = np.asarray(counts, dtype=int)
+    offsets = np.cumsum(counts) - counts
+    blobs = [None] * counts.size
+    for n in np.unique(counts):
+        idx = np.flatnonzero(counts == n)
+        lines = coords[offsets[idx][:, None] + np.arange(n)]
+        xs, ys = lines[..., 0], lines[..., 1]
+        records = np.zeros(idx.size, dtype=GPB_HEADER + WKB_HEADER + [("lines", "<u4"), ("parts", LINE_WKB_DTYPE, (n,))])
+        records["magic"] = GPB_MAGIC
+        records["flags"] = GPB_FLAGS
+        records["srid"] = srid
+        records["envelope"] = np.column_stack(
+            (xs.min(axis=(1, 2)), xs.max(axis=(1, 2)), ys.min(axis=(1, 2)), ys.max(axis=(1, 2)))
+        )
+        records["byte_order"] = 1
+        records["wkb_type"] = 5
+        records["lines"] = n
+        records["parts"]["byte_order"] = 1
+        records["parts"]["wkb_type"] = 2
+        records["parts"]["points"] = 2
+        records["parts"]["coords"] = lines
+        for i, blob in zip(idx, split_gpb_records(records)):
+            blobs[i] = blob
+    return blobs
+
+
+def gpb_envelope_center(blob):
+    """
+    Reading center of the GeoPackage binary geometry envelope straight from the blob header.
+    Returns None if geometry was stored without envelope.
+    """
+    flags = blob[3]
+    if not (flags >> 1) & 0x07:
+        return None
+    byte_order = "<" if flags & 0x01 else ">"
+    minx, maxx, miny, maxy = struct.unpack_from(byte_order + "4d", blob, 8)
+    return (minx + maxx) * 0.5, (miny + maxy) * 0.5
+
+
+def gpb_to_wkb(blob):
+    """
+    Stripping GeoPackage binary header (and envelope) to get the plain WKB geometry.
+    """
+    envelope_size = GPB_ENVELOPE_SIZES[(blob[3] >> 1) & 0x07]
+    return bytes(blob[8 + envelope_size :])
+
+
+def database_create(path, tuned=True):
     """
     Create geopackage with SpatiaLite functions.
     """
@@ -76,7 +260,7 @@ def database_create(path):
         # Couldn't write on the existing GeoPackage file. Check if it is not opened by another process
         return False
 
-    con = database_connect(path)
+    con = database_connect(path, tuned)
     plugin_dir = os.path.dirname(__file__)
     script = os.path.join(plugin_dir, "db_structure.sql")
     qry = open(script, "r").read()
@@ -87,12 +271,29 @@ def database_create(path):
     return con
 
 
-def database_connect(path):
+def grid_rtree_triggers():
+    """
+    Definitions (name, sql) of the triggers from 'db_structure.sql' which take grid cells from the grid R-tree.
+    """
+    script = os.path.join(os.path.dirname(__file__), "db_structure.sql")
+    with open(script, "r") as f:
+        qry = f.read()
+    pattern = re.compile(r'^CREATE TRIGGER (?:IF NOT EXISTS )?"(\w+)".*?^\s*END;', re.S | re.M)
+    return [(m.group(1), m.group(0)) for m in pattern.finditer(qry) if "rtree_grid_geom" in m.group(0)]
+
+
+def database_connect(path, tuned=True):
     """
     Connect database with sqlite3.
+    Tuned connection uses larger caches, write-ahead log is used only when enabled by 'FLO-2D/wal_journal' setting
+    (the journal mode is stored in the GeoPackage file and stays in use for later sessions).
     """
     try:
-        con = spatialite_connect(path)
+        if not tuned:
+            return spatialite_connect(path)
+        con = spatialite_connect(path, cached_statements=CONNECTION_CACHED_STATEMENTS)
+        wal = QSettings().value("FLO-2D/wal_journal", False, type=bool)
+        tune_connection(con, wal=wal)
         return con
     except Exception as e:
         # Couldn't connect to GeoPackage
@@ -103,6 +304,7 @@ def database_disconnect(con):
     """
     Disconnect from database.
     """
+    clear_grid_indexes(con)
     try:
         con.close()
     except Exception as e:
@@ -212,19 +414,51 @@ class GeoPackageUtils(object):
         tabs = [row[0] for row in self.execute(tab_sql)]
         self.execute("ATTACH ? AS other;", (other_gpkg,))
         insert_sql = """INSERT INTO {0} ({1}) SELECT {1} FROM other.{0};"""
-        self.clear_tables(*tabs)
-        for tab in tabs:
-            names_new = self.table_info(tab, only_columns=True)
-            names_old = set(self.table_info(tab, only_columns=True, attached_db="other"))
-            import_names = (name for name in names_new if name in names_old)
-            columns = ", ".join(import_names)
-            try:
-                qry = insert_sql.format(tab, columns)
-                self.execute(qry)
-            except Exception as e:
-                self.uc.log_info(traceback.format_exc())
+        with self.bulk_write(*tabs):
+            self.clear_tables(*tabs)
+            for tab in tabs:
+                names_new = self.table_info(tab, only_columns=True)
+                names_old = set(self.table_info(tab, only_columns=True, attached_db="other"))
+                import_names = (name for name in names_new if name in names_old)
+                columns = ", ".join(import_names)
+                try:
+                    qry = insert_sql.format(tab, columns)
+                    self.execute(qry)
+                except Exception as e:
+                    self.uc.log_info(traceback.format_exc())
         self.execute("DETACH other;")
 
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work. Statements executed inside the block are committed once when the outermost block exits
+        and rolled back together if it exits with an error.
+        """
+        key = id(self.con)
+        depth = TRANSACTION_DEPTHS.get(key, 0) + 1
+        TRANSACTION_DEPTHS[key] = depth
+        try:
+            yield
+        except Exception:
+            if depth == 1:
+                self.con.rollback()
+            raise
+        else:
+            if depth == 1:
+                self.con.commit()
+        finally:
+            if depth == 1:
+                del TRANSACTION_DEPTHS[key]
+            else:
+                TRANSACTION_DEPTHS[key] = depth - 1
+
+    @property
+    def transaction_depth(self):
+        """
+        Depth of nested 'transaction' blocks open on the connection, statements are committed only outside of them.
+        """
+        return TRANSACTION_DEPTHS.get(id(self.con), 0)
+
     def execute(self, statement, inputs=None, get_rowid=False):
         """
         Execute a prepared SQL statement on this geopackage database.
@@ -236,14 +470,16 @@ class GeoPackageUtils(object):
             else:
                 result_cursor = cursor.execute(statement)
             rowid = cursor.lastrowid
-            self.con.commit()
+            if not self.transaction_depth:
+                self.con.commit()
             if get_rowid:
                 return rowid
             else:
                 return result_cursor
 
         except Exception as e:
-            self.con.rollback()
+            if not self.transaction_depth:
+                self.con.rollback()
             raise
 
     def execute_many(self, sql, data):
@@ -253,9 +489,11 @@ class GeoPackageUtils(object):
                 cursor.executemany(sql, data)
             else:
                 return
-            self.con.commit()
+            if not self.transaction_depth:
+                self.con.commit()
         except Exception as e:
-            self.con.rollback()
+            if not self.transaction_depth:
+                self.con.rollback()
             raise
 
     def batch_execute(self, *sqls):
@@ -272,11 +510,13 @@ class GeoPackageUtils(object):
                 qry_all = qry + qry_part
                 cur = self.con.cursor()
                 cur.executemany(qry_all, sql)
-                self.con.commit()
+                if not self.transaction_depth:
+                    self.con.commit()
                 del sql[:]
                 sql += [qry, row_len]
             except Exception as e:
-                self.con.rollback()
+                if not self.transaction_depth:
+                    self.con.rollback()
                 self.uc.log_info(qry)
                 self.uc.log_info(traceback.format_exc())
 
@@ -359,9 +599,10 @@ class GeoPackageUtils(object):
             sql = """SELECT ST_AsText(ST_Centroid(GeomFromGPB(geom))) FROM "{0}" WHERE "{1}" = ?;"""
         else:
             sql = """SELECT AsGPB(ST_Centroid(GeomFromGPB(geom))) FROM "{0}" WHERE "{1}" = ?;"""
-        for g in gids:
-            geom = self.execute(sql.format(table, field), (g,)).fetchone()[0]
-            cells[g] = geom
+        with self.transaction():
+            for g in gids:
+                geom = self.execute(sql.format(table, field), (g,)).fetchone()[0]
+                cells[g] = geom
         return cells
     
     def grid_centroids_all(self, table="grid", field="fid", buffers=False):
@@ -376,6 +617,12 @@ class GeoPackageUtils(object):
         return cells
 
     def single_centroid(self, gid, table="grid", field="fid", buffers=False):
+        if table == "grid" and field == "fid" and buffers is False:
+            grid_index = cached_grid_index(self)
+            if grid_index.regular:
+                centroid = grid_index.centroid(int(gid))
+                if centroid is not None:
+                    return "POINT({0} {1})".format(*centroid)
         if buffers is False:
             sql = """SELECT ST_AsText(ST_Centroid(GeomFromGPB(geom))) FROM "{0}" WHERE "{1}" = ?;"""
         else:
@@ -386,12 +633,10 @@ class GeoPackageUtils(object):
     def build_linestring(self, gids, table="grid", field="fid"):
         gpb = """SELECT AsGPB(ST_GeomFromText('LINESTRING("""
         points = []
-        for g in gids:
-            qry = """SELECT ST_AsText(ST_Centroid(GeomFromGPB(geom))) FROM "{0}" WHERE "{1}" = ?;""".format(
-                table, field
-            )
-            wkt_geom = self.execute(qry, (g,)).fetchone()[0]
-            points.append(wkt_geom.strip("POINT()"))
+        with self.transaction():
+            for g in gids:
+                wkt_geom = self.single_centroid(g, table, field)
+                points.append(wkt_geom.strip("POINT()"))
         gpb = gpb + ",".join(points) + ")'))"
         gpb_buff = self.execute(gpb).fetchone()[0]
         return gpb_buff
@@ -649,6 +894,191 @@ class GeoPackageUtils(object):
         qry = "SELECT fid, structname, type, notes FROM struct ORDER BY LOWER(structname);"
         return self.execute(qry).fetchall()
 
+    def rebuild_rtree(self, table, column="geom", field="fid"):
+        """
+        Rebuild GeoPackage R-tree spatial index of a table in a single statement.
+        """
+        rtree = "rtree_{0}_{1}".format(table, column)
+        self.execute('DELETE FROM "{0}";'.format(rtree))
+        qry = """INSERT INTO "{0}" SELECT "{1}", ST_MinX("{2}"), ST_MaxX("{2}"), ST_MinY("{2}"), ST_MaxY("{2}")
+                 FROM "{3}" WHERE "{2}" NOT NULL AND NOT ST_IsEmpty("{2}");"""
+        self.execute(qry.format(rtree, field, column, table))
+
+    def table_triggers(self, table):
+        """
+        Return names and definitions of all triggers defined on a table.
+        """
+        qry = """SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?;"""
+        return self.execute(qry, (table,)).fetchall()
+
+    def spatial_indexes(self, *tables):
+        """
+        Return (table, geometry column) pairs of the tables having GeoPackage R-tree spatial index.
+        """
+        qry = """SELECT gc.table_name, gc.column_name FROM gpkg_geometry_columns AS gc
+                 JOIN sqlite_master AS sm ON sm.name = 'rtree_' || gc.table_name || '_' || gc.column_name
+                 WHERE sm.type = 'table';"""
+        return [(tab, col) for tab, col in self.execute(qry).fetchall() if tab in tables]
+
+    @contextmanager
+    def bulk_write(self, *tables):
+        """
+        Context manager for heavy writes into the tables.
+        The block runs in a single transaction. All triggers of the tables are dropped and FLO-2D triggers are
+        disabled inside of it, on exit triggers are recreated and R-tree indexes of the tables are rebuilt once.
+        Nothing of it is committed before the block ends, so an interrupted write leaves the previous state of
+        the tables with their triggers in place.
+        """
+        with self.transaction():
+            if not self.con.in_transaction:
+                # The sqlite3 module doesn't open a transaction implicitly before DDL statements.
+                self.execute("BEGIN;")
+            control = self.execute("SELECT name, enabled FROM trigger_control;").fetchall()
+            triggers = []
+            for table in tables:
+                triggers += self.table_triggers(table)
+            for name, sql in triggers:
+                self.execute('DROP TRIGGER IF EXISTS "{0}";'.format(name))
+            self.disable_geom_triggers()
+            if "grid" in tables:
+                # Cached grid index is rebuilt on the next use, without reporting every written row to it.
+                clear_grid_indexes(self.con)
+            try:
+                yield
+            finally:
+                for name, sql in triggers:
+                    self.execute('DROP TRIGGER IF EXISTS "{0}";'.format(name))
+                    self.execute(sql)
+                self.execute_many(
+                    "UPDATE trigger_control SET enabled = ? WHERE name = ?;", [(e, n) for n, e in control]
+                )
+                for table, column in self.spatial_indexes(*tables):
+                    self.rebuild_rtree(table, column)
+
+    def reassign_inflow_cells(self):
+        """
+        Assign grid cells to all inflow boundary conditions in one spatial join restricted by the grid R-tree.
+        """
+        self.execute("DELETE FROM inflow_cells;")
+        qry = """INSERT INTO inflow_cells (inflow_fid, grid_fid, area_factor)
+            SELECT
+                abc.bc_fid, g.fid, CAST(abc.bc_fid AS INT)
+            FROM
+                all_user_bc AS abc, grid AS g
+            WHERE
+                abc.type = 'inflow' AND
+                abc.geom NOT NULL AND
+                {0} AND
+                ST_Intersects(CastAutomagic(g.geom), CastAutomagic(abc.geom));"""
+        return self.execute(qry.format(GRID_RTREE_FILTER.format("CastAutomagic(abc.geom)"))).rowcount
+
+    def reassign_outflow_cells(self):
+        """
+        Assign grid cells to all outflow boundary conditions in one spatial join restricted by the grid R-tree.
+        Returns number of assigned cells and list of cells without matching outflow.
+        """
+        self.execute("DELETE FROM outflow_cells;")
+        qry = """INSERT INTO outflow_cells (outflow_fid, grid_fid, geom_type, area_factor)
+            SELECT
+                abc.bc_fid, g.fid, abc.geom_type, CAST(abc.bc_fid AS INT)
+            FROM
+                all_user_bc AS abc, grid AS g
+            WHERE
+                abc.type = 'outflow' AND
+                abc.geom NOT NULL AND
+                {0} AND
+                ST_Intersects(CastAutomagic(g.geom), CastAutomagic(abc.geom));"""
+        inserted = self.execute(qry.format(GRID_RTREE_FILTER.format("CastAutomagic(abc.geom)"))).rowcount
+        # Cells hold user BC fids at this point, swap them for fids of the matching outflows.
+        upd_qry = """UPDATE outflow_cells SET outflow_fid = (
+                SELECT o.fid FROM outflow AS o
+                WHERE o.geom_type = outflow_cells.geom_type AND o.bc_fid = outflow_cells.area_factor)
+            WHERE EXISTS (
+                SELECT 1 FROM outflow AS o
+                WHERE o.geom_type = outflow_cells.geom_type AND o.bc_fid = outflow_cells.area_factor);"""
+        self.execute(upd_qry)
+        unmatched_qry = """SELECT oc.grid_fid, oc.geom_type, oc.area_factor FROM outflow_cells AS oc
+            WHERE NOT EXISTS (
+                SELECT 1 FROM outflow AS o WHERE o.geom_type = oc.geom_type AND o.bc_fid = oc.area_factor)
+            ORDER BY oc.fid;"""
+        no_fid = []
+        for grid, geom_type, area_factor in self.execute(unmatched_qry).fetchall():
+            tab_bc_fid = self.execute("SELECT tab_bc_fid FROM all_schem_bc WHERE grid_fid = ?;", (grid,)).fetchone()
+            if tab_bc_fid:
+                self.execute(
+                    "UPDATE outflow_cells SET outflow_fid = ? WHERE geom_type = ? AND area_factor = ?;",
+                    (tab_bc_fid[0], geom_type, area_factor),
+                )
+            else:
+                no_fid.append(grid)
+        return inserted, no_fid
+
+    def reassign_struct_cells(self):
+        """
+        Assign inflow and outflow nodes of all structures using the grid R-tree.
+        """
+        qry = """UPDATE struct SET
+            inflonod = (
+                SELECT g.fid FROM
+                    grid AS g,
+                    user_struct AS us
+                WHERE
+                    us.fid = struct.fid AND
+                    {0} AND
+                    ST_Intersects(ST_StartPoint(GeomFromGPB(us.geom)), GeomFromGPB(g.geom))
+                LIMIT 1
+            ),
+            outflonod = (
+                SELECT g.fid FROM
+                    grid AS g,
+                    user_struct AS us
+                WHERE
+                    us.fid = struct.fid AND
+                    {1} AND
+                    ST_Intersects(ST_EndPoint(GeomFromGPB(us.geom)), GeomFromGPB(g.geom))
+                LIMIT 1);"""
+        start_filter = GRID_RTREE_FILTER.format("ST_StartPoint(GeomFromGPB(us.geom))")
+        end_filter = GRID_RTREE_FILTER.format("ST_EndPoint(GeomFromGPB(us.geom))")
+        self.execute(qry.format(start_filter, end_filter))
+
+    def reassign_bc_struct_cells(self, inflows=True, outflows=True, structs=True):
+        """
+        Reassign grid cells of all boundary conditions and structures in a single transaction.
+        Returns numbers of inflow and outflow cells and list of outflow cells without matching outflow.
+        """
+        in_inserted, out_inserted, no_fid = 0, 0, []
+        with self.transaction():
+            if outflows:
+                out_inserted, no_fid = self.reassign_outflow_cells()
+            if inflows:
+                in_inserted = self.reassign_inflow_cells()
+            if structs:
+                self.reassign_struct_cells()
+        return in_inserted, out_inserted, no_fid
+
+    def update_grid_rtree_triggers(self):
+        """
+        Replace full grid scanning triggers of GeoPackages created by older plugin versions with the R-tree
+        filtered ones from 'db_structure.sql'. Returns names of the replaced triggers.
+        """
+        if self.execute("SELECT 1 FROM sqlite_master WHERE name = 'rtree_grid_geom';").fetchone() is None:
+            return []
+        existing = dict(self.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger';").fetchall())
+        outdated = [
+            (name, sql)
+            for name, sql in grid_rtree_triggers()
+            if name in existing and "rtree_grid_geom" not in existing[name]
+        ]
+        if outdated:
+            with self.transaction():
+                if not self.con.in_transaction:
+                    # The sqlite3 module doesn't open a transaction implicitly before DDL statements.
+                    self.execute("BEGIN;")
+                for name, sql in outdated:
+                    self.execute('DROP TRIGGER IF EXISTS "{0}";'.format(name))
+                    self.execute(sql)
+        return [name for name, sql in outdated]
+
     def disable_geom_triggers(self):
         qry = "UPDATE trigger_control SET enabled = 0;"
         self.execute(qry)
@@ -672,6 +1102,9 @@ class GeoPackageUtils(object):
         """
         Getting fid of grid which contains given point.
         """
+        grid_index = cached_grid_index(self)
+        if grid_index.regular:
+            return grid_index.cell_on_point(x, y)
         qry = """
         SELECT g.fid
         FROM grid AS g
@@ -697,6 +1130,13 @@ class GeoPackageUtils(object):
         """
         Getting elevation of grid which contains given point.
         """
+        grid_index = cached_grid_index(self)
+        if grid_index.regular:
+            gid = grid_index.cell_on_point(x, y)
+            if gid is None:
+                return None
+            elev = grid_index.elevations(gid)[0]
+            return None if np.isnan(elev) else float(elev)
         qry = """
         SELECT g.elevation
         FROM grid AS g
@@ -735,19 +1175,18 @@ class GeoPackageUtils(object):
 
         xs_sql = """SELECT fid, type FROM chan_elems;"""
         cross_sections = self.execute(xs_sql).fetchall()
-        cur = self.con.cursor()
-        for fid, typ in cross_sections:
-            if typ == "R":
-                cur.execute(chan_r, (fid,))
-            elif typ == "V":
-                cur.execute(chan_v, (fid,))
-            elif typ == "T":
-                cur.execute(chan_t, (fid,))
-            elif typ == "N":
-                cur.execute(chan_n, (fid,))
-            else:
-                pass
-        self.con.commit()
+        with self.transaction():
+            for fid, typ in cross_sections:
+                if typ == "R":
+                    self.execute(chan_r, (fid,))
+                elif typ == "V":
+                    self.execute(chan_v, (fid,))
+                elif typ == "T":
+                    self.execute(chan_t, (fid,))
+                elif typ == "N":
+                    self.execute(chan_n, (fid,))
+                else:
+                    pass
 
     def create_schematized_rbank_lines_from_xs_tips(self):
         """
@@ -171,9 +171,16 @@ class BCEditorWidget(qtBaseClass, uiDialog):
                 return
 
         QApplication.setOverrideCursor(Qt.WaitCursor)
-        
-        out_inserted = self.schematize_outflows()
-        in_inserted = self.schematize_inflows()
+        try:
+            in_inserted, out_inserted, no_fid = self.gutils.reassign_bc_struct_cells(structs=False)
+        except Exception as e:
+            QApplication.restoreOverrideCursor()
+            self.uc.show_error("ERROR 181026.1655: Schematizing of boundary conditions aborted!\n", e)
+            self.uc.log_info(traceback.format_exc())
+            return
+        msg = "".join("\nNo fid for " + str(grid) for grid in no_fid)
+        if msg:
+            self.uc.show_warn(msg)
 
         out_deleted, time_stage_1, time_stage_2, border = self.select_outflows_according_to_type() 
         self.highlight_time_stage_cells(time_stage_1, time_stage_2)  
@@ -560,33 +567,6 @@ class BCEditorWidget(qtBaseClass, uiDialog):
         self.inflow.set_time_series_data(data_name, ts_data)
         self.update_inflow_plot()       
 
-    def schematize_inflows(self):
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        try:
-            outflow = self.gutils.execute("SELECT * FROM outflow;").fetchall()
-            inflow = self.gutils.execute("SELECT * FROM inflow;").fetchall()   
-                      
-            del_qry = "DELETE FROM inflow_cells;"
-            ins_qry = """INSERT INTO inflow_cells (inflow_fid, grid_fid, area_factor)
-                SELECT
-                    abc.bc_fid, g.fid, CAST(abc.bc_fid AS INT)
-                FROM
-                    grid AS g, all_user_bc AS abc
-                WHERE
-                    abc.type = 'inflow' AND
-                    ST_Intersects(CastAutomagic(g.geom), CastAutomagic(abc.geom));"""
-            self.gutils.execute(del_qry)
-            
-            inserted = self.gutils.execute(ins_qry)
-            QApplication.restoreOverrideCursor()
-            return inserted.rowcount
-        #             self.uc.show_info("Inflows schematized!")
-        except Exception:
-            QApplication.restoreOverrideCursor()
-            self.uc.show_warn("WARNING 180319.1431: Schematizing of inflow aborted!")
-            self.uc.log_info(traceback.format_exc())
-            return 0
-
     def show_inflow_rb(self):
         self.lyrs.show_feat_rubber(self.bc_lyr.id(), self.inflow.bc_fid)
 
@@ -911,59 +891,6 @@ class BCEditorWidget(qtBaseClass, uiDialog):
         self.outflow.set_time_series_data(data_name, data)
         self.update_outflow_plot() 
         
-    def schematize_outflows(self):
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        try:
-            
-            msg = ""  
-                                   
-            self.gutils.execute('DELETE FROM outflow_cells;')
-            self.gutils.execute('DELETE FROM inflow_cells;')
-            
-            
-#             all_user_bc = self.gutils.execute("SELECT * FROM all_user_bc;").fetchall() 
-            
-            ins_qry = '''
-                INSERT INTO outflow_cells (outflow_fid, grid_fid, geom_type, area_factor)
-                SELECT
-                    abc.bc_fid, g.fid, abc.geom_type, CAST(abc.bc_fid AS INT)
-                FROM
-                    grid AS g, all_user_bc AS abc
-                WHERE
-                    abc.type = 'outflow' AND
-                    ST_Intersects(CastAutomagic(g.geom), CastAutomagic(abc.geom));
-                    '''         
-            inserted = self.gutils.execute(ins_qry)
-
-            outflow_cells = self.gutils.execute("SELECT * FROM outflow_cells ORDER BY fid;").fetchall() 
-            # Fix outflow_cells:
-            for oc in outflow_cells:
-                grid = oc[2]
-                geom_type = oc[3]
-                area_factor = oc[4]
-                fid = self.gutils.execute("SELECT fid FROM outflow WHERE geom_type = ? AND bc_fid = ?;", (geom_type, area_factor,)).fetchone()
-                if fid: 
-                    self.gutils.execute("UPDATE outflow_cells SET outflow_fid = ? WHERE geom_type = ? AND area_factor = ?;", (fid[0], geom_type, area_factor))
-                else:
-                    tab_bc_fid = self.gutils.execute("SELECT tab_bc_fid FROM all_schem_bc WHERE grid_fid = ?;", (grid,)).fetchone()
-                    if tab_bc_fid:
-                        self.gutils.execute("UPDATE outflow_cells SET outflow_fid = ? WHERE geom_type = ? AND area_factor = ?;", (tab_bc_fid[0], geom_type, area_factor))
-                    
-                    else:
-                        msg += "\nNo fid for "  + str(grid) 
-
-            if msg:
-                self.uc.show_warn(msg)
-                                
-            QApplication.restoreOverrideCursor()
-            return inserted.rowcount
-            #             self.uc.show_info("Outflows schematized!")
-        except Exception as e:
-            QApplication.restoreOverrideCursor()
-            self.uc.show_error("ERROR 180319.1434: Schematizing of outflows aborted!\n", e)            
-            self.uc.log_info(traceback.format_exc())
-            return 0
-
     def select_outflows_according_to_type(self):
         cell_size = float(self.gutils.get_cont_par("CELLSIZE"))
         no_outflow, time_stage_1,  time_stage_2, border= [], [], [], []
@@ -8,7 +8,9 @@
 # as published by the Free Software Foundation; either version 2
 # of the License, or (at your option) any later version
 
+from qgis.PyQt.QtCore import QSettings
 from ..flo2d_tools.elevation_correctors import GridElevation, ExternalElevation
+from ..flo2d_tools.grid_tools import Delaunay
 from .ui_utils import load_ui
 from qgis.core import QgsWkbTypes, QgsFeatureRequest
 from ..geopackage_utils import GeoPackageUtils
@@ -27,6 +29,7 @@ class GridCorrectionDialog(qtBaseClass, uiDialog):
         self.gutils = GeoPackageUtils(con, iface)
         self.internal_corrector = GridElevation(self.gutils, self.lyrs)
         self.selection_switch()
+        self.setup_numpy_tin()
         self.internal_corrector.setup_layers()
         self.external_corrector = ExternalElevation(self.gutils, self.lyrs)
 
@@ -39,6 +42,7 @@ class GridCorrectionDialog(qtBaseClass, uiDialog):
         self.elev_polygons_chbox.stateChanged.connect(self.polygons_checked)
         self.elev_arf_chbox.stateChanged.connect(self.arf_checked)
         self.internal_selected_chbox.stateChanged.connect(self.selection_switch)
+        self.elev_tin_numpy_chbox.stateChanged.connect(self.numpy_tin_switch)
 
         self.vector_polygon_cbo.currentIndexChanged.connect(self.populate_fields)
         self.vector_polyline_cbo.currentIndexChanged.connect(self.populate_fields)
@@ -59,6 +63,19 @@ class GridCorrectionDialog(qtBaseClass, uiDialog):
         else:
             self.internal_corrector.only_selected = False
 
+    def setup_numpy_tin(self):
+        if Delaunay is None:
+            self.elev_tin_numpy_chbox.setChecked(False)
+            self.elev_tin_numpy_chbox.setDisabled(True)
+            self.elev_tin_numpy_chbox.setToolTip("There is no scipy module installed!")
+        else:
+            self.elev_tin_numpy_chbox.setChecked(QSettings().value("FLO-2D/numpy_tin", False, type=bool))
+        self.internal_corrector.numpy_tin = self.elev_tin_numpy_chbox.isChecked()
+
+    def numpy_tin_switch(self):
+        self.internal_corrector.numpy_tin = self.elev_tin_numpy_chbox.isChecked()
+        QSettings().setValue("FLO-2D/numpy_tin", self.internal_corrector.numpy_tin)
+
     def tin_checked(self):
         if self.elev_tin_chbox.isChecked():
             self.internal_methods[1] = self.tin_method
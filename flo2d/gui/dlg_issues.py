@@ -8,6 +8,7 @@
 # of the License, or (at your option) any later version
 
 import os, time
+import numpy as np
 from qgis.core import *
 from qgis.PyQt.QtCore import Qt, QSettings, QVariant, QModelIndex
 from qgis.core import QgsFeature, QgsGeometry, QgsPointXY
@@ -34,11 +35,21 @@ from ..user_communication import UserCommunication
 from ..gui.dlg_sampling_elev import SamplingElevDialog
 from ..gui.dlg_sampling_buildings_elevations import SamplingBuildingsElevationsDialog
 from ..flo2d_tools.grid_tools import grid_has_empty_elev, get_adjacent_cell_elevation
+from ..flo2d_tools.debug_issues import parse_cells, read_debug_file, read_issues_file
+from ..flo2d_tools.grid_index import cached_grid_index
+from ..flo2d_tools.conflicts import (
+    CONFLICT_RULES,
+    Conflicts,
+    rule_selected,
+    INFLOWS,
+    OUTFLOWS,
+    SD_INLETS,
+    SD_OUTFALLS,
+    PARTIAL_ARF,
+    FULL_ARF,
+)
 from qgis.PyQt.QtGui import QColor
 
-
-# from ..flo2d_tools.conflicts import Conflicts
-
 uiDialog, qtBaseClass = load_ui("errors_2")
 
 
@@ -222,8 +233,6 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
             else:
                 QApplication.setOverrideCursor(Qt.WaitCursor)
                 qApp.processEvents()
-                features = []
-                grid = self.lyrs.data["grid"]["qlyr"]
                 s.setValue("FLO-2D/lastDEBUGDir", debug_file)
                 self.debug_directory = os.path.dirname(debug_file)
 
@@ -233,39 +242,22 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
                 self.errors_cbo.clear()
                 self.errors_cbo.addItem(" ")
 
-                seen = set(self.cells)
-                with open(debug_file, "r") as f1:
-                    for line in f1:
-                        row = line.split(",")
-                        if len(row) >= 3:
-                            cell = row[0].strip()
-                            iCell = int(cell)
-                            if iCell <= 0:
-                                iCell = 1
-                                cell = "1"
-                            if len(grid) >= iCell and iCell > 0:
-
-                                description = ", ".join(row[2:]).strip()
-                                self.errors.append([cell, row[1].strip(), description])
-                                #                                 self.errors.append([cell, row[1].strip(), row[2].strip()])
-                                # Create points for issues layer:
-                                if cell not in seen:
-                                    seen.add(cell)
-                                    self.cells.append(iCell)
-                                    feat = next(grid.getFeatures(QgsFeatureRequest(iCell)))
-                                    x, y = feat.geometry().centroid().asPoint()
-                                    features.append([x, y, iCell, description])  # x, y, cell, description
-                #                                     features.append( [x, y, iCell, row[2].strip()] ) # x, y, cell, description
-
-                shapefile = self.debug_directory + "/DEBUG.shp"
-                name = "DEBUG"
+                errors, cells = read_debug_file(debug_file)
+                qApp.processEvents()
+                # Issues of cells missing in the grid are ignored.
+                xs, ys = cached_grid_index(self.gutils).centroids(cells)
+                in_grid = ~np.isnan(xs)
+                errors = [error for error, keep in zip(errors, in_grid.tolist()) if keep]
+                cells, xs, ys = cells[in_grid], xs[in_grid], ys[in_grid]
+                self.errors += errors
+                # Points of the issues layer are placed on cell centroids, one per cell with its first issue.
+                unique_cells, first = np.unique(cells, return_index=True)
+                self.cells = unique_cells.tolist()
+                features = [[xs[i], ys[i], cell, errors[i][2]] for cell, i in zip(self.cells, first.tolist())]
                 fields = [["cell", "I"], ["description", "S"]]
-                if self.create_points_shapefile(shapefile, name, fields, features):
-                    vlayer = self.iface.addVectorLayer(shapefile, "", "ogr")
+                self.create_points_layer("DEBUG", fields, features)
 
-                self.cells.sort()
-                for cell in self.cells:
-                    self.elements_cbo.addItem(str(cell))
+                self.elements_cbo.addItems([str(cell) for cell in self.cells])
 
                 if self.errors:
                     QApplication.restoreOverrideCursor()
@@ -313,23 +305,11 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
                             QApplication.setOverrideCursor(Qt.WaitCursor)
                             qApp.processEvents()
                             features = []
-                            with open(file, "r") as f:
-                                for _ in range(4):
-                                    next(f)
-                                for row in f:
-                                    values = row.split()
-                                    if values:
-                                        self.errors.append(
-                                            [
-                                                values[0],
-                                                "9001",
-                                                "DEPRESSED_ELEMENTS.OUT : Depressed Element by " + values[3],
-                                            ]
-                                        )
-
-                                        features.append(
-                                            [values[1], values[2], values[0], values[3]]
-                                        )  # x, y, cell, elev
+                            for values in read_issues_file(file, 4):
+                                self.errors.append(
+                                    [values[0], "9001", "DEPRESSED_ELEMENTS.OUT : Depressed Element by " + values[3]]
+                                )
+                                features.append([values[1], values[2], values[0], values[3]])  # x, y, cell, elev
                         except Exception as e:
                             QApplication.restoreOverrideCursor()
                             self.close()
@@ -337,11 +317,8 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
 
                         finally:
                             if features:
-                                shapefile = self.debug_directory + "/Depressed Elements.shp"
-                                name = "Depressed Elements"
                                 fields = [["cell", "I"], ["min_elev", "D"]]
-                                if self.create_points_shapefile(shapefile, name, fields, features):
-                                    vlayer = self.iface.addVectorLayer(shapefile, "", "ogr")
+                                self.create_points_layer("Depressed Elements", fields, features)
                                 QApplication.restoreOverrideCursor()
 
                 if "Channels" in dlg_issues_files.files:
@@ -360,27 +337,13 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
                             QApplication.setOverrideCursor(Qt.WaitCursor)
                             qApp.processEvents()
                             features = []
-                            with open(file, "r") as f:
-                                for _ in range(6):
-                                    next(f)
-                                for row in f:
-                                    values = row.split()
-                                    if values:
-                                        self.errors.append(
-                                            [values[0], "9002", "CHANBANKEL.CHK : Bank - Floodplain = " + values[5]]
-                                        )
-
-                                        features.append(
-                                            [
-                                                values[1],
-                                                values[2],
-                                                values[0],
-                                                values[3],
-                                                values[4],
-                                                values[5],
-                                                values[6],
-                                            ]
-                                        )  # x, y, cell, etc
+                            for values in read_issues_file(file, 6):
+                                self.errors.append(
+                                    [values[0], "9002", "CHANBANKEL.CHK : Bank - Floodplain = " + values[5]]
+                                )
+                                features.append(
+                                    [values[1], values[2], values[0], values[3], values[4], values[5], values[6]]
+                                )  # x, y, cell, etc
 
                         except Exception as e:
                             QApplication.restoreOverrideCursor()
@@ -389,8 +352,6 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
 
                         finally:
                             if features:
-                                shapefile = self.debug_directory + "/Channel Bank Elev Differences.shp"
-                                name = "Channel Bank Elev Differences"
                                 fields = [
                                     ["cell", "I"],
                                     ["bank_elev", "D"],
@@ -398,8 +359,7 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
                                     ["difference", "D"],
                                     ["LB_RB", "S"],
                                 ]
-                                if self.create_points_shapefile(shapefile, name, fields, features):
-                                    vlayer = self.iface.addVectorLayer(shapefile, "", "ogr")
+                                self.create_points_layer("Channel Bank Elev Differences", fields, features)
                                 QApplication.restoreOverrideCursor()
 
                 if "Rim" in dlg_issues_files.files:
@@ -417,25 +377,19 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
                         try:
                             QApplication.setOverrideCursor(Qt.WaitCursor)
                             qApp.processEvents()
-                            grid = self.lyrs.data["grid"]["qlyr"]
                             features = []
-                            with open(file, "r") as f:
-                                for _ in range(1):
-                                    next(f)
-                                for row in f:
-                                    values = row.split()
-                                    if values:
-                                        if values[0] != "GRID":
-                                            self.errors.append(
-                                                [values[0], "9003", "FPRIMELEV.OUT : Floodplain - Rim = " + values[3]]
-                                            )
-                                            cell = int(values[0])
-                                            feat = next(grid.getFeatures(QgsFeatureRequest(cell)))
-                                            x, y = feat.geometry().centroid().asPoint()
-
-                                            features.append(
-                                                [x, y, values[0], values[1], values[2], values[3], values[4]]
-                                            )  # x, y, cell, etc
+                            rows = [values for values in read_issues_file(file, 1) if values[0] != "GRID"]
+                            cells, valid = parse_cells([values[0] for values in rows])
+                            xs, ys = cached_grid_index(self.gutils).centroids(cells)
+                            for values, x, y, is_valid in zip(rows, xs.tolist(), ys.tolist(), valid.tolist()):
+                                if not is_valid or np.isnan(x):
+                                    continue
+                                self.errors.append(
+                                    [values[0], "9003", "FPRIMELEV.OUT : Floodplain - Rim = " + values[3]]
+                                )
+                                features.append(
+                                    [x, y, values[0], values[1], values[2], values[3], values[4]]
+                                )  # x, y, cell, etc
 
                         except Exception as e:
                             QApplication.restoreOverrideCursor()
@@ -444,8 +398,6 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
 
                         finally:
                             if features:
-                                shapefile = self.debug_directory + "/Flooplain Rim Differences.shp"
-                                name = "Flooplain Rim Differences"
                                 fields = [
                                     ["cell", "I"],
                                     ["floodplain_elev", "D"],
@@ -453,8 +405,7 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
                                     ["difference", "D"],
                                     ["new_floodplain_elev", "D"],
                                 ]
-                                if self.create_points_shapefile(shapefile, name, fields, features):
-                                    vlayer = self.iface.addVectorLayer(shapefile, "", "ogr")
+                                self.create_points_layer("Flooplain Rim Differences", fields, features)
                                 QApplication.restoreOverrideCursor()
 
     def populate_elements_cbo(self):
@@ -473,15 +424,8 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
     def populate_errors_cbo(self):
         #         QApplication.setOverrideCursor(Qt.WaitCursor)
 
-        singleErrors = []
-        for x in self.errors:
-            err = int(x[1].strip())
-            if err not in singleErrors:
-                singleErrors.append(err)
-
-        singleErrors.sort()
-        for error in singleErrors:
-            self.errors_cbo.addItem(str(error))
+        singleErrors = sorted({int(x[1].strip()) for x in self.errors})
+        self.errors_cbo.addItems([str(error) for error in singleErrors])
 
     #         self.errors_cbo.clear()
     #         self.errors_cbo.addItem(" ")
@@ -723,50 +667,41 @@ class IssuesFromDEBUGDialog(qtBaseClass, uiDialog):
     def update_extent(self):
         self.ext = self.iface.mapCanvas().extent()
 
-    def create_points_shapefile(self, shapefile, name, fields, features):
+    def create_points_layer(self, name, fields, features):
+        """
+        Creating in-memory points layer of the issues. All features are added in one batch.
+        """
         try:
             lyr = QgsProject.instance().mapLayersByName(name)
-
             if lyr:
                 QgsProject.instance().removeMapLayers([lyr[0].id()])
 
-            # define fields for feature attributes. A QgsFields object is needed
-            f = QgsFields()
-            for field in fields:
-                f.append(
+            crs = self.iface.mapCanvas().mapSettings().destinationCrs()
+            vlayer = QgsVectorLayer("Point", name, "memory")
+            vlayer.setCrs(crs)
+            provider = vlayer.dataProvider()
+            provider.addAttributes(
+                [
                     QgsField(
                         field[0],
                         QVariant.Int if field[1] == "I" else QVariant.Double if field[1] == "D" else QVariant.String,
                     )
-                )
-
-            mapCanvas = self.iface.mapCanvas()
-            my_crs = mapCanvas.mapSettings().destinationCrs()
-            QgsVectorFileWriter.deleteShapeFile(shapefile)
-            writer = QgsVectorFileWriter(shapefile, "system", f, QgsWkbTypes.Point, my_crs, "ESRI Shapefile")
-            if writer.hasError() != QgsVectorFileWriter.NoError:
-                self.uc.bar_error("ERROR 201919.0451: Error when creating shapefile: " + shapefile)
-
-            # add features:
+                    for field in fields
+                ]
+            )
+            vlayer.updateFields()
+
+            casts = [int if field[1] == "I" else float if field[1] == "D" else str for field in fields]
+            qgs_fields = vlayer.fields()
+            qgs_features = []
             for feat in features:
-                attr = []
-                fet = QgsFeature()
+                fet = QgsFeature(qgs_fields)
                 fet.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(float(feat[0]), float(feat[1]))))
-                non_coord_feats = []
-                for i in range(2, len(fields) + 2):
-                    non_coord_feats.append(
-                        int(feat[i])
-                        if fields[i - 2][1] == "I"
-                        else float(feat[i])
-                        if fields[i - 2][1] == "D"
-                        else feat[i]
-                    )
-
-                fet.setAttributes(non_coord_feats)
-                writer.addFeature(fet)
-
-            # delete the writer to flush features to disk
-            del writer
+                fet.setAttributes([cast(value) for cast, value in zip(casts, feat[2:])])
+                qgs_features.append(fet)
+            provider.addFeatures(qgs_features)
+            vlayer.updateExtents()
+            QgsProject.instance().addMapLayer(vlayer)
             return True
 
         except Exception as e:
@@ -898,678 +833,13 @@ class CurrentConflictsDialog(qtBaseClass, uiDialog):
             self.gutils = GeoPackageUtils(self.con, self.iface)
 
     def populate_issues(self):
-
-        # Inflow conflicts:
-
-        self.conflict4(
-            "Inflows", "inflow_cells", "grid_fid", "Inflows", "inflow_cells", "grid_fid", "2 or more inflows"
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Inflow and outflow in same cell",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Inflow and Reduction Factors in same cell (check partial ARF, full ARF, or WRF)",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Inflow and Hyd. Struct in-cell in same cell",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Inflow and Hyd. Struct out-cell in same cell",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Inflow and Channel Left Bank in same cell",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Inflow and Channel Right Bank in same cell",
-        )
-
-        self.conflict4(
-            "Inflows", "inflow_cells", "grid_fid", "Levees", "levee_data", "grid_fid", "Inflow and levee in same cell"
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Inflow and Multiple Channels in same cell",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Inflow and Storm Drain Inlet in same cell",
-        )
-
-        self.conflict4(
-            "Inflows",
-            "inflow_cells",
-            "grid_fid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Inflow and Storm Drain Outfall in same cell",
-        )
-
-        # Outflow conflicts:
-        self.conflict4(
-            "Outflows", "outflow_cells", "grid_fid", "Outflows", "outflow_cells", "grid_fid", "2 or more outflows"
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Outflow and Reduction Factors in same cell (check partial ARF, full ARF, or WRF)",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Outflow and Hyd. Struct in-cell in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Outflow and Hyd. Struct out-cell in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Outflow and Channel Left Bank in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Outflow and Channel Right Bank in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Outflow and levee in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Outflow and Multiple Channels in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Outflow and Storm Drain Inlet in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Outflow and Storm Drain Outfall in same cell",
-        )
-
-        self.conflict4(
-            "Outflows",
-            "outflow_cells",
-            "grid_fid",
-            "Streets",
-            "street_seg",
-            "igridn",
-            "Outflow and Street in same cell",
-        )
-
-        # Reduction Factors conflicts:
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Duplicate Reduction Factors in same cell (check partial ARF, full ARF, or WRF)",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Reduction Factors and Hyd. Struct in-cell in same cell (not recomended)",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Reduction Factors and Hyd. Struc out-cell in same cell (not recomended)",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Reduction Factors and Channel Left Bank in same cell",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Reduction Factors and Channel Right Bank in same cell",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Reduction Factors and Levees in same cell (not recomended)",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Reduction Factors and Multiple Channels in same cell (not recomended)",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Reduction Factors and Storm Drain Inlet in same cell (not recomended)",
-        )
-
-        self.conflict4(
-            "Reduction Factors",
-            "blocked_cells",
-            "grid_fid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Reduction Factors and Storm Drain Outfall in same cell (not recomended)",
-        )
-
-        # Full ARF conflicts:
-        # Partial ARF conflicts:
-        # WRF conflicts:
-
-        # Hydraulic Structures conflicts:
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "More than one Hyd. Struct in-cell in same element",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "More than one Hyd. Struc out-cell in same element",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Hyd. Struct in-cell and Hyd. Struct out-cell in same element",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Hyd. Struc in-cell and Channel Right Bank in same cell",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Hyd. Struc out-cell and Channel Right Bank in same cell",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Hyd. Struc in-cell and Levee in same element (not recomended)",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Hyd. Struct out-cell and Levee in same element (not recomended)",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Hyd. Struc in-cell and Multiple Channel in same cell",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Hyd. Struct out-cell and Multiple Channel in same cell",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Hyd. Struc in-cell and Storm Drain Inlet in same cell",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Hyd. Struct out-cell and Storm Drain Outlet in same cell (not recomended)",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "inflonod",
-            "Streets",
-            "street_seg",
-            "igridn",
-            "Hyd. Struc in-cell and Street in same cell",
-        )
-
-        self.conflict4(
-            "Hydr. Structures",
-            "struct",
-            "outflonod",
-            "Streets",
-            "street_seg",
-            "igridn",
-            "Hyd. Struct out-cell and Streett in same cell",
-        )
-
-        # Channels conflicts:
-
-        self.conflict4(
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "2 or more Channel Left Banks in same cell",
-        )
-
-        self.conflict4(
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Channel Left Bank and Channel Right Bank in same cell",
-        )
-
-        # TODO: left bank and right bank are in same attribute, this is wrong!!
-        self.conflict4(
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "2 or more Channel Right Banks in same cell",
-        )
-
-        self.conflict4(
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Channel Left Bank and Levee in same cell",
-        )
-
-        self.conflict4(
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Channel Right Bank and Levee in same cell",
-        )
-
-        self.conflict4(
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Channel Left Bank and Multiple Channel in same cell",
-        )
-
-        self.conflict4(
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Channel Right Bank and Multiple Channel same cell",
-        )
-
-        self.conflict4(
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Channel Right Bank and Storm Drain Inlet same cell",
-        )
-
-        self.conflict4(
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Channel Right Bank and Storm Drain Outfall same cell",
-        )
-
-        self.conflict4(
-            "Channels (Left Bank)",
-            "chan_elems",
-            "fid",
-            "Streets",
-            "street_seg",
-            "igridn",
-            "Channel Left Bank and Street in same cell",
-        )
-
-        self.conflict4(
-            "Channels (Right Bank)",
-            "chan_elems",
-            "rbankgrid",
-            "Streets",
-            "street_seg",
-            "igridn",
-            "Channel Right Bank and Street in same cell",
-        )
-
-        # Right bank Channels conflicts:
-
-        # Levee conflicts:
-
-        self.conflict4(
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "2 or more Levees in same cell (review)",
-        )
-
-        self.conflict4(
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Levee and Multiple Channels in same cell",
-        )
-
-        self.conflict4(
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Levee and Storm Drain Inlet in same cell",
-        )
-
-        self.conflict4(
-            "Levees",
-            "levee_data",
-            "grid_fid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Levee and Storm Drain Outfall in same cell",
-        )
-
-        # Multiple Channels conflicts:
-
-        self.conflict4(
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "2 or more Multiple Channels in same cell",
-        )
-
-        self.conflict4(
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Multiple Channels and Storm Drain Inlet in same cell",
-        )
-
-        self.conflict4(
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Multiple Channels and Storm Drain Outfall in same cell",
-        )
-
-        self.conflict4(
-            "Mult. Channels",
-            "mult_cells",
-            "grid_fid",
-            "Streets",
-            "street_seg",
-            "igridn",
-            "Multiple Channels and Street in same cell",
-        )
-
-        # Storm Drain inlets conflicts:
-
-        self.conflict4(
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "2 or more Storm Drain Inlets in same cell",
-        )
-
-        self.conflict4(
-            "Storm Drain Inlets",
-            "swmmflo",
-            "swmm_jt",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Storm Drain Inlet and Storm Drain Outfall in same cell",
-        )
-
-        # Storm Drain outfalls conflicts:
-
-        self.conflict4(
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "Storm Drain Outfalls",
-            "swmmoutf",
-            "grid_fid",
-            "2 or more Storm Drain Outfalls in same cell",
-        )
-
-        # Street conflicts:
-
-        self.conflict4(
-            "Streets", "street_seg", "igridn", "Streets", "street_seg", "igridn", "2 or more Streets in same cell"
-        )
+        rules = [rule for rule in CONFLICT_RULES if rule_selected(rule[0][0], rule[1][0], self.issue1, self.issue2)]
+        start_time = time.time()
+        conflicts = Conflicts(self.gutils)
+        self.errors += conflicts.check(rules)
+        for description, seconds, n_cells in conflicts.timings:
+            self.uc.log_info('{0:.3f} seconds => "{1}" ({2} cells)'.format(seconds, description, n_cells))
+        self.uc.log_info("{0:.3f} seconds => {1} conflict rules checked".format(time.time() - start_time, len(rules)))
 
         self.setWindowTitle("Errors and Warnings for: " + self.issue1 + " with " + self.issue2)
 
@@ -1809,324 +1079,20 @@ class CurrentConflictsDialog(qtBaseClass, uiDialog):
     def copy_to_clipboard(self):
         copy_tablewidget_selection(self.description_tblw)
 
-    def conflict(self, comp1, table1, cell_1, comp2, table2, cell_2, description):
-        cells1 = []
-        cells2 = []
-        repeated = []
-        sqr1 = "SELECT {0} FROM {1}".format(cell_1, table1)
-        sqr2 = "SELECT {0} FROM {1}".format(cell_2, table2)
-        rows1 = self.gutils.execute(sqr1).fetchall()
-        rows2 = self.gutils.execute(sqr2).fetchall()
-        if not rows1 or not rows2:
-            pass
-        else:
-            for row in rows1:
-                cells1.append(row)
-            for row in rows2:
-                cells2.append(row)
-            size1 = len(cells1)
-            size2 = len(cells2)
-
-            if comp1 == comp2:
-                for i in range(size1):
-                    k = i + 1
-                    for j in range(k, size1):
-                        if cells1[i][0] == cells1[j][0] and cells1[i][0] not in repeated:
-                            repeated.append(cells1[i][0])
-                            break
-            else:
-                for i in range(size1):
-                    for j in range(size2):
-                        if cells1[i][0] == cells2[j][0] and cells1[i][0] not in repeated:
-                            repeated.append(cells1[i][0])
-                            break
-        if repeated:
-            for r in repeated:
-                self.errors.append([str(r), comp1, comp2, description])
-
-    def conflict2(self, comp1, table1, cell_1, comp2, table2, cell_2, description):
-
-        repeated = []
-        rows1 = []
-        rows2 = []
-
-        sqr1 = "SELECT {0} FROM {1} ORDER BY {0} LIMIT {2}".format(cell_1, table1, self.numErrors.text())
-        sqr2 = "SELECT {0} FROM {1} ORDER BY {0} LIMIT {2}".format(cell_2, table2, self.numErrors.text())
-
-        rows1 = self.gutils.execute(sqr1).fetchall()
-        rows2 = self.gutils.execute(sqr2).fetchall()
-
-        size1 = len(rows1)
-        size2 = len(rows2)
-
-        if not rows1 or not rows2:
-            pass
-        else:
-            if comp1 == comp2:
-                for i in range(size1 - 2):
-                    if rows1[i][0] == rows1[i + 1][0]:
-                        if rows1[i][0] not in repeated:
-                            repeated.append(rows1[i][0])
-            else:
-                try:
-                    k = 0
-                    for i in range(size1):
-                        while True:
-                            if rows2[k][0] < rows1[i][0]:
-                                if k < size2 - 1:
-                                    k += 1
-                                    continue
-                                else:
-                                    k = 0
-                                    break
-                            elif rows2[k][0] > rows1[i][0]:
-                                break
-                            elif rows1[i][0] not in repeated:
-                                repeated.append(rows1[i][0])
-                            if k < size2 - 1:
-                                k += 1
-                            else:
-                                k = 0
-                                break
-
-                except ValueError:
-                    pass
-
-        if repeated:
-            for r in repeated:
-                self.errors.append([str(r), comp1, comp2, description])
-
-    def conflict3(self, comp1, rows1, comp2, rows2, description):
-
-        repeated = []
-
-        size1 = len(rows1)
-        size2 = len(rows2)
-
-        if not rows1 or not rows2:
-            return 0
-        else:
-            if comp1 == comp2:
-                for i in range(size1 - 2):
-                    if rows1[i][0] == rows1[i + 1][0]:
-                        if rows1[i][0] not in repeated:
-                            repeated.append(rows1[i][0])
-            else:
-                try:
-                    k = 0
-                    for i in range(size1):
-                        while True:
-                            if rows2[k][0] < rows1[i][0]:
-                                if k < size2 - 1:
-                                    k += 1
-                                    continue
-                                else:
-                                    k = 0
-                                    break
-                            elif rows2[k][0] > rows1[i][0]:
-                                break
-                            elif rows1[i][0] not in repeated:
-                                repeated.append(rows1[i][0])
-                            if k < size2 - 1:
-                                k += 1
-                            else:
-                                k = 0
-                                break
-
-                except ValueError:
-                    pass
-
-        if repeated:
-            for r in repeated:
-                self.errors.append([str(r), comp1, comp2, description])
-        return len(repeated)
-
-    def conflict4(self, comp1, table1, cell_1, comp2, table2, cell_2, description):
-
-        cond1 = self.issue1 == "All" and self.issue2 == "All"
-        cond2 = self.issue1 == "All" and self.issue2 == ""
-        cond3 = self.issue1 == "" and self.issue2 == "All"
-        cond4 = self.issue1 == "All" and (comp1 == self.issue2 or comp2 == self.issue2)
-        cond5 = self.issue2 == "All" and (comp1 == self.issue1 or comp2 == self.issue1)
-        cond6 = (comp1 == self.issue1 and comp2 in self.issue2) or (comp2 == self.issue1 and comp1 in self.issue2)
-
-        if cond1 or cond2 or cond3 or cond4 or cond5 or cond6:
-            repeated = []
-
-            if table1 == table2 and cell_1 == cell_2:
-                sql = """SELECT {0}, COUNT(*) 
-                        FROM {1} 
-                        GROUP BY {0}
-                        HAVING COUNT(*) > 1 ORDER BY {0}
-                    """.format(
-                    cell_1, table1
-                )
-
-            else:
-                sql = """SELECT {0} FROM {1} 
-                WHERE {0} IN 
-                (
-                    SELECT {0}
-                    FROM {1}
-                    INTERSECT
-                    SELECT {2}
-                    FROM {3}
-                ) ORDER BY {0}""".format(
-                    cell_1, table1, cell_2, table2
-                )
-
-            rows = self.gutils.execute(sql).fetchall()
-
-            if not rows:
-                pass
-            else:
-                size = len(rows)
-                for i in range(size):
-                    if rows[i][0] not in repeated:
-                        repeated.append(rows[i][0])
-            if repeated:
-                for r in repeated:
-                    self.errors.append([str(r), comp1, comp2, description])
-
     def conflict_inflow_partialARF(self):
-        in_cells = []
-        ARF_cells = []
-        repeated = []
-        inf = "SELECT grid_fid FROM inflow_cells"
-        ARF = "SELECT grid_fid, arf FROM blocked_cells"
-        in_rows = self.gutils.execute(inf).fetchall()
-        ARF_rows = self.gutils.execute(ARF).fetchall()
-        if not in_rows or not ARF_rows:
-            return repeated
-        else:
-            for row in in_rows:
-                in_cells.append(row)
-            for row in ARF_rows:
-                ARF_cells.append(row)
-            in_size = len(in_cells)
-            ARF_size = len(ARF_cells)
-            for i in range(in_size):
-                for j in range(ARF_size):
-                    if (
-                        in_cells[i][0] == ARF_cells[j][0]
-                        and float(ARF_cells[j][1]) < 1.0
-                        and in_cells[i][0] not in repeated
-                    ):
-                        repeated.append(in_cells[i][0])
-                        break
-            return repeated
+        return Conflicts(self.gutils).shared_cells(INFLOWS, PARTIAL_ARF).tolist()
 
     def conflict_outflow_partialARF(self):
-        out_cells = []
-        ARF_cells = []
-        repeated = []
-        outf = "SELECT grid_fid FROM outflow_cells"
-        ARF = "SELECT grid_fid, arf FROM blocked_cells"
-        out_rows = self.gutils.execute(outf).fetchall()
-        ARF_rows = self.gutils.execute(ARF).fetchall()
-        if not out_rows or not ARF_rows:
-            return repeated
-        else:
-            for row in out_rows:
-                out_cells.append(row)
-            for row in ARF_rows:
-                ARF_cells.append(row)
-            in_size = len(out_cells)
-            ARF_size = len(ARF_cells)
-            for i in range(in_size):
-                for j in range(ARF_size):
-                    if (
-                        out_cells[i][0] == ARF_cells[j][0]
-                        and float(ARF_cells[j][1]) < 1.0
-                        and out_cells[i][0] not in repeated
-                    ):
-                        repeated.append(out_cells[i][0])
-                        break
-            return repeated
+        return Conflicts(self.gutils).shared_cells(OUTFLOWS, PARTIAL_ARF).tolist()
 
     def conflict_outfall_partialARF(self):
-        out_cells = []
-        ARF_cells = []
-        repeated = []
-        outf = "SELECT grid_fid FROM swmmoutf"
-        ARF = "SELECT grid_fid, arf FROM blocked_cells"
-        out_rows = self.gutils.execute(outf).fetchall()
-        ARF_rows = self.gutils.execute(ARF).fetchall()
-        if not out_rows or not ARF_rows:
-            return repeated
-        else:
-            for row in out_rows:
-                out_cells.append(row)
-            for row in ARF_rows:
-                ARF_cells.append(row)
-            in_size = len(out_cells)
-            ARF_size = len(ARF_cells)
-            for i in range(in_size):
-                for j in range(ARF_size):
-                    if (
-                        out_cells[i][0] == ARF_cells[j][0]
-                        and float(ARF_cells[j][1]) < 1.0
-                        and out_cells[i][0] not in repeated
-                    ):
-                        repeated.append(out_cells[i][0])
-                        break
-            return repeated
+        return Conflicts(self.gutils).shared_cells(SD_OUTFALLS, PARTIAL_ARF).tolist()
 
     def conflict_inlet_partialARF(self):
-        out_cells = []
-        ARF_cells = []
-        repeated = []
-        outf = "SELECT swmm_jt FROM swmmflo"
-        ARF = "SELECT grid_fid, arf FROM blocked_cells"
-        out_rows = self.gutils.execute(outf).fetchall()
-        ARF_rows = self.gutils.execute(ARF).fetchall()
-        if not out_rows or not ARF_rows:
-            return repeated
-        else:
-            for row in out_rows:
-                out_cells.append(row)
-            for row in ARF_rows:
-                ARF_cells.append(row)
-            in_size = len(out_cells)
-            ARF_size = len(ARF_cells)
-            for i in range(in_size):
-                for j in range(ARF_size):
-                    if (
-                        out_cells[i][0] == ARF_cells[j][0]
-                        and float(ARF_cells[j][1]) < 1.0
-                        and out_cells[i][0] not in repeated
-                    ):
-                        repeated.append(out_cells[i][0])
-                        break
-            return repeated
+        return Conflicts(self.gutils).shared_cells(SD_INLETS, PARTIAL_ARF).tolist()
 
     def conflict_outflow_fullARF(self):
-        out_cells = []
-        ARF_cells = []
-        repeated = []
-        outf = "SELECT grid_fid FROM outflow_cells"
-        ARF = "SELECT grid_fid, arf FROM blocked_cells"
-        out_rows = self.gutils.execute(outf).fetchall()
-        ARF_rows = self.gutils.execute(ARF).fetchall()
-        if not out_rows or not ARF_rows:
-            return repeated
-        else:
-            for row in out_rows:
-                out_cells.append(row)
-            for row in ARF_rows:
-                ARF_cells.append(row)
-            in_size = len(out_cells)
-            ARF_size = len(ARF_cells)
-            for i in range(in_size):
-                for j in range(ARF_size):
-                    if (
-                        out_cells[i][0] == ARF_cells[j][0]
-                        and float(ARF_cells[j][1]) == 1.0
-                        and out_cells[i][0] not in repeated
-                    ):
-                        repeated.append(out_cells[i][0])
-                        break
-            return repeated
+        return Conflicts(self.gutils).shared_cells(OUTFLOWS, FULL_ARF).tolist()
 
 
 uiDialog, qtBaseClass = load_ui("levee_crests")
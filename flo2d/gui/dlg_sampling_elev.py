@@ -180,7 +180,7 @@ class SamplingElevDialog(qtBaseClass, uiDialog):
             self.fill_nodata()
         else:
             pass
-        sampler = raster2grid(self.grid, self.out_raster)
+        sampler = raster2grid(self.grid, self.out_raster, gutils=self.gutils)
         
         # qryIndex = """CREATE INDEX if not exists grid_FIDTemp ON grid (fid);"""
         # self.con.execute(qryIndex)
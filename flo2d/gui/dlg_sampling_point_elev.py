@@ -296,14 +296,14 @@ class SamplingPointElevDialog(qtBaseClass, uiDialog):
                                          remove_nodata = self.fillNoDataChBox.isChecked())
             # Process the XYZ point file
             if self.algCbo.currentText() == 'Average GDS':
-                # GDS Average Approach
-                self.log_message('Dashboard address: http://127.0.0.1:8787/status')
-                self.log_message('Different port number may be used if port 8787 is busy')
+                # GDS Average Approach (dask is only used when its dashboard is requested)
                 nproc = self.nproc_slider.value()
                 nthread = self.nthread_slider.value()
                 open_dashboard = False
                 if self.dashboard_cbox.isChecked():
                     open_dashboard = True
+                    self.log_message('Dashboard address: http://127.0.0.1:8787/status')
+                    self.log_message('Different port number may be used if port 8787 is busy')
                 nodata = None
                 if self.fillNoDataChBox.isChecked():
                     nodata = profile['nodata']    
@@ -314,7 +314,8 @@ class SamplingPointElevDialog(qtBaseClass, uiDialog):
                                                                       open_dashboard = open_dashboard,
                                                                       procs = nproc,
                                                                       threads = nthread,
-                                                                      nodata = nodata
+                                                                      nodata = nodata,
+                                                                      in_process = not open_dashboard
                                                                       )
                 if raster_outpath is None:
                     self.log_message('failed')
@@ -334,7 +335,7 @@ class SamplingPointElevDialog(qtBaseClass, uiDialog):
             else:
                 pass
             self.log_message('>>> Sampling Raster-to-Grid')
-            sampler = raster2grid(self.grid, raster_outpath)
+            sampler = raster2grid(self.grid, raster_outpath, gutils=self.gutils)
             
             qryIndex = """CREATE INDEX if not exists grid_FIDTemp ON grid (fid);"""
             self.con.execute(qryIndex)
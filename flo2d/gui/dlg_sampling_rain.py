@@ -159,7 +159,7 @@ class SamplingRainDialog(qtBaseClass, uiDialog):
             self.fill_nodata()
         else:
             pass
-        sampler = raster2grid(self.grid, self.out_raster)
+        sampler = raster2grid(self.grid, self.out_raster, gutils=self.gutils)
         qry = """INSERT INTO rain_arf_cells (arf, grid_fid) VALUES (?,?);"""
         self.con.executemany(qry, sampler)
         self.con.commit()
@@ -29,7 +29,7 @@ from qgis.core import (
         QgsMarkerSymbol
     )
 from qgis.PyQt.QtCore import QSettings, Qt, QVariant, QObject, pyqtSignal
-from qgis.PyQt.QtWidgets import QFileDialog, QApplication, QProgressBar, qApp, QMessageBox,  QPushButton, QLabel, QWidget
+from qgis.PyQt.QtWidgets import QFileDialog, QApplication, qApp, QMessageBox,  QPushButton, QWidget
 from plugins.processing.tools.vector import values
 from qgis.PyQt import  QtCore, QtGui
 
@@ -59,7 +59,9 @@ from ..flo2d_tools.grid_tools import (
         cell_elevation,
         ZonalStatistics
     )
+from ..flo2d_tools.lidar_binning import LidarLattice, bin_lidar_files
 from pickle import TRUE
+import numpy as np
 # from flo2d.__init__ import classFactory
 # from ..flo2d import xxx
 
@@ -140,24 +142,11 @@ class SamplingXYZDialog(qtBaseClass, uiDialog):
             read_error = "Error reading files:\n\n"
             outside_grid, inside_grid = 0, 0
    
-            gid_indx = {}
-            cells = self.gutils.execute("SELECT fid, col, row FROM grid").fetchall()
-            for cell in cells:
-                    gid_indx[cell[1], cell[2]] = [cell[0], 0.0, 0]
+            lattice = LidarLattice.from_grid(self.gutils, self.xMinimum, self.yMinimum, self.cell_size)
 
             start_time = time.time()
 
-            statBar = self.iface.mainWindow().statusBar()
-            statusLabel = QLabel()
-            statBar.addWidget(statusLabel,5)   
-            advanceBar = QProgressBar()
-            advanceBar.setStyleSheet("QProgressBar::chunk { background-color: lightskyblue}")
-            advanceBar.setAlignment(Qt.AlignCenter | Qt.AlignVCenter) 
-            advanceBar.setMinimum(0)
-            statBar.addWidget(advanceBar,2) 
-
             size = 0
-            lines = 0
             for file in lidar_files: 
                 file_size = os.path.getsize(file)
                 with open(file, "r") as f:
@@ -167,81 +156,17 @@ class SamplingXYZDialog(qtBaseClass, uiDialog):
                 size += file_size / line_size
 
             progress = self.uc.progress_bar2("Reading " + "{:,}".format(int(size)) + " lines from " + str(len(lidar_files)) + " files...", 0, len(lidar_files), 0)
-            step = 50000   
-            for i, file in enumerate(lidar_files,1):
-            
-                progress.setValue(i)
-                n_commas =  0
-                n_spaces = 0             
- 
-                # See if comma or space delimited:
-                with open(file, "r") as f:
-                    while True:    
-                        line = f.readline()
-                        line = line.replace('\t', '') 
-                        if line.strip() != "": 
-                            n_commas = line.count(",")
-                            if n_commas == 0:
-                                n_spaces = len(line.split())
-                            break
 
-                if n_commas != 0 or n_spaces != 0:
-                    # Read file: 
-                    with open(file, "r") as f1:
-                        try:
-                            lines = f1.readlines()
-                            n_lines = len(lines)     
-                            statusLabel.setText('Reading  ' +  "{:,}".format(n_lines) + '  lines from ' +  '<FONT COLOR=blue>' + os.path.basename(file) + '</FONT>')     
-                            advanceBar.setMaximum(n_lines)
-                            
-                            step = int(n_lines/ 20)
+            def files_done(n_files):
+                progress.setValue(n_files)
+                qApp.processEvents()
 
-                            if n_lines > step:
-                                advanceBar.setValue(int(step/2)) 
-                                # self.iface.mainWindow().repaint()   
-                                       
-                            for i, line in enumerate(lines, 1): 
-                            
-                                if (int(i%step) == 0):                            
-                                    advanceBar.setValue(i) 
-                                    qApp.processEvents()
-                                
-                                line = line.replace('\t', '')                            
-                                if n_commas == 0: # No commas, values separated by spaces.
-                                    values = line.split()   
-                                    n_values = len(values)
-                                    if n_values == 3:
-                                        xpp, ypp, zpp  = values
-                                    elif n_values == 4:
-                                        xpp, ypp, zpp, dummy  = values  
-                                    elif n_values == 5:
-                                        dummy1, xpp, ypp, zpp, dummy2  = values  
-                                    else:
-                                        break          
-                                elif n_commas == 2:  # 3 columns.
-                                    xpp, ypp, zpp  = line.split(",") 
-                                elif n_commas == 3:  # 4 columns.
-                                    xpp, ypp, zpp, dummy  = line.split(",") 
-                                elif n_commas == 4:  # 5 columns.
-                                    dummy1, xpp, ypp, zpp, dummy2  = line.split(",")  
-                                else:
-                                    break  
-                                                               
-                                col = int((float(xpp) - self.xMinimum)/self.cell_size) + 2
-                                row = int((float(ypp) - self.yMinimum)/self.cell_size) + 2                                    
-                                if (col, row) in gid_indx:
-                                    gid_indx[col, row][1] += float(zpp)
-                                    gid_indx[col, row][2] += 1
-                                    inside_grid += 1   
-                                else:
-                                    outside_grid += 1    
-                                    
-                        except ValueError:
-                            read_error += os.path.basename(file) + " at line " + str(i) + "\n\n" 
+            bins = bin_lidar_files(lattice, lidar_files, progress=files_done)
+            inside_grid, outside_grid = bins.inside, bins.outside
+            for file_name, line_number in bins.errors:
+                read_error += file_name + " at line " + str(line_number) + "\n\n"
 
             self.uc.clear_bar_messages()    
-            statBar.removeWidget(statusLabel)
-            statBar.removeWidget(advanceBar)    
             qApp.processEvents()   
             self.uc.bar_info("Updating grid elevations...")   
                                                            
@@ -254,12 +179,12 @@ class SamplingXYZDialog(qtBaseClass, uiDialog):
             
             if inside_grid > 0:
                 qry = "UPDATE grid SET elevation = ? WHERE fid = ?;"
-                for gi in gid_indx.items():
-                    if gi[1][2] != 0:
-                        elevation = round(gi[1][1]/gi[1][2],4)
-                        cell_elev.append((elevation, gi[1][0]))       
-                    else:
-                        nope.append((gi[1][0],gi[0][0], gi[0][1]))   # element, col, row
+                assigned = bins.count > 0
+                elevations = np.round(bins.mean()[assigned], 4)
+                cell_elev = list(zip(elevations.tolist(), lattice.fids[assigned].tolist()))
+                empty = ~assigned
+                # element, col, row
+                nope = list(zip(lattice.fids[empty].tolist(), lattice.cols[empty].tolist(), lattice.rows[empty].tolist()))
                 self.gutils.execute_many(qry, cell_elev)                                
 
             self.uc.clear_bar_messages()       
@@ -383,15 +308,9 @@ class SamplingXYZDialog(qtBaseClass, uiDialog):
                             zs = ZonalStatistics(self.gutils, self.grid, vl, zfield, calc_type, search_distance)
                             points_elevation = zs.points_elevation()
                             zs.set_elevation(points_elevation)
-                            cmd, out = zs.rasterize_grid()
-                            self.uc.log_info(cmd)
-                            self.uc.log_info(out)
-                            cmd, out = zs.fill_nodata()
-                            self.uc.log_info(cmd)
-                            self.uc.log_info(out)
-                            null_elevation = zs.null_elevation()
-                            zs.set_elevation(null_elevation)
-                            zs.remove_rasters()
+                            for cmd, out in zs.fill_elevation_gaps():
+                                self.uc.log_info(cmd)
+                                self.uc.log_info(out)
 
                             self.gutils.execute("UPDATE grid SET elevation = -9999 WHERE elevation IS NULL;")
                             elevs = [x[0] for x in self.gutils.execute("SELECT elevation FROM grid").fetchall()]
@@ -556,6 +475,7 @@ class LIDARWorker(QObject) :
         self.uc = UserCommunication(iface, "FLO-2D")
         self.con = None
         self.gutils = None        
+        self.bins = None
         
         self.setup_connection()
         
@@ -569,67 +489,22 @@ class LIDARWorker(QObject) :
             self.gutils = GeoPackageUtils(self.con, self.iface)
             
     def run(self):
-        try:            
-            THREAD_progress_count = 0 
-            n_files = len(self.lidar_files)             
-            for i, file in enumerate(self.lidar_files,1): 
+        try:
+            n_files = len(self.lidar_files)
+            cell_size = float(self.gutils.get_cont_par("CELLSIZE"))
+            grid_extent = self.lyrs.data["grid"]["qlyr"].extent()
+            lattice = LidarLattice.from_grid(self.gutils, grid_extent.xMinimum(), grid_extent.yMinimum(), cell_size)
+
+            def files_done(n_done):
                 if self.THREAD_killed is True:
-                    # kill request received, exit loop early
-                    break   
-                time.sleep(0.2) # simulate a more time consuming task
-                # increment progrss   
-                THREAD_progress_count += 1
-                self.THREAD_progrss.emit(THREAD_progress_count * 100 / n_files)
-
-                n_commas =  0
-                n_spaces = 0             
-                
-#                 err0, err1 = self.check_LIDAR_file(file)
-#                 if err0 == "" and err1 == "" :
-  
-                # See if comma or space delimited:
-                with open(file, "r") as f:
-                    while True:    
-                        line = f.readline()
-                        line = line.replace('\t', '') 
-                        if line.strip() != "": 
-                            n_commas = line.count(",")
-                            if n_commas == 0:
-                                n_spaces = len(line.split())
-                            break
-                            
-                if n_commas != 0 or n_spaces != 0:
-                    # Read file: 
-                    
-                    with open(file, "r") as f1:
-                        try:
-                            k = 0
-                            for line in f1: 
-                                line = line.replace('\t', '')                            
-                                if n_commas == 0: # No commas, values separated by spaces.
-                                    values = line.split()   
-                                    n_values = len(values)
-                                    if n_values == 3:
-                                        xpp, ypp, zpp  = values
-                                    elif n_values == 4:
-                                        xpp, ypp, zpp, dummy  = values  
-                                    elif n_values == 5:
-                                        dummy1, xpp, ypp, zpp, dummy2  = values  
-                                    else:
-                                        break          
-                                elif n_commas == 2:  # 3 columns.
-                                    xpp, ypp, zpp  = line.split(",") 
-                                elif n_commas == 3:  # 4 columns.
-                                    xpp, ypp, zpp, dummy  = line.split(",") 
-                                elif n_commas == 4:  # 5 columns.
-                                     dummy1, xpp, ypp, zpp, dummy2  = line.split(",")  
-                                else:
-                                    break  
-                                    
-                        except ValueError:
-                            read_error += os.path.basename(file) + "\n\n"
-                            
-                            
+                    # kill request received, stop reporting
+                    return
+                self.THREAD_progrss.emit(n_done * 100 / n_files)
+
+            def killed():
+                return self.THREAD_killed
+
+            self.bins = bin_lidar_files(lattice, self.lidar_files, progress=files_done, killed=killed)
             if self.THREAD_killed is False:
                 self.THREAD_progrss.emit(100) 
                 
@@ -9,6 +9,7 @@
 # of the License, or (at your option) any later version
 import os
 import time
+import traceback
 from itertools import chain
 
 from qgis.PyQt.QtCore import Qt, QSettings
@@ -278,6 +279,13 @@ class SettingsDialog(qtBaseClass, uiDialog):
         if self.gutils.check_gpkg():
             self.gutils.path = self.gpkg_path
             self.uc.bar_info("GeoPackage {} is OK".format(self.gutils.path))
+            try:
+                updated = self.gutils.update_grid_rtree_triggers()
+                if updated:
+                    self.uc.log_info("Triggers using the grid spatial index: {}".format(", ".join(updated)))
+            except Exception:
+                self.uc.log_info("WARNING 181026.1702: updating triggers of the GeoPackage failed!")
+                self.uc.log_info(traceback.format_exc())
             sql = """SELECT srs_id FROM gpkg_contents WHERE table_name='grid';"""
             rc = self.gutils.execute(sql)
             rt = rc.fetchone()[0]
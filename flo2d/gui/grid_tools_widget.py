@@ -334,15 +334,9 @@ class GridToolsWidget(qtBaseClass, uiDialog):
                             zs = ZonalStatistics(self.gutils, grid, points_lyr, zfield, calc_type, search_distance)
                             points_elevation = zs.points_elevation()
                             zs.set_elevation(points_elevation)
-                            cmd, out = zs.rasterize_grid()
-                            self.uc.log_info(cmd)
-                            self.uc.log_info(out)
-                            cmd, out = zs.fill_nodata()
-                            self.uc.log_info(cmd)
-                            self.uc.log_info(out)
-                            null_elevation = zs.null_elevation()
-                            zs.set_elevation(null_elevation)
-                            zs.remove_rasters()
+                            for cmd, out in zs.fill_elevation_gaps():
+                                self.uc.log_info(cmd)
+                                self.uc.log_info(out)
 
                             self.gutils.execute("UPDATE grid SET elevation = -9999 WHERE elevation IS NULL;")
                             elevs = [x[0] for x in self.gutils.execute("SELECT elevation FROM grid").fetchall()]
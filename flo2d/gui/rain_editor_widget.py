@@ -10,11 +10,12 @@
 
 import os
 import traceback
+import numpy as np
 from qgis.PyQt.QtCore import Qt, QSettings
 from qgis.PyQt.QtGui import QColor
 from qgis.PyQt.QtWidgets import QInputDialog, QFileDialog, QApplication
 from .ui_utils import load_ui, try_disconnect, set_icon
-from ..flo2d_ie.rainfall_io import ASCProcessor, HDFProcessor
+from ..flo2d_ie.rainfall_io import ASCProcessor, HDFProcessor, HDF_CHUNK_VALUES
 from ..utils import is_number, m_fdata
 from ..geopackage_utils import GeoPackageUtils
 from .table_editor_widget import StandardItemModel, StandardItem, CommandItemEdit
@@ -148,20 +149,16 @@ class RainEditorWidget(qtBaseClass, uiDialog):
             try:
                 grid_lyr = self.lyrs.data["grid"]["qlyr"]
                 QApplication.setOverrideCursor(Qt.WaitCursor)
-                asc_processor = ASCProcessor(grid_lyr, asc_dir)  # as_processor, an instance of the ASCProcessor class,
+                # as_processor, an instance of the ASCProcessor class:
+                asc_processor = ASCProcessor(grid_lyr, asc_dir, self.gutils)
                 head_qry = "INSERT INTO raincell (rainintime, irinters, timestamp) VALUES(?,?,?);"
                 data_qry = "INSERT INTO raincell_data (time_interval, rrgrid, iraindum) VALUES (?,?,?);"
                 self.gutils.clear_tables("raincell", "raincell_data")
                 header = asc_processor.parse_rfc()
                 time_step = float(header[0])
                 self.gutils.execute(head_qry, header)
-                time_interval = 0
-                for rain_series in asc_processor.rainfall_sampling():
-                    cur = self.gutils.con.cursor()
-                    for val, gid in rain_series:
-                        cur.execute(data_qry, (time_interval, gid, val))
-                    self.gutils.con.commit()
-                    time_interval += time_step
+                self.gutils.con.executemany(data_qry, asc_processor.rainfall_rows(time_step))
+                self.gutils.con.commit()
                 QApplication.restoreOverrideCursor()
                 self.uc.show_info("Importing Rainfall Data finished!")
             except Exception as e:
@@ -198,15 +195,34 @@ class RainEditorWidget(qtBaseClass, uiDialog):
             header = self.gutils.execute(qry_header).fetchone()
             rainintime, irinters, timestamp = header
             header_data = [rainintime, irinters, timestamp]
+            qry_count = "SELECT COUNT(fid) FROM raincell_data;"
+            cells_number = self.gutils.execute(qry_count).fetchone()[0] // irinters
             qry_data = "SELECT iraindum FROM raincell_data ORDER BY rrgrid, time_interval;"
-            data = self.gutils.execute(qry_data).fetchall()
-            data = [data[i : i + irinters] for i in range(0, len(data), irinters)]
+            pb = self.uc.progress_bar2("Exporting Rainfall Data...", 0, cells_number, 0)
+
+            def rainfall_blocks():
+                cur = self.gutils.con.cursor()
+                cur.execute(qry_data)
+                block_cells = max(1, HDF_CHUNK_VALUES // irinters)
+                remaining = cells_number
+                while remaining > 0:
+                    block_cells = min(block_cells, remaining)
+                    rows = cur.fetchmany(block_cells * irinters)
+                    yield np.array(rows, dtype=float).reshape(block_cells, irinters)
+                    remaining -= block_cells
+
+            def progress(cells_written):
+                pb.setValue(cells_written)
+                QApplication.processEvents()
+
             hdf_processor = HDFProcessor(hdf_file)
-            hdf_processor.export_rainfall_to_binary_hdf5(header_data, data)
+            hdf_processor.export_rainfall_chunks(header_data, cells_number, rainfall_blocks(), progress)
+            self.uc.clear_bar_messages()
             QApplication.restoreOverrideCursor()
             self.uc.show_info("Exporting Rainfall Data finished!")
         except Exception as e:
             self.uc.log_info(traceback.format_exc())
+            self.uc.clear_bar_messages()
             QApplication.restoreOverrideCursor()
             self.uc.bar_warn("Exporting Rainfall Data failed! Please check your input data.")
 
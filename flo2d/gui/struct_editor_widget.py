@@ -240,25 +240,7 @@ class StructEditorWidget(qtBaseClass, uiDialog):
 
         del_qry = "DELETE FROM struct WHERE fid NOT IN (SELECT fid FROM user_struct);"
         self.gutils.execute(del_qry)
-        upd_cells_qry = """UPDATE struct SET
-            inflonod = (
-                SELECT g.fid FROM
-                    grid AS g,
-                    user_struct AS us
-                WHERE
-                    ST_Intersects(ST_StartPoint(GeomFromGPB(us.geom)), GeomFromGPB(g.geom)) AND
-                    us.fid = struct.fid
-                LIMIT 1
-            ),
-            outflonod = (
-                SELECT g.fid FROM
-                    grid AS g,
-                    user_struct AS us
-                WHERE
-                    ST_Intersects(ST_EndPoint(GeomFromGPB(us.geom)), GeomFromGPB(g.geom)) AND
-                    us.fid = struct.fid
-                LIMIT 1);"""
-        self.gutils.execute(upd_cells_qry)
+        self.gutils.reassign_bc_struct_cells(inflows=False, outflows=False)
 
         upd_stormdrains_qry = """UPDATE storm_drains SET
                     istormdout = (
@@ -16,7 +16,8 @@ import traceback
 
 sys.path.append(os.path.dirname(__file__))
 from affine import Affine
-from transform import TransformMethodsMixin 
+from transform import TransformMethodsMixin, rowcol
+import numpy as np
 
 with warnings.catch_warnings():
     warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -33,3 +34,67 @@ class GDALRasterLayer(TransformMethodsMixin):
         geotransform = self.ds.GetGeoTransform()
         return Affine.from_gdal(*geotransform)
     
+
+    def sample(self, xs, ys, band=1):
+        """
+        Sampling band values at the given coordinate arrays.
+        The band is read block by block and only blocks containing points are read.
+        Points outside of the raster or on NODATA pixels get NaN.
+        """
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        values = np.full(xs.size, np.nan)
+        if xs.size == 0:
+            return values
+        rband = self.ds.GetRasterBand(band)
+        nodata = rband.GetNoDataValue()
+        width, height = self.ds.RasterXSize, self.ds.RasterYSize
+        block_width, block_height = rband.GetBlockSize()
+        rows, cols = rowcol(self.transform, xs, ys, op=np.floor)
+        inside = np.flatnonzero((rows >= 0) & (rows < height) & (cols >= 0) & (cols < width))
+        blocks_across = (width + block_width - 1) // block_width
+        block_ids = (rows[inside] // block_height) * blocks_across + cols[inside] // block_width
+        order = np.argsort(block_ids, kind="stable")
+        inside, block_ids = inside[order], block_ids[order]
+        block_starts = np.flatnonzero(np.r_[True, block_ids[1:] != block_ids[:-1]])
+        block_ends = np.r_[block_starts[1:], block_ids.size]
+        for start, end in zip(block_starts, block_ends):
+            yoff = int(block_ids[start] // blocks_across) * block_height
+            xoff = int(block_ids[start] % blocks_across) * block_width
+            xsize = min(block_width, width - xoff)
+            ysize = min(block_height, height - yoff)
+            block = rband.ReadAsArray(xoff, yoff, xsize, ysize)
+            idx = inside[start:end]
+            values[idx] = block[rows[idx] - yoff, cols[idx] - xoff]
+        if nodata is not None:
+            values[values == nodata] = np.nan
+        return values
+
+    def read_bands(self, xmin, ymin, xmax, ymax, band_pixels=4000000, band=1):
+        """
+        Generator reading band values of pixels overlapping the extent in horizontal bands of at most
+        'band_pixels' pixels. Yields (values, xs, ys) where 'values' is 2D array with NODATA pixels set to NaN
+        and 'xs', 'ys' are coordinates of the pixel centers of its columns and rows (rows from the top).
+        Only north-up rasters are supported, ValueError is raised for rotated ones.
+        """
+        x0, dx, rx, y0, ry, dy = self.ds.GetGeoTransform()
+        if rx != 0 or ry != 0 or dx <= 0 or dy >= 0:
+            raise ValueError("Rotated or south-up rasters are not supported")
+        width, height = self.ds.RasterXSize, self.ds.RasterYSize
+        c0 = max(0, int(math.floor((xmin - x0) / dx)))
+        c1 = min(width, int(math.ceil((xmax - x0) / dx)))
+        r0 = max(0, int(math.floor((ymax - y0) / dy)))
+        r1 = min(height, int(math.ceil((ymin - y0) / dy)))
+        if c0 >= c1 or r0 >= r1:
+            return
+        rband = self.ds.GetRasterBand(band)
+        nodata = rband.GetNoDataValue()
+        xs = x0 + (np.arange(c0, c1) + 0.5) * dx
+        band_rows = max(1, band_pixels // (c1 - c0))
+        for br0 in range(r0, r1, band_rows):
+            br1 = min(r1, br0 + band_rows)
+            values = rband.ReadAsArray(c0, br0, c1 - c0, br1 - br0).astype(float)
+            if nodata is not None:
+                values[values == nodata] = np.nan
+            ys = y0 + (np.arange(br0, br1) + 0.5) * dy
+            yield values, xs, ys
@@ -16,12 +16,14 @@ import time
 import timeit
 import traceback
 import subprocess
+from itertools import islice
 from subprocess import Popen, PIPE, STDOUT
 import numpy as np
 
 sys.path.append(os.path.dirname(__file__))
 from pip_install import pip_install
 from affine import Affine
+from transform import rowcol
 
 with warnings.catch_warnings():
     warnings.filterwarnings("ignore", category=DeprecationWarning)
@@ -33,6 +35,8 @@ gdal_default_cachemax = gdal.GetCacheMax() #bytes
 
 GUI_STDIO = None
 
+XYZ_CHUNK_LINES = 1000000
+
 # Custom print function to communicate QGIS
 def print_line(message,*arg,**kwargs):
     if GUI_STDIO is None:
@@ -358,8 +362,81 @@ def xyz_to_raster(xyz_inpath, extents, shape, resampling_option, srs, layername=
 
     return raster_outpath
 
+def read_xyz_chunks(csv_file, chunk_lines=XYZ_CHUNK_LINES):
+    # Yields (n, 3) arrays of X, Y, Z read from comma separated file in chunks of lines
+    with open(csv_file, 'r') as f:
+        first = f.readline()
+        names = [name.strip().strip('"').upper() for name in first.split(',')]
+        if all(name in names for name in ('X', 'Y', 'Z')):
+            usecols = [names.index(name) for name in ('X', 'Y', 'Z')]
+            lines = []
+        else:
+            usecols = [0, 1, 2]
+            lines = [first]
+        while True:
+            lines += list(islice(f, chunk_lines))
+            if not lines:
+                break
+            yield np.loadtxt(lines, delimiter=',', usecols=usecols, ndmin=2)
+            lines = []
+
+def xyz_average_raster_array(csv_file, extents, shape, nodata=None, grid_nodata=-9999):
+    # Average of points elevations per pixel, the file is read in chunks and points are binned with bincount
+    xmin,ymin,xmax,ymax = extents
+    rows,cols = shape
+    cellsize = (ymax - ymin)*1.0/rows
+    transform = Affine(cellsize,0,xmin,0,-cellsize,ymax)
+    elev_sum = np.zeros(rows*cols)
+    elev_count = np.zeros(rows*cols, dtype=np.int64)
+    for xyz in read_xyz_chunks(csv_file):
+        if nodata is not None:
+            xyz = xyz[xyz[:, 2] > float(nodata) + 0.1] # assuming elevation smaller than nodata is nodata too
+        r, c = rowcol(transform, xyz[:, 0], xyz[:, 1], op=np.floor)
+        inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+        pixels = r[inside] * cols + c[inside]
+        elev_sum += np.bincount(pixels, weights=xyz[inside, 2], minlength=rows*cols)
+        elev_count += np.bincount(pixels, minlength=rows*cols)
+    raster_array = np.full(rows*cols, grid_nodata, dtype=np.float32)
+    covered = elev_count > 0
+    raster_array[covered] = elev_sum[covered] / elev_count[covered]
+    return raster_array.reshape(shape), transform
+
+def write_raster(raster_outpath, raster_array, transform, srs, grid_nodata=-9999):
+    if os.path.exists(raster_outpath):
+        os.unlink(raster_outpath)
+    rows, cols = raster_array.shape
+    driver = gdal.GetDriverByName('GTiff')
+    ds = driver.Create(raster_outpath, cols, rows, 1, gdal.GDT_Float32)
+    crs = osr.SpatialReference()
+    wkt = srs
+    try:
+        # check if srs is Proj4
+        crs.ImportFromProj4(srs)
+        wkt = crs.ExportToWkt()
+    except:
+        pass
+    ds.SetProjection(wkt)
+    ds.SetGeoTransform(transform.to_gdal())
+    band = ds.GetRasterBand(1)
+    band.WriteArray(raster_array)
+    band.SetNoDataValue(float(grid_nodata))
+    band.FlushCache()
+    ds = None
+    return raster_outpath
+
+@timer
+def xyz_to_raster_average(csv_file, extents, shape, srs, nodata = None):
+    # In-process GDS average, no dask dependency
+    print_line('XYZ-to-Raster-Average (NumPy)\n')
+    base_path, ext = os.path.splitext(csv_file)
+    raster_outpath = '{}_gdsgrid.tif'.format(base_path) # hard-coded path
+    raster_array, transform = xyz_average_raster_array(csv_file, extents, shape, nodata)
+    return write_raster(raster_outpath, raster_array, transform, srs)
+
 @timer
-def xyz_to_raster_gds_average(csv_file,extents,shape,srs,open_dashboard, procs, threads, nodata = None):
+def xyz_to_raster_gds_average(csv_file,extents,shape,srs,open_dashboard, procs, threads, nodata = None, in_process = True):
+    if in_process:
+        return xyz_to_raster_average(csv_file, extents, shape, srs, nodata)
     print_line('XYZ-to-Raster-Average\n')
     if install_dask():
         base_path, ext = os.path.splitext(csv_file)
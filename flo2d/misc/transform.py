@@ -11,7 +11,7 @@
 """
 from __future__ import division
 
-import collections
+import collections.abc
 import math
 
 from affine import Affine
@@ -150,10 +150,10 @@ def xy(transform, rows, cols, offset='center'):
 
     single_col = False
     single_row = False
-    if not isinstance(cols, collections.Iterable):
+    if not isinstance(cols, collections.abc.Iterable):
         cols = [cols]
         single_col = True
-    if not isinstance(rows, collections.Iterable):
+    if not isinstance(rows, collections.abc.Iterable):
         rows = [rows]
         single_row = True
 
@@ -213,12 +213,21 @@ def rowcol(transform, xs, ys, op=math.floor, precision=None):
         list of column indices
     """
 
+    if hasattr(xs, "ndim") and hasattr(ys, "ndim"):
+        # NumPy arrays are mapped in one pass, 'op' must be a ufunc (e.g. numpy.floor).
+        if precision is None:
+            eps = 0.0
+        else:
+            eps = 10.0 ** -precision * (1.0 - 2.0 * op(0.1))
+        fcols, frows = ~transform * (xs + eps, ys - eps)
+        return op(frows).astype(int), op(fcols).astype(int)
+
     single_x = False
     single_y = False
-    if not isinstance(xs, collections.Iterable):
+    if not isinstance(xs, collections.abc.Iterable):
         xs = [xs]
         single_x = True
-    if not isinstance(ys, collections.Iterable):
+    if not isinstance(ys, collections.abc.Iterable):
         ys = [ys]
         single_y = True
 
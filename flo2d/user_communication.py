@@ -12,7 +12,7 @@
 # pylint: disable=C0325
 import sys
 import traceback
-from qgis.PyQt.QtWidgets import QMessageBox, QProgressBar, QDialog,  QWidget, QScrollArea, QVBoxLayout, QLabel, QGridLayout, QSizePolicy
+from qgis.PyQt.QtWidgets import QApplication, QMessageBox, QProgressBar, QDialog,  QWidget, QScrollArea, QVBoxLayout, QLabel, QGridLayout, QSizePolicy
 from qgis.PyQt.QtCore import Qt
 from qgis.core import QgsMessageLog, Qgis
 
@@ -176,6 +176,49 @@ class UserCommunication(object):
     def clear_bar_messages(self):
         self.iface.messageBar().clearWidgets()
         
+class DeferredUserCommunication(UserCommunication):
+    """
+    Class for collecting messages issued outside of the main (GUI) thread.
+    Collected messages are passed to the regular UserCommunication object with 'flush'.
+    """
+
+    def __init__(self, context):
+        super(DeferredUserCommunication, self).__init__(None, context)
+        self.messages = []
+
+    def show_info(self, msg):
+        self.messages.append(("show_info", msg))
+
+    def show_warn(self, msg):
+        self.messages.append(("show_warn", msg))
+
+    def show_critical(self, msg):
+        self.messages.append(("show_critical", msg))
+
+    def show_error(self, msg, e):
+        self.messages.append(("show_critical", msg + "\n\nError:\n   " + type(e).__name__ + ": " + str(e)))
+
+    def log_info(self, msg):
+        self.messages.append(("log_info", msg))
+
+    def bar_warn(self, msg, dur=5):
+        self.messages.append(("bar_warn", msg))
+
+    def bar_info(self, msg, dur=5):
+        self.messages.append(("bar_info", msg))
+
+    def restore_override_cursor(self):
+        self.messages.append(("restore_override_cursor", None))
+
+    def flush(self, uc):
+        for method, msg in self.messages:
+            if method == "restore_override_cursor":
+                QApplication.restoreOverrideCursor()
+            else:
+                getattr(uc, method)(msg)
+        self.messages = []
+
+
 class ScrollMessageBox(QMessageBox):
     def __init__(self, msg, *args, **kwargs):
         QMessageBox.__init__(self, *args, **kwargs)
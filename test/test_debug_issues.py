@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+from flo2d.flo2d_tools.debug_issues import parse_cells, read_debug_file, read_issues_file
+
+DEBUG_LINES = """12, 1001, Elevation is lower than, the adjacent cells
+-3, 2002, Negative cell number
+--5, 3003, Malformed cell number
+abc, 4004, Not a cell
+7, 5005
+ +8 , 6006 , Signed cell
+"""
+
+ISSUES_LINES = """DEPRESSED ELEMENTS
+  GRID     X     Y     ELEVATION
+
+   15   100.5   200.5   10.25
+   16   110.5   200.5   11.00
+"""
+
+
+class TestDebugIssues(unittest.TestCase):
+    def setUp(self):
+        self.issues_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.issues_dir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.issues_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_parse_cells(self):
+        cells, valid = parse_cells(["12", " 7 ", "+8", "-3", "0", "--5", "+-5", "5-", "1.5", "", "x1", "²"])
+        np.testing.assert_array_equal(valid, [True] * 5 + [False] * 7)
+        np.testing.assert_array_equal(cells[valid], [12, 7, 8, 1, 1])
+        cells, valid = parse_cells([])
+        self.assertEqual(cells.size, 0)
+        self.assertEqual(valid.size, 0)
+
+    def test_read_debug_file(self):
+        debug_file = self.write_file("DEBUG.OUT", DEBUG_LINES)
+        errors, cells = read_debug_file(debug_file)
+        expected = [
+            ["12", "1001", "Elevation is lower than,  the adjacent cells"],
+            ["1", "2002", "Negative cell number"],
+            ["8", "6006", "Signed cell"],
+        ]
+        self.assertListEqual(errors, expected)
+        self.assertListEqual(cells.tolist(), [12, 1, 8])
+
+    def test_read_issues_file(self):
+        issues_file = self.write_file("DEPRESSED_ELEMENTS.OUT", ISSUES_LINES)
+        rows = read_issues_file(issues_file, 2)
+        self.assertListEqual(rows, [["15", "100.5", "200.5", "10.25"], ["16", "110.5", "200.5", "11.00"]])
+
+
+# Running tests:
+if __name__ == "__main__":
+    cases = [TestDebugIssues]
+    suite = unittest.TestSuite()
+    for t in cases:
+        tests = unittest.TestLoader().loadTestsFromTestCase(t)
+        suite.addTest(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
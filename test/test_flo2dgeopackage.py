@@ -9,6 +9,9 @@
 # of the License, or (at your option) any later version
 
 import os
+import time
+import shutil
+import tempfile
 import unittest
 from .utilities import get_qgis_app
 
@@ -19,8 +22,13 @@ VECTOR_PATH = os.path.join(THIS_DIR, "data", "vector")
 EXPORT_DATA_DIR = os.path.join(THIS_DIR, "data")
 CONT = os.path.join(IMPORT_DATA_DIR, "CONT.DAT")
 
-from flo2d.geopackage_utils import database_create
+from flo2d.geopackage_utils import database_create, database_disconnect, read_only_connect, tune_connection
 from flo2d.flo2d_ie.flo2dgeopackage import Flo2dGeoPackage
+from flo2d.flo2d_ie.flo2d_parser import ParseDAT
+from flo2d.errors import Flo2dDatFileInvalid
+from flo2d.flo2d_tools.grid_index import cached_grid_index, clear_grid_indexes, DIRECTION_OFFSETS, GRID_INDEXES
+from flo2d.flo2d_tools.grid_tools import adjacent_cells_elevations
+from flo2d.flo2d_tools.conflicts import Conflicts, INFLOWS, OUTFLOWS, PARTIAL_ARF
 
 
 def file_len(fname):
@@ -81,6 +89,398 @@ class TestFlo2dGeoPackage(unittest.TestCase):
         elevation = self.f2g.execute("""SELECT fid FROM grid WHERE elevation IS NULL;""").fetchone()
         self.assertIsNone(elevation)
 
+    def test_import_mannings_n_topo_chunks(self):
+        chunksize = self.f2g.chunksize
+        self.f2g.chunksize = 1000
+        try:
+            self.f2g.import_mannings_n_topo()
+        finally:
+            self.f2g.chunksize = chunksize
+        rows, max_fid = self.f2g.execute("""SELECT COUNT(fid), MAX(fid) FROM grid;""").fetchone()
+        self.assertEqual(rows, 9205)
+        self.assertEqual(max_fid, 9205)
+        indexed = self.f2g.execute("""SELECT COUNT(id) FROM rtree_grid_geom;""").fetchone()[0]
+        self.assertEqual(indexed, 9205)
+        wkt = self.f2g.execute("""SELECT ST_AsText(ST_Centroid(GeomFromGPB(geom))) FROM grid WHERE fid = 1;""").fetchone()[0]
+        x, y = [float(c) for c in wkt.strip("POINT()").split()]
+        self.assertAlmostEqual(x, 551397.5, places=3)
+        self.assertAlmostEqual(y, 44608.95, places=3)
+
+    def parse_mannings_n_topo_rows(self, mannings_rows, topo_rows, chunksize=2):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            parser = ParseDAT()
+            for dat, rows in (("MANNINGS_N.DAT", mannings_rows), ("TOPO.DAT", topo_rows)):
+                parser.dat_files[dat] = os.path.join(tmp_dir, dat)
+                with open(parser.dat_files[dat], "w") as f:
+                    f.write("\n".join(rows) + "\n")
+            return list(parser.parse_mannings_n_topo_chunks(chunksize))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_mannings_n_topo_chunks_alignment(self):
+        mannings = ["1 0.04", "2 0.05", "3 0.06"]
+        topo = ["10.0 10.0 1.5", "", "20.0 10.0 2.5", "30.0 10.0 3.5"]
+        chunks = self.parse_mannings_n_topo_rows(mannings, topo)
+        fids = [fid for mannings_chunk, topo_chunk in chunks for fid in mannings_chunk[:, 0].tolist()]
+        elevations = [elev for mannings_chunk, topo_chunk in chunks for elev in topo_chunk[:, 2].tolist()]
+        self.assertListEqual(fids, [1.0, 2.0, 3.0])
+        self.assertListEqual(elevations, [1.5, 2.5, 3.5])
+
+    def test_mannings_n_topo_short_line(self):
+        mannings = ["1 0.04", "2 0.05", "3 0.06"]
+        topo = ["10.0 10.0 1.5", "20.0 10.0", "30.0 10.0 3.5"]
+        with self.assertRaisesRegex(Flo2dDatFileInvalid, "line 2 has 2 values instead of 3"):
+            self.parse_mannings_n_topo_rows(mannings, topo)
+
+    def test_mannings_n_topo_shifted_values(self):
+        mannings = ["1 0.04", "2 0.05", "3 0.06"]
+        topo = ["10.0 10.0 1.5 99", "20.0 10.0", "30.0 10.0 3.5"]
+        with self.assertRaisesRegex(Flo2dDatFileInvalid, "line 1 has 4 values instead of 3"):
+            self.parse_mannings_n_topo_rows(mannings, topo)
+
+    def test_mannings_n_topo_non_numeric(self):
+        mannings = ["1 0.04", "2 0.05", "3 0.06"]
+        topo = ["10.0 10.0 1.5", "20.0 10.0 2.5", "30.0 10.0 abc"]
+        with self.assertRaisesRegex(Flo2dDatFileInvalid, "line 3 has a non-numeric value"):
+            self.parse_mannings_n_topo_rows(mannings, topo)
+
+    def test_mannings_n_topo_rows_number(self):
+        mannings = ["1 0.04", "2 0.05"]
+        topo = ["10.0 10.0 1.5", "20.0 10.0 2.5", "30.0 10.0 3.5"]
+        with self.assertRaisesRegex(Flo2dDatFileInvalid, "MANNINGS_N.DAT has 2 rows and TOPO.DAT has 3 rows"):
+            self.parse_mannings_n_topo_rows(mannings, topo)
+
+    def test_mannings_n_topo_fids_order(self):
+        mannings = ["1 0.04", "3 0.05", "2 0.06"]
+        topo = ["10.0 10.0 1.5", "20.0 10.0 2.5", "30.0 10.0 3.5"]
+        with self.assertRaisesRegex(Flo2dDatFileInvalid, "cell 3 found in row 2"):
+            self.parse_mannings_n_topo_rows(mannings, topo)
+
+    @unittest.skip("Skipping benchmark due to long run.")
+    def test_import_mannings_n_topo_benchmark(self):
+        cells = 2000000
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            shutil.copy(CONT, tmp_dir)
+            with open(os.path.join(tmp_dir, "MANNINGS_N.DAT"), "w") as m, open(os.path.join(tmp_dir, "TOPO.DAT"), "w") as t:
+                for fid in range(1, cells + 1):
+                    col, row = divmod(fid - 1, 1000)
+                    m.write("{0: >10} {1: >10}\n".format(fid, "0.040"))
+                    t.write("{0: >15.4f} {1: >15.4f} {2: >10.4f}\n".format(col * 10.0 + 5, row * 10.0 + 5, 100.0))
+            con = database_create(":memory:")
+            f2g = Flo2dGeoPackage(con, None)
+            f2g.set_parser(os.path.join(tmp_dir, "CONT.DAT"))
+            f2g.import_mannings_n_topo()
+            self.assertEqual(f2g.count("grid"), cells)
+            con.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_transaction(self):
+        qry = """UPDATE grid SET n_value = ? WHERE fid = ?;"""
+        n_value = self.f2g.execute("""SELECT n_value FROM grid WHERE fid = 1;""").fetchone()[0]
+        with self.assertRaises(ZeroDivisionError):
+            with self.f2g.transaction():
+                self.f2g.execute(qry, (0.5, 1))
+                1 / 0
+        self.assertEqual(self.f2g.execute("""SELECT n_value FROM grid WHERE fid = 1;""").fetchone()[0], n_value)
+        with self.f2g.transaction():
+            with self.f2g.transaction():
+                self.f2g.execute(qry, (0.5, 1))
+            self.assertTrue(self.con.in_transaction)
+        self.assertFalse(self.con.in_transaction)
+        self.assertEqual(self.f2g.execute("""SELECT n_value FROM grid WHERE fid = 1;""").fetchone()[0], 0.5)
+        # Instances sharing the connection don't commit inside of a transaction opened by the other one.
+        other = Flo2dGeoPackage(self.con, None)
+        with self.assertRaises(ZeroDivisionError):
+            with self.f2g.transaction():
+                other.execute(qry, (0.25, 1))
+                self.assertEqual(other.transaction_depth, 1)
+                1 / 0
+        self.assertEqual(other.transaction_depth, 0)
+        self.assertEqual(self.f2g.execute("""SELECT n_value FROM grid WHERE fid = 1;""").fetchone()[0], 0.5)
+        self.f2g.execute(qry, (n_value, 1))
+
+    def test_update_grid_rtree_triggers(self):
+        con = database_create(":memory:")
+        f2g = Flo2dGeoPackage(con, None)
+        name = "find_cells_mult_insert"
+        table = f2g.execute("SELECT tbl_name FROM sqlite_master WHERE name = ?;", (name,)).fetchone()[0]
+        f2g.execute('DROP TRIGGER "{0}";'.format(name))
+        f2g.execute('CREATE TRIGGER "{0}" AFTER INSERT ON "{1}" BEGIN SELECT 1; END;'.format(name, table))
+        self.assertListEqual(f2g.update_grid_rtree_triggers(), [name])
+        sql = f2g.execute("SELECT sql FROM sqlite_master WHERE name = ?;", (name,)).fetchone()[0]
+        self.assertIn("rtree_grid_geom", sql)
+        self.assertListEqual(f2g.update_grid_rtree_triggers(), [])
+        self.assertFalse(con.in_transaction)
+        con.close()
+
+    def test_bulk_write_restore(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            gpkg = os.path.join(tmp_dir, "bulk_write.gpkg")
+            con = database_create(gpkg)
+            f2g = Flo2dGeoPackage(con, None)
+            control_qry = """SELECT name, enabled FROM trigger_control ORDER BY name;"""
+            f2g.execute("""UPDATE trigger_control SET enabled = 0 WHERE name = 'find_cells_mult_insert';""")
+            triggers = sorted(f2g.table_triggers("grid"))
+            control = f2g.execute(control_qry).fetchall()
+            synchronous = f2g.execute("PRAGMA main.synchronous;").fetchone()[0]
+            journal_mode = f2g.execute("PRAGMA main.journal_mode;").fetchone()[0]
+            self.assertTrue(triggers)
+            with self.assertRaises(ZeroDivisionError):
+                with f2g.bulk_write("grid"):
+                    f2g.execute("""INSERT INTO grid (fid, n_value) VALUES (1, 0.04);""")
+                    self.assertListEqual(f2g.table_triggers("grid"), [])
+                    self.assertEqual(f2g.execute("SELECT SUM(enabled) FROM trigger_control;").fetchone()[0], 0)
+                    self.assertEqual(f2g.execute("PRAGMA main.synchronous;").fetchone()[0], synchronous)
+                    self.assertTrue(con.in_transaction)
+                    # Dropped triggers are not committed while the block runs.
+                    other = read_only_connect(gpkg)
+                    other_f2g = Flo2dGeoPackage(other, None)
+                    self.assertListEqual(sorted(other_f2g.table_triggers("grid")), triggers)
+                    other.close()
+                    1 / 0
+            self.assertFalse(con.in_transaction)
+            self.assertEqual(f2g.count("grid"), 0)
+            self.assertListEqual(sorted(f2g.table_triggers("grid")), triggers)
+            self.assertListEqual(f2g.execute(control_qry).fetchall(), control)
+            self.assertEqual(f2g.execute("PRAGMA main.journal_mode;").fetchone()[0], journal_mode)
+            con.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_conflicts(self):
+        self.f2g.clear_tables("inflow_cells", "outflow_cells", "blocked_cells")
+        inflows = [(1, 3), (1, 5), (2, 5), (2, 8)]
+        self.f2g.execute_many("""INSERT INTO inflow_cells (inflow_fid, grid_fid) VALUES (?,?);""", inflows)
+        self.f2g.execute_many("""INSERT INTO outflow_cells (grid_fid) VALUES (?);""", [(8,), (5,), (1,)])
+        self.f2g.execute_many("""INSERT INTO blocked_cells (grid_fid, arf) VALUES (?,?);""", [(3, 1.0), (8, 0.5)])
+        rules = [(INFLOWS, INFLOWS, "2 or more inflows"), (INFLOWS, OUTFLOWS, "Inflow and outflow in same cell")]
+        conflicts = Conflicts(self.f2g)
+        errors = conflicts.check(rules)
+        self.assertListEqual(
+            errors,
+            [
+                ["5", "Inflows", "Inflows", "2 or more inflows"],
+                ["5", "Inflows", "Outflows", "Inflow and outflow in same cell"],
+                ["8", "Inflows", "Outflows", "Inflow and outflow in same cell"],
+            ],
+        )
+        self.assertEqual(len(conflicts.timings), len(rules) + 1)
+        self.assertListEqual(conflicts.shared_cells(INFLOWS, PARTIAL_ARF).tolist(), [8])
+        self.f2g.clear_tables("inflow_cells", "outflow_cells", "blocked_cells")
+
+    @unittest.skip("Skipping benchmark due to long run.")
+    def test_transaction_benchmark(self):
+        updates = 20000
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            con = database_create(os.path.join(tmp_dir, "transaction.gpkg"))
+            f2g = Flo2dGeoPackage(con, None)
+            f2g.set_parser(CONT)
+            f2g.import_mannings_n_topo()
+            qry = """UPDATE grid SET n_value = ? WHERE fid = ?;"""
+            fids = [fid % 9205 + 1 for fid in range(updates)]
+            start_time = time.time()
+            for fid in fids:
+                f2g.execute(qry, (0.03, fid))
+            single = time.time() - start_time
+            start_time = time.time()
+            with f2g.transaction():
+                for fid in fids:
+                    f2g.execute(qry, (0.04, fid))
+            batched = time.time() - start_time
+            self.assertLess(batched, single)
+            con.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_tuned_connection(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            gpkg_path = os.path.join(tmp_dir, "tuned.gpkg")
+            con = database_create(gpkg_path)
+            self.assertNotEqual(con.execute("PRAGMA journal_mode;").fetchone()[0].lower(), "wal")
+            self.assertEqual(con.execute("PRAGMA temp_store;").fetchone()[0], 2)
+            self.assertEqual(tune_connection(con, wal=True).lower(), "wal")
+            self.assertEqual(con.execute("PRAGMA synchronous;").fetchone()[0], 1)
+            ro_con = read_only_connect(gpkg_path)
+            self.assertEqual(ro_con.execute("SELECT COUNT(*) FROM grid;").fetchone()[0], 0)
+            ro_con.close()
+            con.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_export_parallel(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            con = database_create(os.path.join(tmp_dir, "parallel.gpkg"))
+            f2g = Flo2dGeoPackage(con, None)
+            f2g.disable_geom_triggers()
+            f2g.set_parser(CONT)
+            f2g.import_mannings_n_topo()
+            f2g.import_arf()
+            f2g.import_tolspatial()
+            calls = ["export_mannings_n_topo", "export_arf", "export_tolspatial"]
+            serial_dir = os.path.join(tmp_dir, "serial")
+            parallel_dir = os.path.join(tmp_dir, "parallel")
+            os.mkdir(serial_dir)
+            os.mkdir(parallel_dir)
+            for call in calls:
+                getattr(f2g, call)(serial_dir)
+            results, errors = f2g.export_parallel(calls, parallel_dir, max_workers=3)
+            self.assertDictEqual(errors, {})
+            self.assertListEqual(list(results), calls)
+            self.assertTrue(all(result for result, seconds in results.values()))
+            for dat in ["MANNINGS_N.DAT", "TOPO.DAT", "ARF.DAT", "TOLSPATIAL.DAT"]:
+                with open(os.path.join(serial_dir, dat), "rb") as s, open(os.path.join(parallel_dir, dat), "rb") as p:
+                    self.assertEqual(s.read(), p.read())
+            results, errors = f2g.export_parallel(["export_missing", "export_arf"], parallel_dir, max_workers=2)
+            self.assertListEqual(list(results), ["export_arf"])
+            self.assertListEqual(list(errors), ["export_missing"])
+            self.assertIsInstance(errors["export_missing"], AttributeError)
+            con.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_import_parallel(self):
+        con = database_create(":memory:")
+        f2g = Flo2dGeoPackage(con, None)
+        f2g.disable_geom_triggers()
+        f2g.set_parser(CONT)
+        calls = ["import_tolspatial", "import_rain", "import_cont_toler", "import_arf", "import_mannings_n_topo"]
+        timings = f2g.import_parallel(calls, max_workers=2)
+        order = list(timings)
+        self.assertCountEqual(order, calls)
+        self.assertLess(order.index("import_cont_toler"), order.index("import_mannings_n_topo"))
+        for call in ["import_tolspatial", "import_rain", "import_arf"]:
+            self.assertLess(order.index("import_mannings_n_topo"), order.index(call))
+        self.assertEqual(f2g.count("grid"), 9205)
+        self.assertEqual(f2g.count("tolspatial"), 4)
+        self.assertEqual(f2g.count("tolspatial_cells"), 4)
+        self.assertIsInstance(f2g.parser, ParseDAT)
+        con.close()
+
+    def test_grid_index(self):
+        grid_index = cached_grid_index(self.f2g)
+        self.assertTrue(grid_index.regular)
+        self.assertEqual(grid_index.fids.size, self.f2g.count("grid"))
+        qry = """
+        SELECT fid, ST_X(ST_Centroid(GeomFromGPB(geom))), ST_Y(ST_Centroid(GeomFromGPB(geom)))
+        FROM grid WHERE fid IN (1, 100, 5000);"""
+        for fid, x, y in self.f2g.execute(qry).fetchall():
+            self.assertEqual(grid_index.cell_on_point(x, y), fid)
+            cx, cy = grid_index.centroid(fid)
+            self.assertAlmostEqual(cx, x, places=6)
+            self.assertAlmostEqual(cy, y, places=6)
+            for neighbour in grid_index.neighbours(fid)[0]:
+                if neighbour:
+                    nx, ny = grid_index.centroid(neighbour)
+                    self.assertAlmostEqual(max(abs(nx - x), abs(ny - y)), grid_index.cell_size, places=6)
+        self.assertIsNone(grid_index.cell_on_point(0, 0))
+        elev = self.f2g.execute("""SELECT elevation FROM grid WHERE fid = 1;""").fetchone()[0]
+        self.f2g.execute("""UPDATE grid SET elevation = ? WHERE fid = 1;""", (elev + 1,))
+        self.assertEqual(cached_grid_index(self.f2g).elevations(1)[0], elev + 1)
+        self.assertIs(cached_grid_index(self.f2g), grid_index)
+        self.f2g.execute("""UPDATE grid SET n_value = n_value WHERE fid = 1;""")
+        self.assertFalse(grid_index.refresh())
+        # Cells patched inside of a rolled back transaction are read again and nothing is committed by the index.
+        with self.assertRaises(ZeroDivisionError):
+            with self.f2g.transaction():
+                self.f2g.execute("""UPDATE grid SET elevation = ? WHERE fid = 1;""", (elev + 2,))
+                self.assertEqual(cached_grid_index(self.f2g).elevations(1)[0], elev + 2)
+                self.assertTrue(self.con.in_transaction)
+                1 / 0
+        self.assertEqual(cached_grid_index(self.f2g).elevations(1)[0], elev + 1)
+        self.assertFalse(self.con.in_transaction)
+        self.f2g.execute("""UPDATE grid SET elevation = ? WHERE fid = 1;""", (elev,))
+
+    def test_grid_index_eviction(self):
+        con = database_create(":memory:")
+        f2g = Flo2dGeoPackage(con, None)
+        index = cached_grid_index(f2g)
+        self.assertIs(cached_grid_index(f2g), index)
+        self.assertIs(GRID_INDEXES[id(con)], index)
+        database_disconnect(con)
+        self.assertNotIn(id(con), GRID_INDEXES)
+        cached_grid_index(self.f2g)
+        clear_grid_indexes()
+        self.assertDictEqual(GRID_INDEXES, {})
+
+    def test_reassign_bc_struct_cells(self):
+        con = database_create(":memory:")
+        f2g = Flo2dGeoPackage(con, None)
+        f2g.disable_geom_triggers()
+        f2g.set_parser(CONT)
+        f2g.import_mannings_n_topo()
+        centroid_qry = """SELECT AsGPB(ST_Centroid(GeomFromGPB(geom))) FROM grid WHERE fid = ?;"""
+        line_qry = """SELECT AsGPB(MakeLine(ST_Centroid(GeomFromGPB(a.geom)), ST_Centroid(GeomFromGPB(b.geom))))
+                      FROM grid AS a, grid AS b WHERE a.fid = ? AND b.fid = ?;"""
+
+        def centroid(cell):
+            return f2g.execute(centroid_qry, (cell,)).fetchone()[0]
+
+        def line(start_cell, end_cell):
+            return f2g.execute(line_qry, (start_cell, end_cell)).fetchone()[0]
+
+        def assigned_cells():
+            inflow = f2g.execute("SELECT inflow_fid, grid_fid FROM inflow_cells;").fetchall()
+            outflow = f2g.execute("SELECT outflow_fid, grid_fid FROM outflow_cells;").fetchall()
+            struct = f2g.execute("SELECT inflonod, outflonod FROM struct WHERE fid = 1;").fetchone()
+            return inflow, outflow, struct
+
+        f2g.execute("INSERT INTO user_bc_points (fid, type, geom) VALUES (1, 'inflow', ?);", (centroid(100),))
+        f2g.execute("INSERT INTO user_bc_points (fid, type, geom) VALUES (2, 'outflow', ?);", (centroid(200),))
+        f2g.execute("INSERT INTO outflow (fid, geom_type, bc_fid) VALUES (7, 'point', 2);")
+        f2g.execute("INSERT INTO user_struct (fid, geom) VALUES (1, ?);", (line(300, 400),))
+        f2g.execute("INSERT INTO struct (fid, structname) VALUES (1, 'culvert');")
+        self.assertEqual(f2g.reassign_inflow_cells(), 1)
+        self.assertEqual(f2g.reassign_outflow_cells(), (1, []))
+        f2g.reassign_struct_cells()
+        self.assertTupleEqual(assigned_cells(), ([(1, 100)], [(7, 200)], (300, 400)))
+
+        f2g.execute("UPDATE user_bc_points SET geom = ? WHERE fid = 1;", (centroid(5000),))
+        f2g.execute("UPDATE user_bc_points SET geom = ? WHERE fid = 2;", (centroid(6000),))
+        f2g.execute("UPDATE user_struct SET geom = ? WHERE fid = 1;", (line(7000, 8000),))
+        self.assertTupleEqual(f2g.reassign_bc_struct_cells(), (1, 1, []))
+        self.assertTupleEqual(assigned_cells(), ([(1, 5000)], [(7, 6000)], (7000, 8000)))
+        self.assertFalse(con.in_transaction)
+
+        # Cells of the multiple channel areas are found by the R-tree filtered triggers.
+        f2g.execute("UPDATE trigger_control SET enabled = 1 WHERE name LIKE 'find_cells_mult_%';")
+        cell_size = float(f2g.get_cont_par("CELLSIZE"))
+        x, y = [float(c) for c in f2g.single_centroid(100).strip("POINT()").split()]
+        f2g.execute("INSERT INTO mult_areas (fid, geom) VALUES (1, ?);", (f2g.build_square_xy(x, y, cell_size * 0.5),))
+        mult_qry = "SELECT grid_fid FROM mult_cells WHERE area_fid = 1;"
+        self.assertListEqual(f2g.execute(mult_qry).fetchall(), [(100,)])
+        x, y = [float(c) for c in f2g.single_centroid(5000).strip("POINT()").split()]
+        f2g.execute("UPDATE mult_areas SET geom = ? WHERE fid = 1;", (f2g.build_square_xy(x, y, cell_size * 0.5),))
+        self.assertListEqual(f2g.execute(mult_qry).fetchall(), [(5000,)])
+        database_disconnect(con)
+
+    def test_adjacent_cells_elevations(self):
+        cell_size = cached_grid_index(self.f2g).cell_size
+        cells = [1, 100, 100, 5000, 9205]
+        directions = [1, 2, 7, 5, 3]
+        adjacent, elevs = adjacent_cells_elevations(self.f2g, cells, directions)
+        centroid_qry = """SELECT ST_X(ST_Centroid(GeomFromGPB(geom))), ST_Y(ST_Centroid(GeomFromGPB(geom))) FROM grid WHERE fid = ?;"""
+        cell_qry = """
+        SELECT fid, elevation FROM grid
+        WHERE ST_Intersects(GeomFromGPB(geom), ST_GeomFromText(?)) ORDER BY fid LIMIT 1;"""
+        for cell, direction, adj, elev in zip(cells, directions, adjacent, elevs):
+            x, y = self.f2g.execute(centroid_qry, (cell,)).fetchone()
+            row_offset, col_offset = DIRECTION_OFFSETS[direction]
+            point = "POINT({0} {1})".format(x + col_offset * cell_size, y - row_offset * cell_size)
+            expected = self.f2g.execute(cell_qry, (point,)).fetchone()
+            if expected is None:
+                self.assertEqual(adj, 0)
+                self.assertEqual(elev, -999)
+            else:
+                self.assertEqual(adj, expected[0])
+                self.assertAlmostEqual(elev, expected[1])
+
     def test_import_inflow(self):
         self.f2g.clear_tables("inflow")
         self.f2g.import_inflow()
@@ -258,6 +658,25 @@ class TestFlo2dGeoPackage(unittest.TestCase):
         self.assertEqual(itopo, etopo)
         self.assertEqual(eman, etopo)
 
+    def test_export_mannings_n_topo_values(self):
+        self.f2g.chunksize = 1000
+        try:
+            self.f2g.export_mannings_n_topo(EXPORT_DATA_DIR)
+        finally:
+            self.f2g.chunksize = 100000
+        infile1 = self.f2g.parser.dat_files["MANNINGS_N.DAT"]
+        infile2 = self.f2g.parser.dat_files["TOPO.DAT"]
+        outfile1, outfile2 = export_paths(infile1, infile2)
+        for infile, outfile in [(infile1, outfile1), (infile2, outfile2)]:
+            with open(infile) as i, open(outfile) as o:
+                ilines = [line.split() for line in i if line.strip()]
+                olines = [line.split() for line in o if line.strip()]
+            self.assertEqual(len(ilines), len(olines))
+            for iline, oline in zip(ilines, olines):
+                self.assertEqual(len(iline), len(oline))
+                for ival, oval in zip(iline, oline):
+                    self.assertAlmostEqual(float(ival), float(oval), places=3)
+
     def test_export_inflow(self):
         self.f2g.import_inflow()
         self.f2g.export_inflow(EXPORT_DATA_DIR)
@@ -10,6 +10,7 @@
 
 import os
 import unittest
+import numpy as np
 from .utilities import get_qgis_app
 
 QGIS_APP = get_qgis_app()
@@ -17,8 +18,27 @@ THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 VECTOR_PATH = os.path.join(THIS_DIR, "data", "vector")
 EXPORT_DATA_DIR = os.path.join(THIS_DIR, "data")
 
-from qgis.core import QgsVectorLayer
-from flo2d.flo2d_tools.grid_tools import build_grid, poly2grid, calculate_arfwrf
+from qgis.core import QgsVectorLayer, QgsRasterLayer, QgsFeatureRequest, QgsFeature, QgsGeometry, QgsRectangle
+from qgis.analysis import QgsZonalStatistics
+from flo2d.flo2d_tools.grid_tools import (
+    build_grid,
+    build_grid_np,
+    poly2grid,
+    poly2poly_geos,
+    poly2poly_geos_tiled,
+    calculate_arfwrf,
+    calculate_arfwrf_raster,
+    compare_arfwrf,
+    layer_centroids,
+    sample_raster,
+    identify_raster,
+    polygons_statistics,
+    raster_zonal_statistics,
+    Delaunay,
+    DelaunayInterpolator,
+    build_spatial_index,
+)
+from flo2d.flo2d_tools.spatial_index_cache import cached_layer_index, clear_spatial_index_cache
 
 
 class TestGridTools(unittest.TestCase):
@@ -38,6 +58,17 @@ class TestGridTools(unittest.TestCase):
         polygons = list(build_grid(vlayer, 500))
         self.assertEqual(len(polygons), 494)
 
+    def test_build_grid_np(self):
+        boundary = os.path.join(VECTOR_PATH, "boundary.geojson")
+        vlayer = QgsVectorLayer(boundary, "bl", "ogr")
+        polygons = list(build_grid(vlayer, 500))
+        xs, ys, cols, rows = build_grid_np(vlayer, 500)
+        self.assertEqual(len(xs), 494)
+        for poly, x, y in zip(polygons, xs, ys):
+            self.assertAlmostEqual(poly[0] + 250, x, places=4)
+            self.assertAlmostEqual(poly[1] + 250, y, places=4)
+        self.assertTrue((cols >= 2).all() and (rows >= 2).all())
+
     def test_poly2grid(self):
         grid = os.path.join(VECTOR_PATH, "grid.geojson")
         roughness = os.path.join(VECTOR_PATH, "roughness.geojson")
@@ -51,6 +82,108 @@ class TestGridTools(unittest.TestCase):
         expected = {0.5, 0.3, 0.1}
         self.assertSetEqual(set(n_values), expected)
 
+    def test_poly2poly_geos_tiled(self):
+        from osgeo import gdal
+
+        grid = os.path.join(VECTOR_PATH, "grid.geojson")
+        roughness = os.path.join(VECTOR_PATH, "roughness.geojson")
+        gpkg_path = os.path.join(EXPORT_DATA_DIR, "tiled_grid.gpkg")
+        gdal.VectorTranslate(gpkg_path, grid, format="GPKG", layerName="grid")
+        glayer = QgsVectorLayer(gpkg_path + "|layername=grid", "grid", "ogr")
+        rlayer = QgsVectorLayer(roughness, "roughness", "ogr")
+
+        def cell_subareas(results):
+            subareas = {}
+            for gid, parts in results:
+                for manning, subarea in parts:
+                    cell = subareas.setdefault(gid, {})
+                    cell[manning] = cell.get(manning, 0) + subarea
+            return subareas
+
+        expected = cell_subareas(poly2poly_geos(glayer, rlayer, None, "manning"))
+        tiled = cell_subareas(poly2poly_geos_tiled(glayer, rlayer, None, "manning", grid_span=3, max_workers=2))
+        self.assertTrue(expected)
+        self.assertSetEqual(set(tiled), set(expected))
+        for gid, cell in expected.items():
+            self.assertSetEqual(set(tiled[gid]), set(cell))
+            for manning, subarea in cell.items():
+                self.assertAlmostEqual(tiled[gid][manning], subarea, places=6)
+        del glayer
+
+    def test_spatial_index_cache(self):
+        from osgeo import gdal
+
+        roughness = os.path.join(VECTOR_PATH, "roughness.geojson")
+        gpkg_path = os.path.join(EXPORT_DATA_DIR, "spatial_index_cache.gpkg")
+        gdal.VectorTranslate(gpkg_path, roughness, format="GPKG", layerName="roughness")
+        vlayer = QgsVectorLayer(gpkg_path + "|layername=roughness", "roughness", "ogr")
+        builds = []
+
+        def build(lyr, attributes):
+            builds.append(attributes)
+            return build_spatial_index(lyr, attributes)
+
+        allfeatures, index = cached_layer_index("features", vlayer, build)
+        self.assertEqual(len(allfeatures), vlayer.featureCount())
+        self.assertIs(cached_layer_index("features", vlayer, build)[1], index)
+        self.assertEqual(len(builds), 1)
+        clear_spatial_index_cache()
+        self.assertIsNot(cached_layer_index("features", vlayer, build)[1], index)
+        self.assertEqual(len(builds), 2)
+        clear_spatial_index_cache()
+        del vlayer
+
+    def test_sample_raster(self):
+        from osgeo import gdal
+        import numpy as np
+
+        grid = os.path.join(VECTOR_PATH, "grid.geojson")
+        glayer = QgsVectorLayer(grid, "grid", "ogr")
+        fids, xs, ys = layer_centroids(glayer)
+        extent = glayer.extent()
+        raster = os.path.join(EXPORT_DATA_DIR, "sample.tif")
+        width, height = 64, 48
+        ds = gdal.GetDriverByName("GTiff").Create(raster, width, height, 1, gdal.GDT_Float32, ["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"])
+        dx, dy = extent.width() / (width - 8), extent.height() / (height - 8)
+        ds.SetGeoTransform((extent.xMinimum() - 4 * dx, dx, 0, extent.yMaximum() + 4 * dy, 0, -dy))
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(-9999)
+        values = np.random.uniform(0, 100, (height, width)).astype(np.float32)
+        values[::7, ::5] = -9999
+        band.WriteArray(values)
+        ds = None
+        sampled = sample_raster(raster, fids, xs, ys)
+        identified = identify_raster(raster, fids, xs, ys)
+        self.assertEqual(len(sampled), len(fids))
+        self.assertListEqual(sampled, identified)
+
+    def test_raster_zonal_statistics(self):
+        from osgeo import gdal
+
+        roughness = os.path.join(VECTOR_PATH, "roughness.geojson")
+        rlayer = QgsVectorLayer(roughness, "roughness", "ogr")
+        extent = rlayer.extent()
+        raster = os.path.join(EXPORT_DATA_DIR, "zonal.tif")
+        width, height = 80, 60
+        ds = gdal.GetDriverByName("GTiff").Create(raster, width, height, 1, gdal.GDT_Float32)
+        dx, dy = extent.width() / (width - 8), extent.height() / (height - 8)
+        ds.SetGeoTransform((extent.xMinimum() - 4 * dx, dx, 0, extent.yMaximum() + 4 * dy, 0, -dy))
+        band = ds.GetRasterBand(1)
+        band.SetNoDataValue(-9999)
+        values = np.random.default_rng(25).uniform(0, 100, (height, width)).astype(np.float32)
+        values[::7, ::5] = -9999
+        band.WriteArray(values)
+        ds = None
+        zones = [(feat.id(), feat.geometry()) for feat in rlayer.getFeatures()]
+        for statistics, qgis_statistics in (("Mean", QgsZonalStatistics.Mean), ("Max", QgsZonalStatistics.Max)):
+            calculated = [value for zone_id, value in raster_zonal_statistics(raster, zones, statistics, 500)]
+            reference_layer = rlayer.materialize(QgsFeatureRequest())
+            polygons_statistics(reference_layer, QgsRasterLayer(raster), qgis_statistics)
+            expected = [feat[statistics.lower()] for feat in reference_layer.getFeatures()]
+            self.assertEqual(len(calculated), len(expected))
+            for value, reference in zip(calculated, expected):
+                self.assertAlmostEqual(value, reference, places=3)
+
     @unittest.skip("Skipping test due to long run.")
     def test_calculate_arfwrf(self):
         grid = os.path.join(VECTOR_PATH, "grid.geojson")
@@ -63,6 +196,49 @@ class TestGridTools(unittest.TestCase):
             self.assertTrue(all(awrf))
         self.assertTupleEqual(row[1:], (153, 4, 0.68, 1.0, 0.0, 0.27, 1.0, 0.56, 0.0, 1.0, 1.0))
 
+    def test_calculate_arfwrf_raster(self):
+        glayer = QgsVectorLayer("Polygon?crs=EPSG:3857", "grid", "memory")
+        cells = []
+        for row in range(4):
+            for col in range(4):
+                xmin, ymax = col * 10.0, 40.0 - row * 10.0
+                rect = QgsRectangle(xmin, ymax - 10.0, xmin + 10.0, ymax)
+                cell = QgsFeature()
+                cell.setGeometry(QgsGeometry.fromRect(rect))
+                cells.append(cell)
+        glayer.dataProvider().addFeatures(cells)
+        blayer = QgsVectorLayer("Polygon?crs=EPSG:3857&field=calc_arf:integer&field=calc_wrf:integer", "bl", "memory")
+        blocked = [
+            ("POLYGON((1 1, 19 1, 19 9, 1 9, 1 1))", 1, 1),
+            ("POLYGON((22 22, 38 22, 38 38, 22 38, 22 22))", 1, 1),
+            ("POLYGON((5 25, 15 35, 5 35, 5 25))", 1, 0),
+            ("POLYGON((20.5 0.5, 39.5 0.5, 39.5 19.5, 20.5 19.5, 20.5 0.5))", 1, 1),
+        ]
+        areas = []
+        for wkt, calc_arf, calc_wrf in blocked:
+            area = QgsFeature(blayer.fields())
+            area.setGeometry(QgsGeometry.fromWkt(wkt))
+            area.setAttributes([calc_arf, calc_wrf])
+            areas.append(area)
+        blayer.dataProvider().addFeatures(areas)
+        reference = [row[1:] for row, was_null in calculate_arfwrf(glayer, blayer)]
+        rows = list(calculate_arfwrf_raster(glayer, blayer, subcells=20))
+        self.assertEqual(len(reference), 14)
+        self.assertListEqual(compare_arfwrf(reference, rows), [])
+        fully_blocked = sorted(row[0] for row in rows if row[2] == 1)
+        self.assertListEqual(fully_blocked, [11, 12, 15, 16])
+
+    @unittest.skipIf(Delaunay is None, "Skipping test, there is no scipy module installed.")
+    def test_delaunay_interpolator(self):
+        rng = np.random.default_rng(24)
+        xs, ys = rng.uniform(0, 1000, 500), rng.uniform(0, 1000, 500)
+        tin = DelaunayInterpolator(xs, ys, 0.5 * xs - 0.2 * ys + 100)
+        px, py = np.array([250.0, 500.0, 750.0, -10.0]), np.array([750.0, 500.0, 250.0, 500.0])
+        values = tin.tin_at_points(px, py)
+        np.testing.assert_allclose(values[:3], 0.5 * px[:3] - 0.2 * py[:3] + 100)
+        self.assertTrue(np.isnan(values[3]))
+        self.assertEqual(tin.tin_at_xy(-10.0, 500.0)[0], 1)
+
 
 # Running tests:
 if __name__ == "__main__":
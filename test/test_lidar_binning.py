@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+from flo2d.flo2d_tools.lidar_binning import LidarLattice, LidarBins, bin_lidar_files
+
+# Points of the first cell, the second cell and one point outside of the grid.
+LIDAR_1 = """1.0 1.0 5.0
+2.0 2.0 7.0
+15.0 5.0 1.0
+25.0 5.0 100.0
+"""
+LIDAR_2 = """1,16.0,6.0,3.0,0
+2,17.0,7.0,8.0,0
+"""
+
+
+class TestLidarBinning(unittest.TestCase):
+    def setUp(self):
+        self.lidar_dir = tempfile.mkdtemp()
+        self.lidar_files = []
+        for name, content in [("lidar_1.xyz", LIDAR_1), ("lidar_2.txt", LIDAR_2)]:
+            lidar_file = os.path.join(self.lidar_dir, name)
+            with open(lidar_file, "w") as f:
+                f.write(content)
+            self.lidar_files.append(lidar_file)
+        # Two cells in the first row and an empty cell above the first one.
+        self.lattice = LidarLattice([1, 2, 3], [2, 3, 2], [2, 2, 3], 0.0, 0.0, 10.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.lidar_dir)
+
+    def check_bins(self, bins):
+        self.assertEqual(bins.inside, 5)
+        self.assertEqual(bins.outside, 1)
+        self.assertEqual(bins.errors, [])
+        np.testing.assert_array_equal(bins.count, [2, 3, 0])
+        np.testing.assert_allclose(bins.statistic("Mean"), [6.0, 4.0, np.nan])
+        np.testing.assert_array_equal(bins.statistic("Min"), [5.0, 1.0, np.nan])
+        np.testing.assert_array_equal(bins.statistic("Max"), [7.0, 8.0, np.nan])
+
+    def test_lattice_positions(self):
+        xs = np.array([1.0, 15.0, 5.0, 25.0, -1.0])
+        ys = np.array([1.0, 5.0, 15.0, 5.0, 5.0])
+        np.testing.assert_array_equal(self.lattice.positions(xs, ys), [0, 1, 2, -1, -1])
+
+    def test_lidar_bins(self):
+        bins = LidarBins(3)
+        positions = self.lattice.positions(np.array([1.0, 2.0, 15.0]), np.array([1.0, 2.0, 5.0]))
+        bins.add(positions, np.array([5.0, 7.0, 1.0]))
+        other = LidarBins(3)
+        positions = self.lattice.positions(np.array([16.0, 17.0, 25.0]), np.array([6.0, 7.0, 5.0]))
+        other.add(positions, np.array([3.0, 8.0, 100.0]))
+        bins.merge(other)
+        self.check_bins(bins)
+        self.assertRaises(ValueError, bins.statistic, "Median")
+
+    def test_bin_lidar_files(self):
+        bins = bin_lidar_files(self.lattice, self.lidar_files, max_workers=2)
+        self.check_bins(bins)
+
+    def test_bin_lidar_files_killed(self):
+        done = []
+        bins = bin_lidar_files(self.lattice, self.lidar_files, progress=done.append, killed=lambda: True)
+        self.assertIsNone(bins)
+        self.assertEqual(done, [])
+
+
+# Running tests:
+if __name__ == "__main__":
+    cases = [TestLidarBinning]
+    suite = unittest.TestSuite()
+    for t in cases:
+        tests = unittest.TestLoader().loadTestsFromTestCase(t)
+        suite.addTest(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
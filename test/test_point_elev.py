@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+from osgeo import gdal
+from flo2d.misc.point_elev import read_xyz_chunks, xyz_average_raster_array, xyz_to_raster_average
+
+# Two points in the upper left pixel, one in the lower right, a NoData point and a point outside of the extent.
+XYZ_POINTS = """X,Y,Z
+5.0,15.0,10.0
+6.0,16.0,12.0
+25.0,5.0,3.0
+15.0,5.0,-9999.0
+35.0,5.0,50.0
+"""
+EXTENTS = (0.0, 0.0, 30.0, 20.0)
+SHAPE = (2, 3)
+EXPECTED = [[11.0, -9999.0, -9999.0], [-9999.0, -9999.0, 3.0]]
+
+
+class TestPointElev(unittest.TestCase):
+    def setUp(self):
+        self.xyz_dir = tempfile.mkdtemp()
+        self.csv_file = os.path.join(self.xyz_dir, "points.csv")
+        with open(self.csv_file, "w") as f:
+            f.write(XYZ_POINTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.xyz_dir)
+
+    def test_read_xyz_chunks(self):
+        chunks = list(read_xyz_chunks(self.csv_file, chunk_lines=2))
+        self.assertEqual([chunk.shape for chunk in chunks], [(2, 3), (2, 3), (1, 3)])
+        np.testing.assert_array_equal(chunks[0][0], [5.0, 15.0, 10.0])
+
+    def test_xyz_average_raster_array(self):
+        raster_array, transform = xyz_average_raster_array(self.csv_file, EXTENTS, SHAPE, nodata=-9999)
+        self.assertEqual(transform.to_gdal(), (0.0, 10.0, 0.0, 20.0, 0.0, -10.0))
+        np.testing.assert_array_equal(raster_array, EXPECTED)
+
+    def test_xyz_to_raster_average(self):
+        srs = "+proj=utm +zone=12 +datum=WGS84 +units=m +no_defs"
+        raster_path = xyz_to_raster_average(self.csv_file, EXTENTS, SHAPE, srs, nodata=-9999)
+        self.assertEqual(raster_path, os.path.join(self.xyz_dir, "points_gdsgrid.tif"))
+        ds = gdal.Open(raster_path)
+        band = ds.GetRasterBand(1)
+        self.assertEqual(band.GetNoDataValue(), -9999.0)
+        np.testing.assert_array_equal(band.ReadAsArray(), EXPECTED)
+        ds = None
+
+
+# Running tests:
+if __name__ == "__main__":
+    cases = [TestPointElev]
+    suite = unittest.TestSuite()
+    for t in cases:
+        tests = unittest.TestLoader().loadTestsFromTestCase(t)
+        suite.addTest(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
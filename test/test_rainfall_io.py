@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# FLO-2D Preprocessor tools for QGIS
+# Copyright © 2021 Lutra Consulting for FLO-2D
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+from flo2d.flo2d_ie.rainfall_io import ASCProcessor, HDFProcessor, read_asc, asc_transform
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+ASC_CORNER = """ncols 3
+nrows 2
+xllcorner 0.0
+yllcorner 0.0
+cellsize 10.0
+nodata_value -9999
+1.0 2.0 3.0
+4.0 -9999 6.0
+"""
+
+ASC_CENTER = """NCOLS 3
+NROWS 2
+XLLCENTER 5.0
+YLLCENTER 5.0
+CELLSIZE 10.0
+NODATA_VALUE -9999
+0.5 0.25 0.125
+-9999 7.0 8.0
+"""
+
+
+class TestRainfallIO(unittest.TestCase):
+    def setUp(self):
+        self.asc_dir = tempfile.mkdtemp()
+        for name, content in [("rain_01.asc", ASC_CORNER), ("rain_02.asc", ASC_CENTER)]:
+            with open(os.path.join(self.asc_dir, name), "w") as asc_file:
+                asc_file.write(content)
+        with open(os.path.join(self.asc_dir, "rain.rfc"), "w") as rfc_file:
+            rfc_file.write("01/01/2021 00:00 01/01/2021 00:10 5 2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.asc_dir)
+
+    def test_read_asc(self):
+        header, values = read_asc(os.path.join(self.asc_dir, "rain_01.asc"))
+        self.assertEqual(header["ncols"], 3)
+        self.assertEqual(header["nrows"], 2)
+        self.assertEqual(header["cellsize"], 10.0)
+        self.assertEqual(values.shape, (2, 3))
+        np.testing.assert_array_equal(values, [[1.0, 2.0, 3.0], [4.0, np.nan, 6.0]])
+
+    def test_asc_transform(self):
+        corner_header, __ = read_asc(os.path.join(self.asc_dir, "rain_01.asc"))
+        center_header, __ = read_asc(os.path.join(self.asc_dir, "rain_02.asc"))
+        for header in [corner_header, center_header]:
+            transform = asc_transform(header)
+            self.assertEqual(tuple(transform)[:6], (10.0, 0.0, 0.0, 0.0, -10.0, 20.0))
+
+    def test_rainfall_intervals(self):
+        asc_processor = ASCProcessor(None, self.asc_dir)
+        self.assertEqual(len(asc_processor.asc_files), 2)
+        self.assertEqual(asc_processor.parse_rfc(), ["5", "2", "01/01/2021 00:00 01/01/2021 00:10"])
+        xs = np.array([5.0, 25.0, 15.0, 35.0, 15.0])
+        ys = np.array([15.0, 5.0, 5.0, 5.0, 15.0])
+        intervals = list(asc_processor.rainfall_intervals(xs, ys))
+        self.assertEqual(len(intervals), 2)
+        np.testing.assert_array_equal(intervals[0], [1.0, 6.0, np.nan, np.nan, 2.0])
+        np.testing.assert_array_equal(intervals[1], [0.5, 8.0, 7.0, np.nan, 0.25])
+
+    @unittest.skipIf(h5py is None, "There is no h5py module installed.")
+    def test_export_rainfall_chunks(self):
+        hdf_path = os.path.join(self.asc_dir, "rain.hdf5")
+        header = ["5", "3", "01/01/2021 00:00 01/01/2021 00:15"]
+        values = np.arange(15, dtype=float).reshape(5, 3) / 10.0
+        chunks = [values[:3], values[3:]]
+        written = []
+        HDFProcessor(hdf_path).export_rainfall_chunks(header, 5, iter(chunks), written.append)
+        self.assertEqual(written, [3, 5])
+        with h5py.File(hdf_path, "r") as hdf_file:
+            grp = hdf_file["raincell"]
+            self.assertEqual(grp["RAININTIME"][()], 5)
+            self.assertEqual(grp["IRINTERS"][()], 3)
+            iraindum = grp["IRAINDUM"]
+            self.assertEqual(iraindum.shape, (5, 3, 1))
+            np.testing.assert_array_equal(iraindum[:, :, 0], values)
+
+
+# Running tests:
+if __name__ == "__main__":
+    cases = [TestRainfallIO]
+    suite = unittest.TestSuite()
+    for t in cases:
+        tests = unittest.TestLoader().loadTestsFromTestCase(t)
+        suite.addTest(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -18,12 +18,15 @@ VECTOR_PATH = os.path.join(THIS_DIR, "data", "vector")
 EXPORT_DATA_DIR = os.path.join(THIS_DIR, "data")
 
 from collections import defaultdict
-from qgis.core import QgsVectorLayer
+from qgis.core import QgsVectorLayer, QgsGeometry, QgsPointXY
 from flo2d.flo2d_tools.schematic_tools import (
     get_intervals,
     interpolate_along_line,
     schematize_lines,
     populate_directions,
+    bresenham_line,
+    bresenham_lines,
+    line_locate_points,
 )
 
 
@@ -69,6 +72,19 @@ class TestSchematicTools(unittest.TestCase):
                 total_sum += 1
         self.assertEqual(total_sum, 88)
 
+    def test_line_locate_points(self):
+        vertices = [(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (25.0, 15.0)]
+        line = QgsGeometry.fromPolylineXY([QgsPointXY(x, y) for x, y in vertices])
+        xs = [-3.0, 4.0, 12.0, 8.0, 30.0, 17.0]
+        ys = [1.0, -2.0, 3.0, 9.0, 20.0, 13.0]
+        distances, snapped_xs, snapped_ys = line_locate_points(vertices, xs, ys)
+        for x, y, distance, sx, sy in zip(xs, ys, distances, snapped_xs, snapped_ys):
+            expected = line.lineLocatePoint(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            self.assertAlmostEqual(distance, expected)
+            snapped = line.interpolate(expected).asPoint()
+            self.assertAlmostEqual(sx, snapped.x())
+            self.assertAlmostEqual(sy, snapped.y())
+
     def test_schematize_lines(self):
         user_lines = os.path.join(VECTOR_PATH, "channels_streets.geojson")
         cell_size = 500
@@ -82,6 +98,13 @@ class TestSchematicTools(unittest.TestCase):
             unique_grids += len(set(seg))
         self.assertEqual(all_grids - unique_grids, 5)
 
+    def test_bresenham_lines(self):
+        segments = [(0, 0, 7, 3), (7, 3, 0, 0), (2, -4, 3, 9), (5, 5, 5, 5), (-3, 8, -9, -1), (0, 0, -6, 6)]
+        seg, xs, ys = bresenham_lines(*zip(*segments))
+        for i, segment in enumerate(segments):
+            points = list(zip(xs[seg == i].tolist(), ys[seg == i].tolist()))
+            self.assertListEqual(points, bresenham_line(*segment))
+
     def test_schematize_streets(self):
         user_lines = os.path.join(VECTOR_PATH, "channels_streets.geojson")
         cell_size = 500